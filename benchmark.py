@@ -0,0 +1,261 @@
+"""
+benchmark.py
+
+Banco de pruebas de rendimiento sobre el plano de Madrid. Carga (o
+construye desde data/) el grafo y mide, con una semilla fija para que
+todas las ejecuciones hagan exactamente las mismas consultas:
+    - la carga del grafo y la construcción del índice espacial
+    - el ajuste de puntos al vértice más cercano (IndiceEspacial)
+    - el geocodificador, si hay data/direcciones_clean.csv
+    - dijkstra completo y camino_minimo (Grafo y GrafoCompacto con cada
+      algoritmo) sobre pares origen-destino aleatorios
+    - prim y kruskal
+
+De cada operación se guardan en un JSON los percentiles 50, 95 y 99 de
+la latencia, el número de operaciones por segundo y el pico de memoria
+del proceso. Si se da una ejecución de referencia, se compara con ella y
+el programa termina con código 1 si alguna operación es más lenta que la
+referencia más la tolerancia.
+
+Uso:
+    python benchmark.py [--grafo G.grf] [--salida resultados.json]
+                        [--base referencia.json] [--tolerancia 0.2]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random as r
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Semilla de las consultas aleatorias
+SEMILLA = 0
+# Número de consultas de cada tipo
+PARES = 200
+ORIGENES_DIJKSTRA = 10
+PUNTOS_AJUSTE = 2000
+CONSULTAS_GEOCODIFICADOR = 50
+REPETICIONES_ARBOL = 3
+# Métricas comparadas con la referencia
+METRICAS_REGRESION = ("p50_ms", "p95_ms")
+TOLERANCIA = 0.2
+
+
+def memoria_pico_mb() -> float:
+    """Pico de memoria residente del proceso en MiB (None si no se puede
+    medir en esta plataforma).
+    """
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss está en KiB en Linux y en bytes en macOS
+    return pico / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+def resumen(latencias: List[float]) -> dict:
+    """Estadísticas de una lista de latencias en segundos.
+
+    Args: latencias duración de cada operación en segundos
+    Returns: Diccionario con el número de operaciones, el tiempo total,
+    los percentiles 50, 95 y 99 en milisegundos, las operaciones por
+    segundo y el pico de memoria del proceso.
+    """
+    latencias = np.asarray(latencias, dtype=np.float64)
+    total = float(latencias.sum())
+    p50, p95, p99 = np.percentile(latencias, [50, 95, 99]) * 1000
+    return {
+        "n": len(latencias),
+        "total_s": total,
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "por_segundo": len(latencias) / total if total > 0 else None,
+        "memoria_pico_mb": memoria_pico_mb(),
+    }
+
+
+def medir(funcion: Callable, argumentos: List[tuple]) -> dict:
+    """Ejecuta funcion(*args) para cada tupla de argumentos y resume sus
+    latencias.
+
+    Args:
+        funcion: función a medir
+        argumentos: lista de tuplas de argumentos, una por llamada
+    Returns: Diccionario de resumen.
+    """
+    latencias = []
+    for args in argumentos:
+        inicio = time.perf_counter()
+        funcion(*args)
+        latencias.append(time.perf_counter() - inicio)
+    return resumen(latencias)
+
+
+def regresiones(
+    resultados: Dict[str, dict], base: Dict[str, dict], tolerancia: float
+) -> List[str]:
+    """Operaciones más lentas que en la ejecución de referencia.
+
+    Args:
+        resultados: resultados de esta ejecución por operación
+        base: resultados de la ejecución de referencia
+        tolerancia: aumento relativo admitido (0.2 es un 20 %)
+    Returns: Lista de descripciones de las regresiones (vacía si no hay).
+    Las operaciones que no están en las dos ejecuciones no se comparan.
+    """
+    encontradas = []
+    for nombre, actual in resultados.items():
+        if nombre not in base:
+            continue
+        for metrica in METRICAS_REGRESION:
+            antes, ahora = base[nombre][metrica], actual[metrica]
+            if ahora > antes * (1 + tolerancia):
+                encontradas.append(
+                    f"{nombre} {metrica}: {ahora:.3f} > {antes:.3f} "
+                    f"(+{100 * (ahora / antes - 1):.0f} %)"
+                )
+    return encontradas
+
+
+def cargar_madrid(path: str = None):
+    """Carga el grafo compacto de un fichero .grf o, si no se da, lo
+    construye desde los CSV de data/ con construccion.build_graph.
+
+    Args: path ruta del grafo (opcional)
+    Returns: Tupla (GrafoCompacto, Grafo).
+    """
+    from grafo_compacto import GrafoCompacto
+
+    if path is not None:
+        compacto = GrafoCompacto.cargar(path, mmap=False)
+        return compacto, compacto.a_grafo()
+    from construccion import build_graph
+
+    direcciones = "data/direcciones_clean.csv"
+    grafo = build_graph(
+        direcciones_csv=direcciones if os.path.exists(direcciones) else None
+    )
+    return grafo.compactar(), grafo
+
+
+def ejecutar(path: str = None, semilla: int = SEMILLA) -> Dict[str, dict]:
+    """Ejecuta todas las mediciones.
+
+    Args:
+        path: ruta del grafo (opcional, ver cargar_madrid)
+        semilla: semilla de las consultas aleatorias
+    Returns: Diccionario operación -> resumen.
+    """
+    from indice_espacial import IndiceEspacial
+
+    resultados = {}
+    inicio = time.perf_counter()
+    madrid, grafo = cargar_madrid(path)
+    resultados["carga"] = resumen([time.perf_counter() - inicio])
+    aleatorio = r.Random(semilla)
+    vertices = madrid.vertices
+    pares = [
+        (aleatorio.choice(vertices), aleatorio.choice(vertices)) for _ in range(PARES)
+    ]
+
+    cruces = pd.read_csv("data/cruces_clean.csv")
+    inicio = time.perf_counter()
+    indice = IndiceEspacial.desde_grafo(madrid, cruces)
+    resultados["indice_espacial"] = resumen([time.perf_counter() - inicio])
+    xs, ys = madrid.coords[:, 0], madrid.coords[:, 1]
+    puntos = [
+        (aleatorio.uniform(xs.min(), xs.max()), aleatorio.uniform(ys.min(), ys.max()))
+        for _ in range(PUNTOS_AJUSTE)
+    ]
+    resultados["vertice_mas_cercano"] = medir(indice.vertice_mas_cercano, puntos)
+
+    if os.path.exists("data/direcciones_clean.csv"):
+        from geocodificador import Geocodificador
+
+        direcciones = pd.read_csv("data/direcciones_clean.csv")
+        inicio = time.perf_counter()
+        geocodificador = Geocodificador.construir(direcciones)
+        resultados["geocodificador_construir"] = resumen([time.perf_counter() - inicio])
+        textos = direcciones["Direccion completa"].tolist()
+        consultas = [
+            (aleatorio.choice(textos).lower(), 1)
+            for _ in range(CONSULTAS_GEOCODIFICADOR)
+        ]
+        resultados["geocode"] = medir(geocodificador.geocode, consultas)
+
+    origenes = [(aleatorio.choice(vertices),) for _ in range(ORIGENES_DIJKSTRA)]
+    resultados["grafo.dijkstra"] = medir(grafo.dijkstra, origenes)
+    resultados["compacto.dijkstra"] = medir(madrid.dijkstra, origenes)
+    for algoritmo in ("dijkstra", "astar", "bidireccional"):
+        resultados[f"grafo.camino_minimo.{algoritmo}"] = medir(
+            lambda s, t: grafo.camino_minimo(s, t, algoritmo), pares
+        )
+        resultados[f"compacto.camino_minimo.{algoritmo}"] = medir(
+            lambda s, t: madrid.camino_minimo(s, t, algoritmo), pares
+        )
+    for nombre, funcion in (
+        ("grafo.prim", grafo.prim),
+        ("grafo.kruskal", grafo.kruskal),
+        ("compacto.prim", madrid.prim),
+        ("compacto.kruskal", madrid.kruskal),
+    ):
+        resultados[nombre] = medir(funcion, [()] * REPETICIONES_ARBOL)
+    return resultados
+
+
+def main(argv: List[str] = None) -> int:
+    """Programa principal (ver la cabecera del módulo).
+
+    Args: argv argumentos de la línea de comandos
+    Returns: Código de salida: 0, o 1 si hay regresiones.
+    """
+    parser = argparse.ArgumentParser(description="Banco de pruebas de rutas")
+    parser.add_argument("--grafo", help="grafo .grf (por defecto, desde data/)")
+    parser.add_argument("--salida", default="benchmark.json")
+    parser.add_argument("--base", help="JSON de una ejecución de referencia")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    parser.add_argument("--semilla", type=int, default=SEMILLA)
+    args = parser.parse_args(argv)
+
+    resultados = ejecutar(args.grafo, args.semilla)
+    informe = {
+        "meta": {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "grafo": args.grafo or "data/",
+            "semilla": args.semilla,
+        },
+        "resultados": resultados,
+    }
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(informe, f, indent=2)
+    for nombre, res in resultados.items():
+        print(
+            f"{nombre:40s} p50 {res['p50_ms']:9.2f} ms  p95 {res['p95_ms']:9.2f} ms"
+            f"  p99 {res['p99_ms']:9.2f} ms"
+        )
+    if args.base is None:
+        return 0
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)["resultados"]
+    encontradas = regresiones(resultados, base, args.tolerancia)
+    for regresion in encontradas:
+        print("REGRESIÓN", regresion)
+    return 1 if encontradas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
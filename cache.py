@@ -0,0 +1,127 @@
+"""
+cache.py
+
+Caché LRU de consultas de caminos mínimos para Grafo, con un presupuesto
+de memoria aproximado en bytes.
+
+Guarda dos tipos de entradas:
+    - ("ruta", origen, destino, algoritmo, velocidad_max): camino y coste
+      de camino_minimo
+    - ("arbol", origen): padres y distancias del árbol de caminos mínimos
+      completo calculado por dijkstra(origen), con el que se responde
+      cualquier consulta posterior desde ese origen
+La caché recuerda la versión del grafo con la que se calcularon sus
+entradas; el grafo incrementa su versión en cada edición de aristas y la
+caché se vacía al detectar una versión distinta, así que nunca devuelve un
+camino por una arista eliminada.
+"""
+
+import sys
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+# Presupuesto por defecto: 64 MiB
+MAX_BYTES = 64 * 2**20
+
+
+class CacheRutas:
+    # Diccionario LRU de resultados de consultas con límite de memoria
+
+    def __init__(self, max_bytes: int = MAX_BYTES):
+        """Crea una caché vacía.
+
+        Args: max_bytes tamaño máximo aproximado de las entradas en bytes
+        Returns: CacheRutas vacía.
+        """
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.version = None
+        self.aciertos = 0
+        self.fallos = 0
+        self._entradas: "OrderedDict[tuple, Tuple[object, int]]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def __contains__(self, clave: tuple) -> bool:
+        return clave in self._entradas
+
+    def vaciar(self) -> None:
+        """Elimina todas las entradas."""
+        self._entradas.clear()
+        self.bytes = 0
+
+    def comprobar_version(self, version: int) -> None:
+        """Vacía la caché si las entradas son de otra versión del grafo.
+
+        Args: version versión actual del grafo
+        Returns: None
+        """
+        if version != self.version:
+            self.vaciar()
+            self.version = version
+
+    def obtener(self, clave: tuple):
+        """Valor guardado para la clave (y la marca como la más reciente).
+
+        Args: clave clave de la entrada
+        Returns: El valor, o None si no está.
+        """
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            self.fallos += 1
+            return None
+        self._entradas.move_to_end(clave)
+        self.aciertos += 1
+        return entrada[0]
+
+    def guardar(self, clave: tuple, valor: object, tamano: int) -> None:
+        """Guarda un valor y descarta las entradas menos usadas hasta
+        volver al presupuesto. Los valores mayores que todo el presupuesto
+        no se guardan.
+
+        Args:
+            clave: clave de la entrada
+            valor: valor a guardar
+            tamano: tamaño aproximado del valor en bytes
+        Returns: None
+        """
+        if tamano > self.max_bytes:
+            return
+        anterior = self._entradas.pop(clave, None)
+        if anterior is not None:
+            self.bytes -= anterior[1]
+        self._entradas[clave] = (valor, tamano)
+        self.bytes += tamano
+        while self.bytes > self.max_bytes:
+            _, (_, t) = self._entradas.popitem(last=False)
+            self.bytes -= t
+
+    def estadisticas(self) -> dict:
+        """Resumen de uso de la caché.
+
+        Args: None
+        Returns: Diccionario con el número de entradas, los bytes usados,
+        el presupuesto, los aciertos y los fallos.
+        """
+        return {
+            "entradas": len(self),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+        }
+
+
+def tamano_ruta(camino: Tuple[object, ...]) -> int:
+    """Tamaño aproximado de una entrada de ruta (la tupla; los vértices
+    son los del grafo y no se cuentan).
+    """
+    return sys.getsizeof(camino)
+
+
+def tamano_arbol(padres: Dict[object, object], distancias: Dict[object, float]) -> int:
+    """Tamaño aproximado de una entrada de árbol (las tablas de los
+    diccionarios y los floats de las distancias).
+    """
+    return sys.getsizeof(padres) + sys.getsizeof(distancias) + 24 * len(distancias)
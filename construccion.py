@@ -0,0 +1,313 @@
+"""
+construccion.py
+
+Construcción del grafo del callejero a partir de los CSV de datos, con las
+mismas etapas que create_graph.ipynb pero con operaciones agrupadas y
+ordenadas de pandas/NumPy en lugar de iterrows:
+    1. unificar los cruces que están a menos de 100 cm (Manhattan)
+    2. asignar a cada vía su velocidad (velocidades.csv o su tipo de vía)
+    3. asociar a cada cruce la dirección más cercana de su misma vía
+    4. ordenar los cruces de cada vía por su dirección asociada y, entre
+       los que comparten dirección, por el camino más corto que los recorre
+       (ordenacion.py)
+    5. unir cruces consecutivos de cada vía con una arista cuyo peso es el
+       tiempo en segundos a la velocidad de la vía
+Con verbose se informa además de los fragmentos del callejero
+desconectados de la componente principal (informe_conectividad).
+
+Uso:
+    python construccion.py grafos/plano_de_madrid.grf
+reconstruye el grafo desde data/ y lo guarda en formato binario.
+"""
+
+import sys
+import time
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from grafo import Grafo
+from indice_espacial import agrupar_puntos
+from ordenacion import ordenar_grupos
+
+# Velocidades en km/h por tipo de vía para las vías sin velocidad medida
+VELOCIDADES_TIPO = {
+    "AUTOVIA": 100,
+    "AVENIDA": 90,
+    "CARRETERA": 70,
+    "CALLEJON": 30,
+    "CAMINO": 30,
+    "ESTACION DE METRO": 20,
+    "PASADIZO": 20,
+    "PLAZUELA": 20,
+    "COLONIA": 20,
+}
+VELOCIDAD_DEFECTO = 50
+# Distancia Manhattan en cm por debajo de la cual dos cruces son el mismo
+DISTANCIA_UNIFICAR = 100
+# Fragmentos desconectados que se listan con verbose
+FRAGMENTOS_INFORME = 10
+
+
+def unificar_cruces(cruces: pd.DataFrame, distancia: float = DISTANCIA_UNIFICAR):
+    """Unifica los cruces unidos por cadenas de cruces a menos de la
+    distancia Manhattan indicada: todos toman las coordenadas del primero
+    (en orden del DataFrame) de su grupo. Ver indice_espacial.agrupar_puntos.
+
+    Args:
+        cruces: DataFrame con columnas x e y
+        distancia: distancia Manhattan en cm
+    Returns: Copia de cruces con las coordenadas unificadas.
+    """
+    canonicas, _ = agrupar_puntos(cruces[["x", "y"]].to_numpy(), distancia)
+    cruces = cruces.copy()
+    cruces[["x", "y"]] = canonicas
+    return cruces
+
+
+def velocidades_vias(cruces: pd.DataFrame, velocidades: pd.DataFrame) -> np.ndarray:
+    """Velocidad en m/s de la vía de cada cruce: la medida en velocidades
+    (columnas Calle y 0) o, si no hay, la de su tipo de vía más frecuente.
+
+    Args:
+        cruces: DataFrame con columnas nombre_via y tipo_via
+        velocidades: DataFrame de data/velocidades.csv
+    Returns: Array con una velocidad por cruce.
+    """
+    tipos = cruces["tipo_via"].str.strip()
+    # Tipo más frecuente de cada vía (el primero alfabéticamente si empatan)
+    frecuencias = tipos.groupby(cruces["nombre_via"]).value_counts()
+    frecuencias = frecuencias.reset_index(name="n")
+    frecuencias = frecuencias.sort_values(
+        ["nombre_via", "n", "tipo_via"], ascending=[True, False, True]
+    )
+    tipo_via = frecuencias.drop_duplicates("nombre_via").set_index("nombre_via")
+    por_tipo = tipo_via["tipo_via"].map(VELOCIDADES_TIPO).fillna(VELOCIDAD_DEFECTO)
+    medidas = pd.Series(velocidades["0"].to_numpy(), index=velocidades["Calle"])
+    medidas = medidas[~medidas.index.duplicated()]
+    nombres = cruces["nombre_via"]
+    return nombres.map(medidas).fillna(nombres.map(por_tipo / 3.6)).to_numpy(np.float64)
+
+
+def clave_orden(direcciones: pd.Series) -> pd.Series:
+    """Clave para ordenar direcciones de una misma vía alfabéticamente: cada
+    número se sustituye por el carácter con ese código, de modo que "10"
+    queda detrás de "9".
+
+    Args: direcciones Series de direcciones completas
+    Returns: Series de claves.
+    """
+    return direcciones.str.replace(r"\d+", lambda m: chr(int(m.group(0))), regex=True)
+
+
+def asociar_direcciones(
+    cruces: pd.DataFrame, direcciones: pd.DataFrame
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Asocia a cada cruce la dirección más cercana de su misma vía.
+
+    Las direcciones se ordenan por vía una sola vez y, para cada vía, se
+    calculan con NumPy las distancias entre todos sus cruces y todas sus
+    direcciones.
+
+    Args:
+        cruces: DataFrame con columnas id_via, x e y
+        direcciones: DataFrame con columnas "Direccion completa", id_via, x e y
+    Returns: Tupla (claves, completas) con la clave de orden (ver clave_orden)
+    y la dirección completa asociada a cada cruce, o "" si su vía no tiene
+    direcciones.
+    """
+    direcciones = direcciones.sort_values("id_via", kind="stable")
+    vias = direcciones["id_via"].to_numpy()
+    xy_direcciones = direcciones[["x", "y"]].to_numpy(np.float64)
+    completas = direcciones["Direccion completa"].to_numpy(object)
+    asociada = np.full(len(cruces), -1, dtype=np.int64)
+    xy_cruces = cruces[["x", "y"]].to_numpy(np.float64)
+    for via, filas in cruces.groupby("id_via").indices.items():
+        a, b = np.searchsorted(vias, [via, via + 1])
+        if a == b:
+            continue
+        diferencia = xy_cruces[filas, None, :] - xy_direcciones[None, a:b, :]
+        asociada[filas] = a + np.argmin((diferencia**2).sum(axis=2), axis=1)
+    con_direccion = asociada >= 0
+    resultado_completas = np.full(len(cruces), "", dtype=object)
+    resultado_completas[con_direccion] = completas[asociada[con_direccion]]
+    resultado_claves = clave_orden(pd.Series(resultado_completas, dtype=object))
+    return resultado_claves.to_numpy(object), resultado_completas
+
+
+def ordenar_cruces(cruces: pd.DataFrame, procesos: int = None) -> np.ndarray:
+    """Posición de cada cruce en el recorrido de su vía. Los cruces se
+    ordenan por la clave de su dirección asociada y los que comparten
+    dirección, con ordenacion.ordenar_grupos, anclados al primer cruce de
+    la dirección anterior y de la siguiente.
+
+    Args:
+        cruces: DataFrame con columnas id_via, x, y y direccion_asociada
+        procesos: número de procesos para ordenar los grupos (ver
+        ordenacion.ordenar_grupos)
+    Returns: Array con la posición de cada cruce dentro de su vía.
+    """
+    cruces = cruces.reset_index(drop=True)
+    por_direccion = cruces.sort_values(
+        ["id_via", "direccion_asociada"], kind="stable"
+    ).index.to_numpy()
+    vias = cruces["id_via"].to_numpy()[por_direccion]
+    claves = cruces["direccion_asociada"].to_numpy(object)[por_direccion]
+    xy = cruces[["x", "y"]].to_numpy(np.float64)[por_direccion]
+    # Límites de los grupos (misma vía y misma dirección) y de las vías
+    nuevo_grupo = np.ones(len(cruces), dtype=bool)
+    nuevo_grupo[1:] = (vias[1:] != vias[:-1]) | (claves[1:] != claves[:-1])
+    nueva_via = np.ones(len(cruces), dtype=bool)
+    nueva_via[1:] = vias[1:] != vias[:-1]
+    grupos = np.append(np.flatnonzero(nuevo_grupo), len(cruces))
+    tramos, tareas = [], []
+    for g in np.flatnonzero(np.diff(grupos) > 1).tolist():
+        a, b = grupos[g], grupos[g + 1]
+        inicio = None if nueva_via[a] else xy[grupos[g - 1]]
+        fin = None if b == len(cruces) or nueva_via[b] else xy[b]
+        tramos.append((a, b))
+        tareas.append((xy[a:b], inicio, fin))
+    orden = por_direccion.copy()
+    for (a, b), recorrido in zip(tramos, ordenar_grupos(tareas, procesos)):
+        orden[a:b] = por_direccion[a:b][recorrido]
+    posiciones = np.empty(len(cruces), dtype=np.int64)
+    posiciones[orden] = np.arange(len(cruces))
+    return posiciones
+
+
+def aristas_vias(cruces: pd.DataFrame) -> Tuple[np.ndarray, ...]:
+    """Aristas entre cruces consecutivos de cada vía con coordenadas
+    distintas. El peso es el tiempo en segundos redondeado (como mínimo 1).
+
+    Args: cruces DataFrame con columnas id_via, x, y, speed y order
+    Returns: Tupla (origenes, destinos, pesos, vias) con arrays (m, 2) de
+    coordenadas de origen y destino, los pesos y el id_via de cada arista.
+    """
+    cruces = cruces.sort_values(["id_via", "order"], kind="stable")
+    xy = cruces[["x", "y"]].to_numpy()
+    vias = cruces["id_via"].to_numpy()
+    velocidades = cruces["speed"].to_numpy(np.float64)
+    consecutivos = (vias[1:] == vias[:-1]) & (xy[1:] != xy[:-1]).any(axis=1)
+    i = np.flatnonzero(consecutivos)
+    distancia = np.hypot(*(xy[i] - xy[i + 1]).astype(np.float64).T)
+    pesos = np.round(distancia / 100 / velocidades[i])
+    pesos[pesos == 0] = 1
+    return xy[i], xy[i + 1], pesos, vias[i]
+
+
+def construir_grafo(
+    cruces: pd.DataFrame,
+    direcciones: pd.DataFrame = None,
+    velocidades: pd.DataFrame = None,
+    verbose: bool = False,
+    procesos: int = None,
+) -> Grafo:
+    """Construye el grafo no dirigido del callejero a partir de DataFrames
+    con el formato de los CSV de data/.
+
+    Args:
+        cruces: DataFrame de cruces_clean.csv
+        direcciones: DataFrame de direcciones_clean.csv (opcional; sin él,
+        cada vía se ordena entera con ordenacion.ordenar_grupo)
+        velocidades: DataFrame de velocidades.csv (opcional)
+        verbose: si es True, imprime el tiempo de cada etapa
+        procesos: número de procesos para ordenar los cruces
+    Returns: Grafo con vértices (x, y) y aristas cuyo dato es el id_via.
+    """
+    tiempos = {}
+    inicio = time.perf_counter()
+    cruces = unificar_cruces(cruces.reset_index(drop=True))
+    tiempos["unificar"] = time.perf_counter() - inicio
+    if velocidades is None:
+        velocidades = pd.DataFrame({"Calle": [], "0": []})
+    cruces["speed"] = velocidades_vias(cruces, velocidades)
+    tiempos["velocidades"] = time.perf_counter() - inicio
+    if direcciones is not None:
+        claves, completas = asociar_direcciones(cruces, direcciones)
+    else:
+        claves = completas = np.full(len(cruces), "", dtype=object)
+    cruces["direccion_asociada"], cruces["direccion_completa"] = claves, completas
+    tiempos["direcciones"] = time.perf_counter() - inicio
+    cruces["order"] = ordenar_cruces(cruces, procesos)
+    tiempos["orden"] = time.perf_counter() - inicio
+    g = Grafo(dirigido=False)
+    for v in map(
+        tuple, cruces.drop_duplicates(["x", "y"])[["x", "y"]].to_numpy().tolist()
+    ):
+        g.agregar_vertice(v)
+    g.agregar_aristas_desde_arrays(*aristas_vias(cruces))
+    tiempos["grafo"] = time.perf_counter() - inicio
+    if verbose:
+        informe = informe_conectividad(g)
+        tiempos["conectividad"] = time.perf_counter() - inicio
+        for etapa, t in tiempos.items():
+            print(f"{etapa}: {t:.2f} s")
+        print(
+            f"{informe['componentes']} componentes: la principal tiene "
+            f"{informe['vertices_principal']} de {len(g.adj)} cruces"
+        )
+        for fragmento in informe["fragmentos"][:FRAGMENTOS_INFORME]:
+            print(
+                f"  fragmento de {fragmento['vertices']} cruces, vías {fragmento['vias']}"
+            )
+    return g
+
+
+def informe_conectividad(grafo: Grafo) -> dict:
+    """Fragmentos del callejero desconectados de la componente principal,
+    entre los que camino_minimo devolverá None.
+
+    Args: grafo Grafo construido con construir_grafo
+    Returns: Diccionario con el número de componentes ("componentes"), los
+    cruces de la principal ("vertices_principal") y la lista de los demás
+    fragmentos ("fragmentos"), de mayor a menor, cada uno con su número de
+    cruces ("vertices"), sus vías ("vias", id_via ordenados) y un cruce de
+    ejemplo ("cruce").
+    """
+    componentes = grafo.componentes_conexas()
+    fragmentos = []
+    for componente in componentes[1:]:
+        vias = {a["data"] for v in componente for a in grafo.adj[v].values()}
+        fragmentos.append(
+            {
+                "vertices": len(componente),
+                "vias": sorted(vias),
+                "cruce": componente[0],
+            }
+        )
+    return {
+        "componentes": len(componentes),
+        "vertices_principal": len(componentes[0]) if componentes else 0,
+        "fragmentos": fragmentos,
+    }
+
+
+def build_graph(
+    cruces_csv: str = "data/cruces_clean.csv",
+    direcciones_csv: str = "data/direcciones_clean.csv",
+    velocidades_csv: str = "data/velocidades.csv",
+    verbose: bool = False,
+    procesos: int = None,
+) -> Grafo:
+    """Construye el grafo del callejero desde los CSV.
+
+    Args:
+        cruces_csv: ruta de cruces_clean.csv
+        direcciones_csv: ruta de direcciones_clean.csv (None para no usarla)
+        velocidades_csv: ruta de velocidades.csv (None para no usarla)
+        verbose: si es True, imprime el tiempo de cada etapa
+        procesos: número de procesos para ordenar los cruces
+    Returns: Grafo construido con construir_grafo.
+    """
+    cruces = pd.read_csv(cruces_csv)
+    direcciones = pd.read_csv(direcciones_csv) if direcciones_csv else None
+    velocidades = pd.read_csv(velocidades_csv) if velocidades_csv else None
+    return construir_grafo(cruces, direcciones, velocidades, verbose, procesos)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    build_graph(verbose=True).save_graph(sys.argv[1])
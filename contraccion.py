@@ -0,0 +1,413 @@
+"""
+contraccion.py
+
+Jerarquías de contracción (Contraction Hierarchies) sobre un GrafoCompacto.
+
+El preprocesado contrae los vértices uno a uno, de menos a más importante,
+añadiendo atajos (aristas que sustituyen a un camino u -> v -> w) cuando no
+existe un camino alternativo igual de corto. Con el orden resultante cada
+arista queda en el grafo de subida (hacia vértices de mayor rango) o en el
+de bajada, y una consulta es un Dijkstra bidireccional que solo sube de
+rango, por lo que asienta unos pocos cientos de vértices.
+
+Uso:
+    python contraccion.py grafos/plano_de_madrid_tsp2.grf
+construye la jerarquía, la guarda junto al grafo (.grf.ch) y compara su
+tiempo de consulta con camino_minimo.
+"""
+
+import heapq
+import random as r
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+import persistencia
+from grafo_compacto import GrafoCompacto
+
+INFTY = float("inf")
+
+# Vértices que puede asentar una búsqueda de testigos antes de rendirse
+# (y añadir el atajo, que siempre es correcto aunque sobre).
+LIMITE_TESTIGOS = 200
+
+
+class JerarquiaContraccion:
+    # Grafos de subida y bajada con atajos, indexados por id de GrafoCompacto
+
+    def __init__(
+        self,
+        grafo: GrafoCompacto,
+        rango: np.ndarray,
+        subida: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+        bajada: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+    ):
+        """Crea la jerarquía a partir de sus arrays. Normalmente se obtiene
+        con construir o cargar.
+
+        Args:
+            grafo: GrafoCompacto sobre el que se construyó
+            rango: posición de cada vértice en el orden de contracción
+            subida: arrays CSR (offsets, destinos, pesos, medios) de las
+            aristas v -> w con rango[w] > rango[v], guardadas en v
+            bajada: arrays CSR (offsets, destinos, pesos, medios) de las
+            aristas u -> v con rango[u] > rango[v], guardadas en v y
+            apuntando a u
+            Los medios son el vértice contraído que sustituye cada atajo, o
+            -1 en las aristas originales.
+        Returns: JerarquiaContraccion lista para consultas.
+        """
+        self.grafo = grafo
+        # Versión de los pesos del grafo con la que se construyó
+        self.version = grafo._version
+        self.rango = np.asarray(rango)
+        self.subida = tuple(np.asarray(a) for a in subida)
+        self.bajada = tuple(np.asarray(a) for a in bajada)
+        self._listas = (
+            tuple(a.tolist() for a in self.subida),
+            tuple(a.tolist() for a in self.bajada),
+        )
+
+    #### Preprocesado ####
+    @classmethod
+    def construir(
+        cls, grafo: GrafoCompacto, verbose: bool = False
+    ) -> "JerarquiaContraccion":
+        """Contrae todos los vértices del grafo y construye la jerarquía.
+
+        El orden se elige con una cola de prioridad perezosa sobre la
+        diferencia de aristas (atajos necesarios menos aristas eliminadas)
+        más el número de vecinos ya contraídos: al sacar un vértice se
+        recalcula su prioridad y, si ya no es la menor, se vuelve a encolar.
+
+        Args:
+            grafo: GrafoCompacto (dirigido o no)
+            verbose: si se imprime el progreso
+        Returns: JerarquiaContraccion del grafo.
+        """
+        n = len(grafo)
+        offsets, destinos, pesos = grafo._listas
+        salida: List[Dict[int, Tuple[float, int]]] = [{} for _ in range(n)]
+        entrada: List[Dict[int, Tuple[float, int]]] = [{} for _ in range(n)]
+        for v in range(n):
+            for k in range(offsets[v], offsets[v + 1]):
+                w = destinos[k]
+                if w != v and pesos[k] < salida[v].get(w, (INFTY,))[0]:
+                    salida[v][w] = (pesos[k], -1)
+                    entrada[w][v] = (pesos[k], -1)
+
+        contraidos = [0] * n
+        pq = [(_prioridad(v, salida, entrada, contraidos), v) for v in range(n)]
+        heapq.heapify(pq)
+        rango = np.zeros(n, dtype=np.int32)
+        aristas_subida, aristas_bajada = [], []
+        siguiente = 0
+        while pq:
+            _, v = heapq.heappop(pq)
+            prioridad = _prioridad(v, salida, entrada, contraidos)
+            if pq and prioridad > pq[0][0]:
+                heapq.heappush(pq, (prioridad, v))
+                continue
+            rango[v] = siguiente
+            siguiente += 1
+            for w, (peso, medio) in salida[v].items():
+                aristas_subida.append((v, w, peso, medio))
+            for u, (peso, medio) in entrada[v].items():
+                aristas_bajada.append((v, u, peso, medio))
+            for u, w, peso in _atajos(v, salida, entrada):
+                if peso < salida[u].get(w, (INFTY,))[0]:
+                    salida[u][w] = (peso, v)
+                    entrada[w][u] = (peso, v)
+            for w in salida[v]:
+                del entrada[w][v]
+                contraidos[w] += 1
+            for u in entrada[v]:
+                del salida[u][v]
+                contraidos[u] += 1
+            salida[v], entrada[v] = {}, {}
+            if verbose and siguiente % 1000 == 0:
+                print(f"Contraídos {siguiente}/{n} vértices")
+        return cls(grafo, rango, _csr(n, aristas_subida), _csr(n, aristas_bajada))
+
+    #### Persistencia ####
+    def guardar(self, path: str) -> None:
+        """Guarda la jerarquía en el formato binario de persistencia.py.
+        Por convenio se guarda junto al grafo, como <grafo>.grf.ch.
+
+        Args: path ruta del fichero de salida
+        Returns: None
+        """
+        arrays = {"rango": self.rango}
+        for nombre, csr in (("subida", self.subida), ("bajada", self.bajada)):
+            for campo, a in zip(("offsets", "destinos", "pesos", "medios"), csr):
+                arrays[f"{nombre}_{campo}"] = a
+        meta = {"vertices": len(self.grafo), "aristas": self.grafo.num_aristas()}
+        persistencia.guardar_arrays(path, "jerarquia", arrays, meta)
+
+    @classmethod
+    def cargar(cls, path: str, grafo: GrafoCompacto) -> "JerarquiaContraccion":
+        """Carga una jerarquía guardada con guardar.
+
+        Args:
+            path: ruta del fichero
+            grafo: GrafoCompacto sobre el que se construyó
+        Returns: JerarquiaContraccion lista para consultas.
+        """
+        tipo, meta, arrays = persistencia.cargar_arrays(path, mmap=False)
+        if tipo != "jerarquia":
+            raise ValueError(f"{path} contiene un {tipo}, no una jerarquía")
+        if (meta["vertices"], meta["aristas"]) != (len(grafo), grafo.num_aristas()):
+            raise ValueError(f"{path} no corresponde a este grafo")
+        csr = [
+            tuple(
+                arrays[f"{nombre}_{c}"]
+                for c in ("offsets", "destinos", "pesos", "medios")
+            )
+            for nombre in ("subida", "bajada")
+        ]
+        return cls(grafo, arrays["rango"], *csr)
+
+    #### Consultas ####
+    def camino_minimo(
+        self, origen: object, destino: object, estadisticas: dict = None
+    ) -> List[object]:
+        """Calcula el camino mínimo de origen a destino con una búsqueda
+        bidireccional que solo sube de rango, y desempaqueta los atajos en
+        los vértices originales.
+
+        Args:
+            origen: vértice de origen
+            destino: vértice de destino
+            estadisticas: diccionario opcional donde se guardan el número de
+            vértices asentados ("asentados") y el coste del camino ("coste")
+        Returns: Lista de vértices [origen, ..., destino] o None si alguno
+        no existe o destino no es alcanzable. Lanza ValueError si los pesos
+        del grafo han cambiado desde que se construyó la jerarquía.
+        """
+        if self.grafo._version != self.version:
+            raise ValueError("La jerarquía es de unos pesos anteriores: reconstrúyela")
+        ids = self.grafo.ids
+        if origen not in ids or destino not in ids:
+            return None
+        s, t = ids[origen], ids[destino]
+        dist = ({s: 0}, {t: 0})
+        padres = ({s: None}, {t: None})
+        visitados = (set(), set())
+        pqs = ([(0, s)], [(0, t)])
+        mejor, encuentro = INFTY, None
+        while pqs[0] or pqs[1]:
+            lado = 0 if pqs[0] and (not pqs[1] or pqs[0][0] <= pqs[1][0]) else 1
+            d, v = heapq.heappop(pqs[lado])
+            if d >= mejor:
+                pqs[lado].clear()
+                continue
+            if v in visitados[lado]:
+                continue
+            visitados[lado].add(v)
+            dist_lado = dist[lado]
+            if v in dist[1 - lado] and d + dist[1 - lado][v] < mejor:
+                mejor, encuentro = d + dist[1 - lado][v], v
+            # Stall-on-demand: si se llega a v más barato bajando desde un
+            # vértice de mayor rango ya alcanzado, v no está en ningún camino
+            # mínimo de esta búsqueda y no hace falta expandirlo.
+            offsets, destinos, pesos, _ = self._listas[1 - lado]
+            if any(
+                dist_lado.get(destinos[k], INFTY) + pesos[k] < d
+                for k in range(offsets[v], offsets[v + 1])
+            ):
+                continue
+            offsets, destinos, pesos, _ = self._listas[lado]
+            for k in range(offsets[v], offsets[v + 1]):
+                w = destinos[k]
+                nd = d + pesos[k]
+                if nd < dist_lado.get(w, INFTY):
+                    dist_lado[w] = nd
+                    padres[lado][w] = (v, k)
+                    heapq.heappush(pqs[lado], (nd, w))
+        if estadisticas is not None:
+            estadisticas["asentados"] = len(visitados[0]) + len(visitados[1])
+            estadisticas["coste"] = mejor if encuentro is not None else None
+        if encuentro is None:
+            return None
+        camino = [s]
+        subida = []
+        v = encuentro
+        while padres[0][v] is not None:
+            u, k = padres[0][v]
+            subida.append((u, v, k))
+            v = u
+        for u, v, k in reversed(subida):
+            camino.extend(self._desempaquetar(u, v, self._listas[0][3][k])[1:])
+        v = encuentro
+        while padres[1][v] is not None:
+            w, k = padres[1][v]
+            camino.extend(self._desempaquetar(v, w, self._listas[1][3][k])[1:])
+            v = w
+        vertices = self.grafo.vertices
+        return [vertices[v] for v in camino]
+
+    def _desempaquetar(self, u: int, w: int, medio: int) -> List[int]:
+        """Sustituye recursivamente un atajo u -> w por el camino original.
+
+        Args:
+            u: id del vértice de origen de la arista
+            w: id del vértice de destino de la arista
+            medio: vértice contraído del atajo (-1 si es una arista original)
+        Returns: Lista de ids [u, ..., w] del camino en el grafo original.
+        """
+        camino = [u]
+        pila = [(u, w, medio)]
+        while pila:
+            a, b, m = pila.pop()
+            if m == -1:
+                camino.append(b)
+                continue
+            # m tiene menor rango que a y b: a -> m está en la bajada de m y
+            # m -> b en su subida
+            pila.append((m, b, self._medio(0, m, b)))
+            pila.append((a, m, self._medio(1, m, a)))
+        return camino
+
+    def _medio(self, lado: int, v: int, w: int) -> int:
+        """Busca en la fila v del grafo de subida (lado 0) o de bajada
+        (lado 1) la arista de menor peso hacia w y devuelve su medio.
+        """
+        offsets, destinos, pesos, medios = self._listas[lado]
+        mejor, medio = INFTY, -1
+        for k in range(offsets[v], offsets[v + 1]):
+            if destinos[k] == w and pesos[k] < mejor:
+                mejor, medio = pesos[k], medios[k]
+        return medio
+
+
+def _testigos(
+    u: int, excluido: int, limite: float, salida: List[Dict[int, tuple]]
+) -> Dict[int, float]:
+    """Dijkstra local desde u sin pasar por el vértice excluido, que se
+    detiene al superar el coste limite o LIMITE_TESTIGOS vértices asentados.
+
+    Args:
+        u: id del vértice de origen
+        excluido: id del vértice que se va a contraer
+        limite: coste máximo que interesa
+        salida: aristas de salida de los vértices aún no contraídos
+    Returns: Diccionario con las distancias encontradas desde u.
+    """
+    dist = {u: 0}
+    pq = [(0, u)]
+    asentados = 0
+    while pq and asentados < LIMITE_TESTIGOS:
+        d, v = heapq.heappop(pq)
+        if d > dist[v]:
+            continue
+        if d > limite:
+            break
+        asentados += 1
+        for w, (peso, _) in salida[v].items():
+            nd = d + peso
+            if w != excluido and nd < dist.get(w, INFTY):
+                dist[w] = nd
+                heapq.heappush(pq, (nd, w))
+    return dist
+
+
+def _atajos(v: int, salida, entrada) -> List[Tuple[int, int, float]]:
+    """Calcula los atajos necesarios para contraer v: uno por cada par
+    u -> v -> w sin un camino testigo de coste menor o igual.
+
+    Args:
+        v: id del vértice a contraer
+        salida: aristas de salida de los vértices aún no contraídos
+        entrada: aristas de entrada de los vértices aún no contraídos
+    Returns: Lista de atajos (u, w, peso).
+    """
+    atajos = []
+    if not salida[v]:
+        return atajos
+    max_salida = max(p for p, _ in salida[v].values())
+    for u, (peso_uv, _) in entrada[v].items():
+        dist = _testigos(u, v, peso_uv + max_salida, salida)
+        for w, (peso_vw, _) in salida[v].items():
+            if w != u and dist.get(w, INFTY) > peso_uv + peso_vw:
+                atajos.append((u, w, peso_uv + peso_vw))
+    return atajos
+
+
+def _prioridad(v: int, salida, entrada, contraidos: List[int]) -> int:
+    """Prioridad de contracción de v: diferencia de aristas más vecinos
+    ya contraídos. Cuanto menor, antes se contrae.
+    """
+    diferencia = len(_atajos(v, salida, entrada)) - len(salida[v]) - len(entrada[v])
+    return diferencia + contraidos[v]
+
+
+def _csr(n: int, aristas: List[Tuple[int, int, float, int]]):
+    """Convierte una lista de aristas (v, w, peso, medio) en arrays CSR
+    agrupados por v.
+    """
+    aristas.sort(key=lambda a: a[0])
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount([a[0] for a in aristas], minlength=n), out=offsets[1:])
+    destinos = np.array([a[1] for a in aristas], dtype=np.int32)
+    pesos = np.array([a[2] for a in aristas], dtype=np.float64)
+    medios = np.array([a[3] for a in aristas], dtype=np.int32)
+    return offsets, destinos, pesos, medios
+
+
+def comparar(
+    grafo: GrafoCompacto,
+    jerarquia: JerarquiaContraccion,
+    n_consultas: int = 100,
+    semilla: int = 0,
+) -> dict:
+    """Compara el tiempo de consulta de la jerarquía con camino_minimo
+    (Dijkstra) sobre pares aleatorios, comprobando que los costes coinciden.
+
+    Args:
+        grafo: GrafoCompacto
+        jerarquia: JerarquiaContraccion del mismo grafo
+        n_consultas: número de pares origen-destino
+        semilla: semilla de la selección de pares
+    Returns: Diccionario con el tiempo medio por consulta (ms) y los
+    vértices asentados medios de cada método, y el número de consultas
+    en las que los costes difieren.
+    """
+    rng = r.Random(semilla)
+    vertices = grafo.vertices
+    pares = [(rng.choice(vertices), rng.choice(vertices)) for _ in range(n_consultas)]
+    resultados = {"consultas": n_consultas, "diferencias": 0}
+    costes = {}
+    for nombre, f in (
+        ("dijkstra", grafo.camino_minimo),
+        ("jerarquia", jerarquia.camino_minimo),
+    ):
+        tiempo, asentados, costes[nombre] = 0.0, 0, []
+        for o, d in pares:
+            e = {}
+            inicio = time.perf_counter()
+            f(o, d, estadisticas=e)
+            tiempo += time.perf_counter() - inicio
+            asentados += e["asentados"]
+            costes[nombre].append(e["coste"])
+        resultados[nombre] = {
+            "ms_por_consulta": 1000 * tiempo / n_consultas,
+            "asentados_medios": asentados / n_consultas,
+        }
+    resultados["diferencias"] = sum(
+        a != b for a, b in zip(costes["dijkstra"], costes["jerarquia"])
+    )
+    return resultados
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    madrid = GrafoCompacto.cargar(sys.argv[1])
+    inicio = time.perf_counter()
+    ch = JerarquiaContraccion.construir(madrid, verbose=True)
+    print(f"Preprocesado: {time.perf_counter() - inicio:.1f} s")
+    ch.guardar(sys.argv[1] + ".ch")
+    print(comparar(madrid, ch))
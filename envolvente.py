@@ -0,0 +1,129 @@
+"""
+envolvente.py
+
+Envolventes de nubes de puntos en coordenadas (x, y) en cm, para dibujar
+las isócronas de Grafo.isocrona como polígonos.
+
+    - envolvente_convexa: cadena monótona de Andrew, O(n log n).
+    - envolvente_concava: parte de la convexa y "excava" cada lado más
+      largo que una longitud dada hacia el punto interior más cercano,
+      mientras el polígono siga siendo simple y los lados nuevos sean más
+      cortos que el excavado. Todos los puntos quedan dentro del polígono
+      o en su borde.
+"""
+
+from typing import List
+
+import numpy as np
+
+# Longitud máxima por defecto de los lados de la envolvente cóncava (cm)
+LONGITUD_ENVOLVENTE = 20000
+
+
+def _cruz(o: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Producto vectorial (a - o) x (b - o); positivo si o, a, b giran a
+    la izquierda.
+    """
+    return (a[..., 0] - o[..., 0]) * (b[..., 1] - o[..., 1]) - (
+        a[..., 1] - o[..., 1]
+    ) * (b[..., 0] - o[..., 0])
+
+
+def envolvente_convexa(puntos: np.ndarray) -> List[int]:
+    """Envolvente convexa con la cadena monótona de Andrew.
+
+    Args: puntos array (n, 2) de coordenadas
+    Returns: Lista de posiciones de los puntos de la envolvente en sentido
+    antihorario, sin puntos alineados.
+    """
+    puntos = np.asarray(puntos, dtype=np.float64)
+    orden = np.lexsort((puntos[:, 1], puntos[:, 0])).tolist()
+    if len(orden) < 3:
+        return orden
+    xy = puntos.tolist()
+
+    def cadena(indices):
+        resultado = []
+        for i in indices:
+            while len(resultado) >= 2:
+                (ox, oy), (ax, ay) = xy[resultado[-2]], xy[resultado[-1]]
+                bx, by = xy[i]
+                if (ax - ox) * (by - oy) - (ay - oy) * (bx - ox) > 0:
+                    break
+                resultado.pop()
+            resultado.append(i)
+        return resultado
+
+    return cadena(orden)[:-1] + cadena(orden[::-1])[:-1]
+
+
+def envolvente_concava(
+    puntos: np.ndarray, longitud: float = LONGITUD_ENVOLVENTE
+) -> np.ndarray:
+    """Envolvente cóncava de una nube de puntos.
+
+    Partiendo de la envolvente convexa, cada lado (a, b) más largo que
+    longitud se sustituye por (a, p), (p, b), donde p es el punto interior
+    más cercano a la recta ab entre los que se proyectan dentro del
+    segmento. Con esa elección el triángulo apb no contiene otros puntos,
+    así que ninguno queda fuera. El lado no se excava si los lados nuevos
+    no son más cortos que él o si cortarían el polígono.
+
+    Args:
+        puntos: array (n, 2) de coordenadas
+        longitud: longitud por debajo de la cual no se excavan los lados
+    Returns: Array (k, 2) con los vértices del polígono en sentido
+    antihorario.
+    """
+    puntos = np.unique(np.asarray(puntos, dtype=np.float64).reshape(-1, 2), axis=0)
+    poligono = envolvente_convexa(puntos)
+    if len(poligono) < 3:
+        return puntos[poligono]
+    interior = np.ones(len(puntos), dtype=bool)
+    interior[poligono] = False
+    siguiente = dict(zip(poligono, poligono[1:] + poligono[:1]))
+    pendientes = list(siguiente.items())
+    while pendientes:
+        a, b = pendientes.pop()
+        if siguiente.get(a) != b:
+            continue
+        pa, pb = puntos[a], puntos[b]
+        lado = float(np.hypot(*(pb - pa)))
+        candidatos = np.flatnonzero(interior)
+        if lado <= longitud or not len(candidatos):
+            continue
+        q = puntos[candidatos]
+        t = ((q - pa) @ (pb - pa)) / lado**2
+        altura = _cruz(pa, pb, q) / lado
+        validos = (t > 0) & (t < 1) & (altura > 0)
+        if not validos.any():
+            continue
+        p = int(candidatos[validos][np.argmin(altura[validos])])
+        pp = puntos[p]
+        if max(np.hypot(*(pp - pa)), np.hypot(*(pb - pp))) >= lado:
+            continue
+        origenes = np.array([u for u in siguiente if u != a])
+        inicios = puntos[origenes]
+        finales = puntos[[siguiente[u] for u in origenes.tolist()]]
+        if _cortan(pa, pp, inicios, finales) or _cortan(pp, pb, inicios, finales):
+            continue
+        siguiente[a], siguiente[p] = p, b
+        interior[p] = False
+        pendientes.extend([(a, p), (p, b)])
+    vertices = [poligono[0]]
+    while siguiente[vertices[-1]] != vertices[0]:
+        vertices.append(siguiente[vertices[-1]])
+    return puntos[vertices]
+
+
+def _cortan(
+    p1: np.ndarray, p2: np.ndarray, inicios: np.ndarray, finales: np.ndarray
+) -> bool:
+    """Indica si el segmento p1p2 corta propiamente (no solo toca) a alguno
+    de los segmentos inicios[i] finales[i].
+    """
+    d1 = _cruz(inicios, finales, p1)
+    d2 = _cruz(inicios, finales, p2)
+    d3 = _cruz(p1, p2, inicios)
+    d4 = _cruz(p1, p2, finales)
+    return bool(((d1 * d2 < 0) & (d3 * d4 < 0)).any())
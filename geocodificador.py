@@ -0,0 +1,311 @@
+"""
+geocodificador.py
+
+Geocodificador de direcciones con índice invertido, que devuelve las mismas
+direcciones que ordenar todo direcciones_clean.csv por str_dist pero solo
+calcula la distancia de Levenshtein de unas pocas candidatas.
+
+Para cada dirección se indexan sus trigramas y sus palabras. Con ellos se
+calcula, para todas las direcciones a la vez y con NumPy, una cota inferior
+de str_dist:
+    - Levenshtein(x, q) >= |len(x) - len(q)|
+    - cada edición destruye como mucho 3 trigramas, así que
+      Levenshtein(x, q) >= (max(trigramas(x), trigramas(q)) - comunes) / 3
+    - cada edición cambia como mucho un carácter de cada lado, así que
+      Levenshtein(x, q) >= caracteres de x que sobran respecto a q (y al
+      revés), contando los caracteres con histogramas
+    - las palabras comunes se cuentan exactamente con el índice de palabras
+    - el término "q in x" resta 2 solo si x contiene todos los trigramas de q
+Las direcciones se puntúan en orden de cota creciente hasta que la cota de
+la siguiente supera a la k-ésima mejor puntuación.
+
+Uso:
+    python geocodificador.py data/direcciones_clean.csv data/direcciones.geo
+"""
+
+import sys
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import Levenshtein
+import numpy as np
+import pandas as pd
+
+import persistencia
+
+# Número de candidatas que se puntúan en cada ronda
+LOTE = 64
+# Caracteres con columna propia en los histogramas; el resto comparten una.
+# Juntar caracteres en una columna solo puede hacer la cota más baja.
+ALFABETO = "abcdefghijklmnopqrstuvwxyzñ0123456789 .-/'ºª"
+
+
+def clean_direccion(direccion):
+    """convierte a minusculas y reemplaza acentos"""
+    direccion = direccion.lower()
+    direccion = direccion.replace("á", "a")
+    direccion = direccion.replace("é", "e")
+    direccion = direccion.replace("í", "i")
+    direccion = direccion.replace("ó", "o")
+    direccion = direccion.replace("ú", "u")
+    return direccion
+
+
+def str_dist(x: str, origin: str) -> int:
+    """Distancia entre una dirección x y el texto buscado: Levenshtein menos
+    las palabras en común y menos 2 si el texto está contenido en x.
+    """
+    d = Levenshtein.distance(x, origin)
+    common = set(x.split()).intersection(set(origin.split()))
+    return d - len(common) - 2 * int(origin in x)
+
+
+def _trigramas(texto: str) -> List[str]:
+    """Trigramas de texto, con repeticiones."""
+    return [texto[i : i + 3] for i in range(len(texto) - 2)]
+
+
+def _histogramas(textos: List[str]) -> np.ndarray:
+    """Histograma de caracteres de cada texto sobre ALFABETO más una
+    columna final para el resto de caracteres.
+    """
+    columnas = {c: i for i, c in enumerate(ALFABETO)}
+    otros = len(ALFABETO)
+    codigos = np.array(
+        [columnas.get(c, otros) for t in textos for c in t], dtype=np.int64
+    )
+    filas = np.repeat(np.arange(len(textos)), [len(t) for t in textos])
+    hist = np.zeros((len(textos), otros + 1), dtype=np.int16)
+    np.add.at(hist, (filas, codigos), 1)
+    return hist
+
+
+def _indice_invertido(
+    elementos: List[List[str]],
+) -> Tuple[Dict[str, int], np.ndarray, np.ndarray]:
+    """Construye un índice invertido en formato CSR.
+
+    Args: elementos lista con los elementos (trigramas o palabras) de cada
+    dirección
+    Returns: Tupla (vocabulario, offsets, direcciones) donde las direcciones
+    que contienen el elemento vocabulario[e] son
+    direcciones[offsets[e]:offsets[e + 1]], sin repeticiones.
+    """
+    vocabulario: Dict[str, int] = {}
+    filas, columnas = [], []
+    for i, elems in enumerate(elementos):
+        for e in set(elems):
+            filas.append(vocabulario.setdefault(e, len(vocabulario)))
+            columnas.append(i)
+    filas = np.array(filas, dtype=np.int64)
+    orden = np.argsort(filas, kind="stable")
+    offsets = np.zeros(len(vocabulario) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(filas, minlength=len(vocabulario)), out=offsets[1:])
+    return vocabulario, offsets, np.array(columnas, dtype=np.int32)[orden]
+
+
+class Geocodificador:
+    # Índice de trigramas y palabras sobre las direcciones normalizadas
+
+    def __init__(self, direcciones: pd.DataFrame, indices: dict, histogramas=None):
+        """Crea el geocodificador. Normalmente se obtiene con construir o
+        cargar.
+
+        Args:
+            direcciones: DataFrame con las columnas "Direccion completa",
+            id_via, x e y
+            indices: diccionario con los índices invertidos "trigramas" y
+            "palabras", cada uno una tupla (vocabulario, offsets, direcciones)
+            histogramas: histogramas de caracteres de las direcciones (se
+            calculan si no se dan)
+        Returns: Geocodificador listo para consultas.
+        """
+        self.direcciones = direcciones.reset_index(drop=True)
+        self.textos = [
+            clean_direccion(d) for d in self.direcciones["Direccion completa"]
+        ]
+        self.longitudes = np.array([len(t) for t in self.textos], dtype=np.int64)
+        if histogramas is None:
+            histogramas = _histogramas(self.textos)
+        self.histogramas = np.asarray(histogramas, dtype=np.int16)
+        self.indices = indices
+
+    @classmethod
+    def construir(cls, direcciones: pd.DataFrame) -> "Geocodificador":
+        """Construye los índices sobre un DataFrame de direcciones.
+
+        Args: direcciones DataFrame como el de data/direcciones_clean.csv
+        Returns: Geocodificador de esas direcciones.
+        """
+        direcciones = direcciones[["Direccion completa", "id_via", "x", "y"]]
+        textos = [clean_direccion(d) for d in direcciones["Direccion completa"]]
+        indices = {
+            "trigramas": _indice_invertido([_trigramas(t) for t in textos]),
+            "palabras": _indice_invertido([t.split() for t in textos]),
+        }
+        return cls(direcciones, indices)
+
+    def guardar(self, path: str) -> None:
+        """Guarda las direcciones y los índices en el formato binario de
+        persistencia.py.
+
+        Args: path ruta del fichero de salida
+        Returns: None
+        """
+        arrays = {
+            "id_via": self.direcciones["id_via"].to_numpy(np.int64),
+            "x": self.direcciones["x"].to_numpy(np.int64),
+            "y": self.direcciones["y"].to_numpy(np.int64),
+            "histogramas": self.histogramas.astype(np.uint8),
+        }
+        arrays["textos"], arrays["textos_offsets"] = persistencia.empaquetar_textos(
+            list(self.direcciones["Direccion completa"])
+        )
+        for nombre, (vocabulario, offsets, direcciones) in self.indices.items():
+            arrays[f"{nombre}_vocabulario"], arrays[f"{nombre}_vocabulario_offsets"] = (
+                persistencia.empaquetar_textos(list(vocabulario))
+            )
+            arrays[f"{nombre}_offsets"] = offsets
+            arrays[f"{nombre}_direcciones"] = direcciones
+        persistencia.guardar_arrays(path, "geocodificador", arrays)
+
+    @classmethod
+    def cargar(cls, path: str) -> "Geocodificador":
+        """Carga un geocodificador guardado con guardar.
+
+        Args: path ruta del fichero
+        Returns: Geocodificador listo para consultas.
+        """
+        tipo, _, arrays = persistencia.cargar_arrays(path, mmap=False)
+        if tipo != "geocodificador":
+            raise ValueError(f"{path} contiene un {tipo}, no un geocodificador")
+        textos = persistencia.TextosEmpaquetados(
+            arrays["textos"], arrays["textos_offsets"]
+        )
+        direcciones = pd.DataFrame(
+            {
+                "Direccion completa": list(textos),
+                "id_via": arrays["id_via"],
+                "x": arrays["x"],
+                "y": arrays["y"],
+            }
+        )
+        indices = {}
+        for nombre in ("trigramas", "palabras"):
+            vocabulario = persistencia.TextosEmpaquetados(
+                arrays[f"{nombre}_vocabulario"],
+                arrays[f"{nombre}_vocabulario_offsets"],
+            )
+            indices[nombre] = (
+                {e: i for i, e in enumerate(vocabulario)},
+                arrays[f"{nombre}_offsets"],
+                arrays[f"{nombre}_direcciones"],
+            )
+        return cls(direcciones, indices, arrays["histogramas"])
+
+    def _contar(self, nombre: str, elementos: List[str]) -> Tuple[np.ndarray, ...]:
+        """Cuenta, para cada dirección, los elementos de la consulta que
+        contiene según el índice invertido indicado.
+
+        Args:
+            nombre: "trigramas" o "palabras"
+            elementos: elementos de la consulta, con repeticiones
+        Returns: Tupla (con_repeticiones, distintos): suma de las
+        repeticiones en la consulta de los elementos contenidos y número de
+        elementos distintos contenidos.
+        """
+        vocabulario, offsets, direcciones = self.indices[nombre]
+        con_repeticiones = np.zeros(len(self.textos), dtype=np.int64)
+        distintos = np.zeros(len(self.textos), dtype=np.int64)
+        for e, repeticiones in Counter(elementos).items():
+            if e in vocabulario:
+                i = vocabulario[e]
+                contienen = direcciones[offsets[i] : offsets[i + 1]]
+                con_repeticiones[contienen] += repeticiones
+                distintos[contienen] += 1
+        return con_repeticiones, distintos
+
+    def _cotas(self, texto: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Separa la cota de str_dist(x, texto) en la cota de la distancia de
+        Levenshtein y lo que se resta por palabras comunes y contención.
+        """
+        trigramas = _trigramas(texto)
+        comunes, distintos = self._contar("trigramas", trigramas)
+        _, palabras = self._contar("palabras", texto.split())
+        n_trigramas = np.maximum(self.longitudes, len(texto)) - 2
+        por_trigramas = -(-(n_trigramas - comunes) // 3)
+        por_longitud = np.abs(self.longitudes - len(texto))
+        contenido = (distintos == len(set(trigramas))) & (self.longitudes >= len(texto))
+        return np.maximum(por_trigramas, por_longitud), palabras + 2 * contenido
+
+    def cotas(self, texto: str) -> np.ndarray:
+        """Cota inferior de str_dist(x, texto) para todas las direcciones x,
+        con los índices de trigramas y palabras.
+
+        Args: texto texto buscado, ya normalizado
+        Returns: Array de cotas, una por dirección.
+        """
+        edicion, descuento = self._cotas(texto)
+        return edicion - descuento
+
+    def _cotas_caracteres(self, texto: str, candidatas: np.ndarray) -> np.ndarray:
+        """Cota inferior de Levenshtein(x, texto) por diferencia de
+        histogramas de caracteres, solo para las direcciones candidatas.
+        """
+        diferencia = self.histogramas[candidatas].astype(np.int16)
+        diferencia -= _histogramas([texto])[0]
+        return np.maximum(
+            np.maximum(diferencia, 0).sum(axis=1),
+            np.maximum(-diferencia, 0).sum(axis=1),
+        )
+
+    def geocode(self, text: str, k: int = 5) -> pd.DataFrame:
+        """Busca las k direcciones más parecidas al texto según str_dist.
+
+        Primero se puntúan las LOTE direcciones con menor cota para tener
+        un umbral (la k-ésima mejor puntuación hasta ahora), se descartan las
+        direcciones con cota mayor y se afina la cota de las restantes con
+        los histogramas de caracteres.
+
+        Args:
+            text: dirección escrita por el usuario
+            k: número de resultados
+        Returns: DataFrame con las columnas "Direccion completa", id_via, x,
+        y y lev (el valor de str_dist), ordenado de más a menos parecida.
+        """
+        texto = clean_direccion(text)
+        k = max(0, min(k, len(self.textos)))
+        if k == 0:
+            return self.direcciones.iloc[[]].assign(lev=[])
+        edicion, descuento = self._cotas(texto)
+        cotas = edicion - descuento
+        n = min(max(k, LOTE), len(cotas))
+        primeras = np.argpartition(cotas, n - 1)[:n]
+        umbral = sorted(str_dist(self.textos[i], texto) for i in primeras.tolist())
+        candidatas = np.flatnonzero(cotas <= umbral[k - 1])
+        edicion = np.maximum(
+            edicion[candidatas], self._cotas_caracteres(texto, candidatas)
+        )
+        cotas = edicion - descuento[candidatas]
+        orden = np.argsort(cotas, kind="stable")
+        candidatas, cotas = candidatas[orden], cotas[orden]
+        puntuadas: List[Tuple[int, int]] = []
+        for inicio in range(0, len(candidatas), LOTE):
+            if len(puntuadas) >= k and cotas[inicio] > puntuadas[k - 1][0]:
+                break
+            puntuadas.extend(
+                (str_dist(self.textos[i], texto), i)
+                for i in candidatas[inicio : inicio + LOTE].tolist()
+            )
+            puntuadas.sort()
+            del puntuadas[k:]
+        resultado = self.direcciones.iloc[[i for _, i in puntuadas]].copy()
+        resultado["lev"] = [d for d, _ in puntuadas]
+        return resultado
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+    Geocodificador.construir(pd.read_csv(sys.argv[1])).guardar(sys.argv[2])
@@ -1,74 +1,69 @@
-import grafo
-import Levenshtein
+import os
+import sys
+
 import pandas as pd
 
+from geocodificador import Geocodificador
+from grafo_compacto import GrafoCompacto
+from indice_espacial import IndiceEspacial
+from instrumentacion import Cronometro, TrazaFrontera
 
-def input_origin(direcciones):
-    def str_dist(x):
-        d = Levenshtein.distance(x, origin)
-        common = set(x.split()).intersection(set(origin.split()))
-        return d - len(common) - 2 * int(origin in x)
 
+def input_origin(geocodificador: Geocodificador, cronometro: Cronometro) -> pd.Series:
+    """pide una direccion y devuelve la mas parecida de direcciones_clean.csv;
+    el tiempo de geocodificacion (sin contar la espera) se mide en cronometro"""
     origin = input("Introduce direccion de origen: ")
-    direcciones["lev"] = direcciones["direccion_clean"].apply(lambda x: str_dist(x))
-    direcciones = direcciones.sort_values("lev")
-    return direcciones.iloc[0]
-
-
-def clean_direccion(direccion):
-    """convierte a minusculas y reemplaza acentos"""
-    direccion = direccion.lower()
-    direccion = direccion.replace("á", "a")
-    direccion = direccion.replace("é", "e")
-    direccion = direccion.replace("í", "i")
-    direccion = direccion.replace("ó", "o")
-    direccion = direccion.replace("ú", "u")
-    return direccion
+    with cronometro.fase("geocodificacion"):
+        return geocodificador.geocode(origin, 1).iloc[0]
 
 
 def find_closest_vertex(origin: pd.Series):
-    """encuentra el vertice mas cercano a una direccion"""
-    global cruces
-
-    dist = lambda x: (origin["x"] - x["x"]) ** 2 + (origin["y"] - x["y"]) ** 2
-
-    cruces["dist"] = cruces[
-        (cruces["id_via"] == origin["id_via"])
-        | (cruces["id_via_cruzada"] == origin["id_via"])
-    ].apply(dist, axis=1)
-    cruce = cruces.sort_values("dist").iloc[0]
-    return (int(cruce["x"]), int(cruce["y"]))
-
-
-madrid = grafo.Grafo()
-madrid.load_graph("grafos/plano_de_madrid_tsp2.txt")
-direcciones = pd.read_csv("data/direcciones_clean.csv")
-cruces = pd.read_csv("data/cruces_clean.csv")
-direcciones["direccion_clean"] = direcciones["Direccion completa"].apply(
-    clean_direccion
-)
-origin = input_origin(direcciones)
+    """encuentra el vertice de la misma via mas cercano a una direccion"""
+    return indice.vertice_mas_cercano(origin["x"], origin["y"], origin["id_via"])
+
+
+cronometro = Cronometro()
+with cronometro.fase("carga"):
+    # Convertir una vez con: python persistencia.py grafos/plano_de_madrid_tsp2.txt
+    madrid = GrafoCompacto.cargar("grafos/plano_de_madrid_tsp2.grf")
+    cruces = pd.read_csv("data/cruces_clean.csv")
+    indice = IndiceEspacial.desde_grafo(madrid, cruces)
+    if os.path.exists("data/direcciones.geo"):
+        geocodificador = Geocodificador.cargar("data/direcciones.geo")
+    else:
+        geocodificador = Geocodificador.construir(
+            pd.read_csv("data/direcciones_clean.csv")
+        )
+        geocodificador.guardar("data/direcciones.geo")
+origin = input_origin(geocodificador, cronometro)
 print("Origen: ", origin)
 
-destination = input_origin(direcciones)
+destination = input_origin(geocodificador, cronometro)
 print("Destino: ", destination)
 
-origin_vertex = find_closest_vertex(origin)
-destination_vertex = find_closest_vertex(destination)
-
-# camino = madrid.camino_minimo(origin_vertex, destination_vertex)
-
-madrid.draw_shortest_path(
-    origin_vertex,
-    destination_vertex,
-    pos={k: k for k in madrid.adj.keys()},
-    node_size=0.1,
-    arrows=False,
-    edge_width=0.1,
-)
-
-# print("El camino mas corto es: ", camino)
-
-
-# print("Origen: ", origin_vertex)
-# print("Destino: ", destination_vertex)
+with cronometro.fase("ajuste"):
+    origin_vertex = find_closest_vertex(origin)
+    destination_vertex = find_closest_vertex(destination)
+
+# Con python gps.py traza.csv se vuelca además la frontera de la búsqueda
+estadisticas = {}
+traza = TrazaFrontera() if len(sys.argv) > 1 else None
+with cronometro.fase("ruta"):
+    camino = madrid.camino_minimo(
+        origin_vertex, destination_vertex, estadisticas=estadisticas, traza=traza
+    )
+print("Búsqueda: ", estadisticas)
+if traza is not None:
+    traza.guardar(sys.argv[1])
+
+with cronometro.fase("dibujo"):
+    madrid.a_grafo().draw_shortest_path(
+        origin_vertex,
+        destination_vertex,
+        pos={k: k for k in madrid.vertices},
+        node_size=0.1,
+        arrows=False,
+        edge_width=0.1,
+        path=camino,
+    )
+print(cronometro)
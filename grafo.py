@@ -1,15 +1,57 @@
+import bisect
+import math
 import sys
-from typing import List, Tuple, Dict
+from numbers import Number
+from typing import Callable, List, Tuple, Dict
 import random as r
 
 import networkx as nx
 import matplotlib.pyplot as plt
+import numpy as np
 
-from heapdict import heapdict
+import persistencia
+from cache import CacheRutas, tamano_arbol, tamano_ruta
+from envolvente import LONGITUD_ENVOLVENTE, envolvente_concava
+from grafo_compacto import GrafoCompacto
+from instrumentacion import cola
+from union_find import UnionFind
 
 INFTY = sys.float_info.max
 
 
+def _es_coordenada(v: object) -> bool:
+    """Indica si v es un par (x, y) numérico, como los vértices del plano."""
+    return (
+        isinstance(v, tuple)
+        and len(v) == 2
+        and isinstance(v[0], Number)
+        and isinstance(v[1], Number)
+    )
+
+
+def _vertices(vertices) -> list:
+    """Lista de vértices a partir de una secuencia de vértices o de un
+    array (m, 2) de coordenadas, que se convierten en tuplas (x, y).
+    """
+    if hasattr(vertices, "ndim") and vertices.ndim == 2:
+        return list(map(tuple, vertices.tolist()))
+    return vertices.tolist() if hasattr(vertices, "tolist") else list(vertices)
+
+
+def _camino_arbol(parents: Dict[object, object], destino: object) -> List[object]:
+    """Camino desde la raíz de un árbol de padres hasta destino, o None si
+    destino no está en el árbol.
+    """
+    if destino not in parents:
+        return None
+    path = []
+    v = destino
+    while v is not None:
+        path.append(v)
+        v = parents[v]
+    return path[::-1]
+
+
 class Grafo:
     # Diseñar y construir la clase grafo
 
@@ -23,7 +65,19 @@ class Grafo:
         """
         self._dirigido = dirigido
         self.adj: dict[object, dict[object, dict]] = {}
+        # Lista de adyacencia inversa (predecesores), mantenida en cada
+        # edición: adj_inv[t][s] es la misma arista que adj[s][t]. En los
+        # grafos no dirigidos es la propia adj.
+        self.adj_inv: dict[object, dict[object, dict]] = {}
+        self._crear_inversa()
         self.aristas: dict[object, dict] = {}
+        self._derivados: dict[str, object] = {}
+        # Versión del grafo, que se incrementa en cada edición de aristas
+        self._version = 0
+        # Caché de consultas (ver activar_cache)
+        self.cache: CacheRutas = None
+        # Peso original de las aristas cambiadas con actualizar_pesos
+        self._pesos_base: Dict[tuple, float] = {}
 
     def __str__(self):
         """Representación en string del grafo.
@@ -58,6 +112,48 @@ class Grafo:
         """
         return self._dirigido
 
+    def _crear_inversa(self) -> None:
+        """Construye adj_inv a partir de adj (al crear o cargar el grafo).
+
+        Args: None
+        Returns: None
+        """
+        if not self.es_dirigido():
+            self.adj_inv = self.adj
+            return
+        self.adj_inv = {v: {} for v in self.adj}
+        for s, vecinos in self.adj.items():
+            for t, arista in vecinos.items():
+                self.adj_inv[t][s] = arista
+
+    def _invalidar_derivados(self) -> None:
+        """Descarta los valores derivados guardados (p.ej. la velocidad
+        máxima de A*) e incrementa la versión del grafo, lo que invalida la
+        caché de consultas. Se llama en cada edición de aristas.
+
+        Args: None
+        Returns: None
+        """
+        self._derivados.clear()
+        self._version += 1
+
+    def activar_cache(self, max_bytes: int = None) -> CacheRutas:
+        """Activa la caché LRU de camino_minimo y dijkstra (ver cache.py).
+
+        Args: max_bytes presupuesto de memoria aproximado en bytes
+        Returns: La caché creada.
+        """
+        self.cache = CacheRutas() if max_bytes is None else CacheRutas(max_bytes)
+        return self.cache
+
+    def desactivar_cache(self) -> None:
+        """Desactiva y descarta la caché de consultas.
+
+        Args: None
+        Returns: None
+        """
+        self.cache = None
+
     def agregar_vertice(self, v: object) -> None:
         """Agrega el vértice v al grafo.
 
@@ -66,6 +162,8 @@ class Grafo:
         """
         if v not in self.adj:
             self.adj[v] = {}
+            if self.es_dirigido():
+                self.adj_inv[v] = {}
 
     def agregar_arista(
         self, s: object, t: object, data: object, weight: float = 1
@@ -85,26 +183,91 @@ class Grafo:
         if s == t and not self.es_dirigido():
             return None
         if s in self.adj and t in self.adj:
+            self._invalidar_derivados()
+            self._pesos_base.pop((s, t), None)
+            if not self.es_dirigido():
+                self._pesos_base.pop((t, s), None)
             self.aristas[(s, t)] = {"data": data, "weight": weight}
             self.adj[s][t] = {"data": data, "weight": weight}
             if not self.es_dirigido():
                 self.aristas[(t, s)] = {"data": data, "weight": weight}
                 self.adj[t][s] = {"data": data, "weight": weight}
+            else:
+                self.adj_inv[t][s] = self.adj[s][t]
+
+    def agregar_aristas_desde_arrays(
+        self, origenes, destinos, pesos, datos=None
+    ) -> None:
+        """Agrega de una vez las aristas origenes[i] -> destinos[i] con peso
+        pesos[i] y datos datos[i], creando los vértices que no existan.
+        Equivale a llamar a agregar_arista para cada i en orden (si una
+        arista se repite, se queda la última) pero sin su coste por llamada.
+
+        Args:
+            origenes: vértices de origen; un array (m, 2) se interpreta como
+            m vértices (x, y)
+            destinos: vértices de destino, en el mismo formato
+            pesos: array o lista de m pesos
+            datos: lista de m datos de las aristas (None por defecto)
+        Returns: None
+        """
+        origenes, destinos = _vertices(origenes), _vertices(destinos)
+        pesos = pesos.tolist() if hasattr(pesos, "tolist") else list(pesos)
+        if datos is None:
+            datos = [None] * len(pesos)
+        elif hasattr(datos, "tolist"):
+            datos = datos.tolist()
+        if not len(origenes) == len(destinos) == len(pesos) == len(datos):
+            raise ValueError(
+                "origenes, destinos, pesos y datos deben ser del mismo tamaño"
+            )
+        self._invalidar_derivados()
+        adj, aristas, dirigido = self.adj, self.aristas, self.es_dirigido()
+        adj_inv = self.adj_inv
+        for s, t, weight, data in zip(origenes, destinos, pesos, datos):
+            if s == t and not dirigido:
+                continue
+            if self._pesos_base:
+                self._pesos_base.pop((s, t), None)
+                if not dirigido:
+                    self._pesos_base.pop((t, s), None)
+            adj_s = adj.get(s)
+            if adj_s is None:
+                adj_s = adj[s] = {}
+                if dirigido:
+                    adj_inv[s] = {}
+            adj_t = adj.get(t)
+            if adj_t is None:
+                adj_t = adj[t] = {}
+                if dirigido:
+                    adj_inv[t] = {}
+            aristas[(s, t)] = adj_s[t] = {"data": data, "weight": weight}
+            if not dirigido:
+                aristas[(t, s)] = adj_t[s] = {"data": data, "weight": weight}
+            else:
+                adj_inv[t][s] = adj_s[t]
 
     def eliminar_vertice(self, v: object) -> None:
         """Si el objeto v es un vértice del grafo lo elimiina.
         Si no, no hace nada.
 
+        Solo se recorren las aristas de v (con adj_inv), no todo el grafo.
+
         Args: v vértice que se quiere eliminar
         Returns: None
         """
         if v in self.adj:
-            self.adj.pop(v, -1)
-            for u, value in self.adj.items():
-                value.pop(v, -1)
+            self._invalidar_derivados()
+            for u in self.adj_inv[v]:
+                if u != v:
+                    self.adj[u].pop(v, -1)
                 self.aristas.pop((u, v), -1)
-                if not self.es_dirigido():
-                    self.aristas.pop((v, u), -1)
+            for w in self.adj[v]:
+                if w != v:
+                    self.adj_inv[w].pop(v, -1)
+                self.aristas.pop((v, w), -1)
+            self.adj.pop(v, -1)
+            self.adj_inv.pop(v, -1)
 
     def eliminar_arista(self, s: object, t: object) -> None:
         """Si los objetos s y t son vértices del grafo y existe
@@ -117,11 +280,14 @@ class Grafo:
         Returns: None
         """
         if s in self.adj and t in self.adj:
+            self._invalidar_derivados()
             self.adj[s].pop(t, -1)
             self.aristas.pop((s, t), -1)
             if not self.es_dirigido():
                 self.adj[t].pop(s, -1)
                 self.aristas.pop((t, s), -1)
+            else:
+                self.adj_inv[t].pop(s, -1)
 
     def obtener_arista(self, s: object, t: object) -> Tuple[object, float] or None:
         """Si los objetos s y t son vértices del grafo y existe
@@ -137,6 +303,17 @@ class Grafo:
         arista = self.adj[s][t]
         return arista["data"], arista["weight"]
 
+    def lista_predecesores(self, u: object) -> List[object] or None:
+        """Si el objeto u es un vértice del grafo, devuelve la lista de
+        vértices con una arista hacia u (en los grafos no dirigidos, su
+        lista de adyacencia). Si no, devuelve None.
+
+        Args: u vértice del grafo
+        Returns: Una lista [v1,v2,...,vn] de los predecesores de u si u es
+        un vértice del grafo y None en caso contrario
+        """
+        return list(self.adj_inv[u].keys()) if u in self.adj else None
+
     def lista_adyacencia(self, u: object) -> List[object] or None:
         """Si el objeto u es un vértice del grafo, devuelve su lista de adyacencia.
         Si no, devuelve None.
@@ -148,6 +325,81 @@ class Grafo:
         """
         return list(self.adj[u].keys()) if u in self.adj else None
 
+    #### Actualización de pesos ####
+    def actualizar_pesos(self, aristas: List[Tuple[object, object]], pesos) -> int:
+        """Cambia en el sitio el peso de una lista de aristas (s, t), en
+        adj y en aristas, sin tocar la estructura del grafo. En los grafos
+        no dirigidos se cambian ambos sentidos. Las aristas que no existen
+        se ignoran.
+
+        Se incrementa la versión del grafo (lo que vacía la caché de
+        consultas) pero la lista de adyacencia inversa se conserva, y la
+        velocidad máxima de A* solo se descarta si algún peso baja.
+
+        Args:
+            aristas: lista de pares (s, t)
+            pesos: peso nuevo de cada arista
+        Returns: Número de aristas cambiadas (contando ambos sentidos).
+        """
+        cambios = []
+        for (s, t), w in zip(aristas, pesos):
+            cambios.append(((s, t), w))
+            if not self.es_dirigido():
+                cambios.append(((t, s), w))
+        return self._cambiar_pesos(cambios)
+
+    def _cambiar_pesos(self, cambios: List[Tuple[tuple, float]]) -> int:
+        """Aplica una lista de cambios (arista, peso) a exactamente esas
+        aristas, guardando su peso original la primera vez.
+        """
+        cambiadas, baja = 0, False
+        for e, w in cambios:
+            arista = self.aristas.get(e)
+            if arista is None:
+                continue
+            self._pesos_base.setdefault(e, arista["weight"])
+            baja = baja or w < arista["weight"]
+            arista["weight"] = w
+            self.adj[e[0]][e[1]]["weight"] = w
+            cambiadas += 1
+        if cambiadas:
+            self._version += 1
+            if baja:
+                self._derivados.pop("velocidad_maxima", None)
+        return cambiadas
+
+    def actualizar_pesos_via(self, factores: Dict[object, float]) -> int:
+        """Multiplica el peso original (el de antes de cualquier
+        actualización) de todas las aristas de cada vía por un factor. La
+        vía de una arista es su dato (el id_via en los grafos de
+        construccion.py). Un factor infinito corta la vía y un factor 1 la
+        restablece.
+
+        Args: factores diccionario id_via -> factor
+        Returns: Número de aristas cambiadas.
+        """
+        if "aristas_via" not in self._derivados:
+            aristas_via: Dict[object, list] = {}
+            for e, arista in self.aristas.items():
+                aristas_via.setdefault(arista["data"], []).append(e)
+            self._derivados["aristas_via"] = aristas_via
+        aristas_via = self._derivados["aristas_via"]
+        cambios = []
+        for via, factor in factores.items():
+            for e in aristas_via.get(via, []):
+                base = self._pesos_base.get(e, self.aristas[e]["weight"])
+                cambios.append((e, base * factor))
+        return self._cambiar_pesos(cambios)
+
+    def restablecer_pesos(self) -> None:
+        """Vuelve a los pesos originales de todas las aristas cambiadas.
+
+        Args: None
+        Returns: None
+        """
+        self._cambiar_pesos(list(self._pesos_base.items()))
+        self._pesos_base.clear()
+
     #### Grados de vértices ####
     def grado_saliente(self, v: object) -> int or None:
         """Si el objeto v es un vértice del grafo, devuelve
@@ -169,7 +421,7 @@ class Grafo:
         Returns: El grado entrante (int) si el vértice existe y
         None en caso contrario.
         """
-        return sum(1 for u in self.adj if v in self.adj[u]) if v in self.adj else None
+        return len(self.adj_inv[v]) if v in self.adj else None
 
     def grado(self, v: object) -> int or None:
         """Si el objeto u es un vértice del grafo, devuelve
@@ -186,83 +438,476 @@ class Grafo:
         grado = self.grado_saliente(v) + self.grado_entrante(v)
         return grado // (2 if not self.es_dirigido() else 1)
 
+    #### Conectividad ####
+    def _alcanzables(self, origen: object, visitados: set) -> List[object]:
+        """Vértices alcanzables desde origen ignorando el sentido de las
+        aristas (BFS iterativo por adj y adj_inv), sin pasar por visitados,
+        que se actualiza.
+        """
+        visitados.add(origen)
+        componente = [origen]
+        for v in componente:
+            for vecinos in (self.adj[v], self.adj_inv[v]):
+                for w in vecinos:
+                    if w not in visitados:
+                        visitados.add(w)
+                        componente.append(w)
+        return componente
+
     def es_conexo(self) -> bool:
         """Devuelve True si el grafo es conexo y False en caso contrario.
+        En los grafos dirigidos, si es débilmente conexo (conexo ignorando
+        el sentido de las aristas).
 
         Args: None
         Returns: True si el grafo es conexo y False en caso contrario.
         """
-        return self.convertir_a_NetworkX().is_connected()
+        if not self.adj:
+            return True
+        return len(self._alcanzables(next(iter(self.adj)), set())) == len(self.adj)
+
+    def componentes_conexas(self) -> List[List[object]]:
+        """Componentes conexas del grafo (débilmente conexas si es
+        dirigido), con un BFS iterativo desde cada vértice no visitado.
+
+        Args: None
+        Returns: Lista de componentes, cada una una lista de vértices,
+        ordenadas de mayor a menor tamaño.
+        """
+        visitados = set()
+        componentes = [
+            self._alcanzables(v, visitados) for v in self.adj if v not in visitados
+        ]
+        return sorted(componentes, key=len, reverse=True)
+
+    def componentes_fuertemente_conexas(self) -> List[List[object]]:
+        """Componentes fuertemente conexas con el algoritmo de Tarjan, con
+        una pila explícita en lugar de recursión para no depender del límite
+        de recursión en grafos grandes. En los grafos no dirigidos coinciden
+        con las componentes conexas.
+
+        Args: None
+        Returns: Lista de componentes, cada una una lista de vértices,
+        ordenadas de mayor a menor tamaño.
+        """
+        if not self.es_dirigido():
+            return self.componentes_conexas()
+        indice, bajo = {}, {}
+        pila, en_pila = [], set()
+        componentes = []
+        for raiz in self.adj:
+            if raiz in indice:
+                continue
+            indice[raiz] = bajo[raiz] = len(indice)
+            pila.append(raiz)
+            en_pila.add(raiz)
+            recorrido = [(raiz, iter(self.adj[raiz]))]
+            while recorrido:
+                v, vecinos = recorrido[-1]
+                for w in vecinos:
+                    if w not in indice:
+                        indice[w] = bajo[w] = len(indice)
+                        pila.append(w)
+                        en_pila.add(w)
+                        recorrido.append((w, iter(self.adj[w])))
+                        break
+                    if w in en_pila and indice[w] < bajo[v]:
+                        bajo[v] = indice[w]
+                else:
+                    # Todos los sucesores de v explorados: volver al padre
+                    recorrido.pop()
+                    if recorrido:
+                        padre = recorrido[-1][0]
+                        bajo[padre] = min(bajo[padre], bajo[v])
+                    if bajo[v] == indice[v]:
+                        componente = []
+                        while True:
+                            w = pila.pop()
+                            en_pila.discard(w)
+                            componente.append(w)
+                            if w == v:
+                                break
+                        componentes.append(componente)
+        return sorted(componentes, key=len, reverse=True)
+
+    def compactar(self) -> GrafoCompacto:
+        """Construye una copia congelada del grafo en formato CSR, con ids
+        enteros y arrays de NumPy, sobre la que ejecutar las consultas.
+        Los cambios posteriores en el grafo no se reflejan en la copia.
+
+        Args: None
+        Returns: GrafoCompacto con los mismos vértices, aristas y pesos.
+        """
+        return GrafoCompacto.desde_grafo(self)
 
     #### Algoritmos ####
-    def dijkstra(self, origen: object) -> Dict[object, object]:
+    def dijkstra(
+        self, origen: object, estadisticas: dict = None, traza: Callable = None
+    ) -> Dict[object, object]:
         """Calcula un Árbol Abarcador Mínimo para el grafo partiendo
         del vértice "origen" usando el algoritmo de Dijkstra. Calcula únicamente
         el árbol de la componente conexa que contiene a "origen".
 
-        Args: origen vértice del grafo de origen
+        Args:
+            origen: vértice del grafo de origen
+            estadisticas: diccionario opcional donde se guardan los
+            contadores de la búsqueda (ver instrumentacion.py)
+            traza: función traza(vertice, prioridad, frontera) opcional a la
+            que se llama al extraer cada vértice de la cola
         Returns: Devuelve un diccionario que indica, para cada vértice alcanzable
         desde "origen", qué vértice es su padre en el árbol abarcador mínimo.
         """
         if origen not in self.adj:
             return None
-        min_distances = {v: float("inf") for v in self.adj}
-        min_distances[origen] = 0
-        pq = heapdict()
-        pq[origen] = 0
-        parents = {origen: None}
-        visited = set()
-        while pq:
-            v, _ = pq.popitem()
-            visited.add(v)
-            for w in self.adj[v]:
-                """Visited nodes take less lookups (1) than weights (3)"""
-                """Lookups on visited are"""
-                if w not in visited:
-                    new_distance = min_distances[v] + self.adj[v][w]["weight"]
-                    if new_distance < min_distances[w]:
-                        min_distances[w] = new_distance
-                        parents[w] = v
-                        pq[w] = new_distance
+        if self.cache is not None and estadisticas is None and traza is None:
+            return dict(self._arbol(origen)[0])
+        parents, _, _ = self._busqueda(origen, estadisticas=estadisticas, traza=traza)
         return parents
 
-    def camino_minimo(self, origen: object, destino: object) -> List[object]:
-        if origen not in self.adj and destino not in self.adj:
-            print(self.adj)
-            return None
-        min_distances = {v: float("inf") for v in self.adj}
-        min_distances[origen] = 0
-        pq = heapdict()
-        pq[origen] = 0
+    def _arbol(
+        self, origen: object
+    ) -> Tuple[Dict[object, object], Dict[object, float]]:
+        """Árbol de caminos mínimos desde origen, de la caché si está.
+        Solo se usa con la caché activada.
+
+        Args: origen vértice de origen
+        Returns: Tupla (parents, min_distances) del árbol completo.
+        """
+        self.cache.comprobar_version(self._version)
+        arbol = self.cache.obtener(("arbol", origen))
+        if arbol is None:
+            parents, min_distances, _ = self._busqueda(origen)
+            arbol = (parents, min_distances)
+            self.cache.guardar(("arbol", origen), arbol, tamano_arbol(*arbol))
+        return arbol
+
+    def _busqueda(
+        self,
+        origen: object,
+        destino: object = None,
+        heuristica=None,
+        limite=None,
+        estadisticas: dict = None,
+        traza: Callable = None,
+    ) -> Tuple[Dict[object, object], Dict[object, float], int]:
+        """Búsqueda de Dijkstra (o A* si se da una heurística) desde origen.
+        Las distancias se guardan en un diccionario que solo contiene los
+        vértices alcanzados, por lo que una consulta corta no recorre todo
+        el grafo.
+
+        Args:
+            origen: vértice de origen
+            destino: vértice en el que parar al asentarlo (opcional)
+            heuristica: función cota inferior del coste hasta destino
+            limite: coste a partir del cual parar (opcional); los vértices
+            alcanzados con más coste no están asentados
+            estadisticas: diccionario de contadores (opcional)
+            traza: función de traza (opcional)
+        Returns: Tupla (parents, min_distances, asentados) con los padres y
+        distancias de los vértices alcanzados y el número de vértices
+        asentados.
+        """
+        min_distances = {origen: 0}
+        pq = cola(estadisticas, traza)
+        pq[origen] = heuristica(origen) if heuristica else 0
         parents = {origen: None}
         visited = set()
-        v = None
-        while pq and v != destino:
-            v, _ = pq.popitem()
+        while pq:
+            v, prioridad = pq.popitem()
+            if limite is not None and prioridad > limite:
+                break
             visited.add(v)
-            for w in self.adj[v]:
+            if v == destino:
+                break
+            for w, arista in self.adj[v].items():
                 """Visited nodes take less lookups (1) than weights (3)"""
-                """Lookups on visited are"""
                 if w not in visited:
-                    new_distance = min_distances[v] + self.adj[v][w]["weight"]
-                    if new_distance < min_distances[w]:
+                    new_distance = min_distances[v] + arista["weight"]
+                    if new_distance < min_distances.get(w, INFTY):
                         min_distances[w] = new_distance
                         parents[w] = v
-                        pq[w] = new_distance
-        if parents is None or destino not in parents:
+                        if heuristica:
+                            pq[w] = new_distance + heuristica(w)
+                        else:
+                            pq[w] = new_distance
+        if estadisticas is not None:
+            estadisticas["asentados"] = len(visited)
+            estadisticas["relajadas"] = sum(
+                len(self.adj[v]) for v in visited if v != destino
+            )
+        return parents, min_distances, len(visited)
+
+    def isocrona(
+        self,
+        origen: object,
+        segundos: float,
+        poligono: bool = False,
+        longitud: float = LONGITUD_ENVOLVENTE,
+    ):
+        """Vértices alcanzables desde origen con un coste (tiempo) de como
+        mucho segundos. La búsqueda de Dijkstra se detiene al superar el
+        presupuesto, sin recorrer el resto de la componente.
+
+        Args:
+            origen: vértice de origen
+            segundos: presupuesto de coste
+            poligono: si es True, devuelve también la envolvente cóncava de
+            los vértices alcanzados (solo si los vértices son coordenadas)
+            longitud: longitud máxima de los lados de la envolvente (ver
+            envolvente.envolvente_concava)
+        Returns: Diccionario vértice -> coste mínimo desde origen. Si
+        poligono es True, una tupla (costes, poligono) con el array (k, 2)
+        de vértices del polígono. None si origen no es un vértice del grafo.
+        """
+        isocronas = self.isocronas(origen, [segundos], poligono, longitud)
+        return isocronas[0] if isocronas is not None else None
+
+    def isocronas(
+        self,
+        origen: object,
+        presupuestos: List[float],
+        poligono: bool = False,
+        longitud: float = LONGITUD_ENVOLVENTE,
+    ):
+        """Isócronas anidadas de varios presupuestos con una sola búsqueda
+        hasta el mayor de ellos (ver isocrona).
+
+        Args:
+            origen: vértice de origen
+            presupuestos: lista de presupuestos de coste
+            poligono: si es True, calcula también la envolvente de cada una
+            longitud: longitud máxima de los lados de las envolventes
+        Returns: Lista con el resultado de isocrona para cada presupuesto,
+        en el orden de presupuestos. None si origen no es un vértice.
+        """
+        if origen not in self.adj:
             return None
+        if not presupuestos:
+            return []
+        _, min_distances, _ = self._busqueda(origen, limite=max(presupuestos))
+        # Vértices por coste creciente: cada isócrona es un prefijo
+        alcanzados = sorted(min_distances.items(), key=lambda item: item[1])
+        costes = [d for _, d in alcanzados]
+        resultado = []
+        for presupuesto in presupuestos:
+            fin = bisect.bisect_right(costes, presupuesto)
+            isocrona = dict(alcanzados[:fin])
+            if poligono:
+                coords = np.array(list(isocrona), dtype=np.float64)
+                if coords.ndim != 2 or coords.shape[1] != 2:
+                    raise ValueError("Los vértices no son coordenadas (x, y)")
+                isocrona = (isocrona, envolvente_concava(coords, longitud))
+            resultado.append(isocrona)
+        return resultado
+
+    def _bidireccional(
+        self,
+        origen: object,
+        destino: object,
+        estadisticas: dict = None,
+        traza: Callable = None,
+    ) -> Tuple[List[object], float, int]:
+        """Dijkstra bidireccional: crece un frente desde origen sobre self.adj
+        y otro desde destino sobre la adyacencia inversa, y para cuando la
+        suma de los mínimos de ambas colas no mejora el mejor camino que
+        une los dos frentes.
+
+        Args:
+            origen: vértice de origen
+            destino: vértice de destino
+            estadisticas: diccionario de contadores (opcional), común a los
+            dos frentes
+            traza: función de traza (opcional), común a los dos frentes
+        Returns: Tupla (camino, coste, asentados). camino es None si destino
+        no es alcanzable.
+        """
+        adjs = (self.adj, self.adj_inv)
+        dist = ({origen: 0}, {destino: 0})
+        parents = ({origen: None}, {destino: None})
+        visited = (set(), set())
+        pqs = (cola(estadisticas, traza), cola(estadisticas, traza))
+        pqs[0][origen] = 0
+        pqs[1][destino] = 0
+        mejor, encuentro = INFTY, None
+        if origen == destino:
+            mejor, encuentro = 0, (origen, origen)
+        while pqs[0] and pqs[1]:
+            if pqs[0].peekitem()[1] + pqs[1].peekitem()[1] >= mejor:
+                break
+            lado = 0 if len(pqs[0]) <= len(pqs[1]) else 1
+            otro = 1 - lado
+            v, d = pqs[lado].popitem()
+            visited[lado].add(v)
+            for w, arista in adjs[lado][v].items():
+                new_distance = d + arista["weight"]
+                if w not in visited[lado] and (new_distance < dist[lado].get(w, INFTY)):
+                    dist[lado][w] = new_distance
+                    parents[lado][w] = v
+                    pqs[lado][w] = new_distance
+                if w in dist[otro] and new_distance + dist[otro][w] < mejor:
+                    mejor = new_distance + dist[otro][w]
+                    encuentro = (v, w) if lado == 0 else (w, v)
+        asentados = len(visited[0]) + len(visited[1])
+        if estadisticas is not None:
+            estadisticas["relajadas"] = sum(
+                len(adjs[lado][v]) for lado in (0, 1) for v in visited[lado]
+            )
+        if encuentro is None:
+            return None, None, asentados
         path = []
-        v = destino
+        v = encuentro[0]
+        while v is not None:
+            path.append(v)
+            v = parents[0][v]
+        path.reverse()
+        v = encuentro[1] if encuentro[1] != encuentro[0] else None
         while v is not None:
             path.append(v)
-            v = parents[v]
-        return path[::-1]
+            v = parents[1][v]
+        return path, mejor, asentados
+
+    def velocidad_maxima(self) -> float:
+        """Calcula la mayor razón distancia euclídea / peso entre las aristas
+        del grafo. Si los vértices son coordenadas (x, y) en cm y los pesos
+        son segundos, es la velocidad máxima de la red en cm/s, y
+        distancia / velocidad_maxima es una cota inferior del tiempo de
+        viaje entre dos vértices. El valor se guarda hasta que se edita el
+        grafo.
+
+        Args: None
+        Returns: La velocidad máxima, infinito si hay aristas de peso 0 entre
+        vértices distintos, o None si los vértices no son coordenadas.
+        """
+        if "velocidad_maxima" not in self._derivados:
+            maxima = 0
+            for (s, t), arista in self.aristas.items():
+                if not (_es_coordenada(s) and _es_coordenada(t)):
+                    maxima = None
+                    break
+                d = math.hypot(s[0] - t[0], s[1] - t[1])
+                if arista["weight"] <= 0:
+                    maxima = INFTY if d > 0 else maxima
+                else:
+                    maxima = max(maxima, d / arista["weight"])
+            self._derivados["velocidad_maxima"] = maxima
+        return self._derivados["velocidad_maxima"]
+
+    def camino_minimo(
+        self,
+        origen: object,
+        destino: object,
+        algoritmo: str = "dijkstra",
+        velocidad_max: float = None,
+        estadisticas: dict = None,
+        traza: Callable = None,
+    ) -> List[object]:
+        """Calcula el camino mínimo de origen a destino.
+
+        Con algoritmo="astar" se usa A* con la heurística distancia euclídea
+        / velocidad máxima, que es admisible cuando los vértices son
+        coordenadas (x, y) y los pesos tiempos (ver velocidad_maxima). Si
+        los vértices no son coordenadas, A* equivale a Dijkstra. Con
+        algoritmo="bidireccional" se usa Dijkstra bidireccional.
+
+        Args:
+            origen: vértice de origen
+            destino: vértice de destino
+            algoritmo: "dijkstra", "astar" o "bidireccional"
+            velocidad_max: velocidad para la heurística de A* (por defecto,
+            la calculada con velocidad_maxima)
+            estadisticas: diccionario opcional donde se guardan el número de
+            vértices asentados ("asentados"), el coste del camino ("coste") y
+            los contadores de la búsqueda (ver instrumentacion.py)
+            traza: función traza(vertice, prioridad, frontera) opcional a la
+            que se llama al extraer cada vértice de la cola
+        Returns: Lista de vértices [origen, ..., destino] o None si alguno no
+        pertenece al grafo o destino no es alcanzable.
+
+        Con la caché activada (ver activar_cache), la consulta se responde
+        con el árbol de dijkstra(origen) si está en la caché o con la ruta
+        guardada del mismo par, algoritmo y velocidad_max (con una
+        velocidad_max demasiado baja, A* puede dar rutas no óptimas); en ese
+        caso estadisticas["asentados"] es 0.
+        Con traza no se usa la caché.
+        """
+        if origen not in self.adj or destino not in self.adj:
+            return None
+        if self.cache is None or traza is not None:
+            path, _ = self._camino_minimo(
+                origen, destino, algoritmo, velocidad_max, estadisticas, traza
+            )
+            return path
+        self.cache.comprobar_version(self._version)
+        arbol = self.cache.obtener(("arbol", origen))
+        if arbol is not None:
+            parents, min_distances = arbol
+            path, coste = _camino_arbol(parents, destino), min_distances.get(destino)
+        else:
+            clave = ("ruta", origen, destino, algoritmo, velocidad_max)
+            ruta = self.cache.obtener(clave)
+            if ruta is None:
+                path, coste = self._camino_minimo(
+                    origen, destino, algoritmo, velocidad_max, estadisticas
+                )
+                ruta = (tuple(path) if path is not None else None, coste)
+                self.cache.guardar(clave, ruta, tamano_ruta(ruta[0]))
+                return path
+            path, coste = ruta
+            path = list(path) if path is not None else None
+        if estadisticas is not None:
+            estadisticas["asentados"] = 0
+            estadisticas["coste"] = coste
+        return path
 
-    def prim(self) -> Dict[object, object]:
+    def _camino_minimo(
+        self,
+        origen: object,
+        destino: object,
+        algoritmo: str = "dijkstra",
+        velocidad_max: float = None,
+        estadisticas: dict = None,
+        traza: Callable = None,
+    ) -> Tuple[List[object], float]:
+        """camino_minimo sin caché.
+
+        Returns: Tupla (camino, coste), con None en los dos si destino no
+        es alcanzable.
+        """
+        if algoritmo == "bidireccional":
+            path, coste, asentados = self._bidireccional(
+                origen, destino, estadisticas, traza
+            )
+            if estadisticas is not None:
+                estadisticas["asentados"] = asentados
+                estadisticas["coste"] = coste
+            return path, coste
+        heuristica = None
+        if algoritmo == "astar":
+            vmax = self.velocidad_maxima() if velocidad_max is None else velocidad_max
+            if vmax and vmax != INFTY and _es_coordenada(destino):
+                dx, dy = destino
+                heuristica = lambda v: math.hypot(v[0] - dx, v[1] - dy) / vmax
+        elif algoritmo != "dijkstra":
+            raise ValueError(f"Algoritmo desconocido: {algoritmo}")
+        parents, min_distances, asentados = self._busqueda(
+            origen, destino, heuristica, estadisticas=estadisticas, traza=traza
+        )
+        coste = min_distances.get(destino)
+        if estadisticas is not None:
+            estadisticas["asentados"] = asentados
+            estadisticas["coste"] = coste
+        return _camino_arbol(parents, destino), coste
+
+    def prim(
+        self, estadisticas: dict = None, traza: Callable = None
+    ) -> Dict[object, object]:
         """Calcula un Árbol Abarcador Mínimo para el grafo
         usando el algoritmo de Prim.
 
-        Args: None
+        Args:
+            estadisticas: diccionario opcional donde se guardan los
+            contadores de la búsqueda (ver instrumentacion.py)
+            traza: función traza(vertice, prioridad, frontera) opcional
         Returns: Devuelve un diccionario que indica, para cada vértice del
         grafo, qué vértice es su padre en el árbol abarcador mínimo.
         """
@@ -270,7 +915,7 @@ class Grafo:
         padres = {}
         visitados = set()
 
-        coste_min = heapdict()
+        coste_min = cola(estadisticas, traza)
         coste_min[r.choice(list(self.adj))] = 0
 
         while coste_min:
@@ -285,6 +930,9 @@ class Grafo:
                     else:
                         padres[w] = v
                         coste_min[w] = value["weight"]
+        if estadisticas is not None:
+            estadisticas["asentados"] = len(visitados)
+            estadisticas["relajadas"] = sum(len(self.adj[v]) for v in visitados)
         return padres
 
     def kruskal_dani(self) -> List[Tuple[object, object]]:
@@ -322,10 +970,28 @@ class Grafo:
         Args: None
         Returns: Devuelve una lista [(s1,t1),(s2,t2),...,(sn,tn)]
         de los pares de vértices del grafo
-        que forman las aristas del arbol abarcador mínimo.
-        """
+        que forman las aristas del arbol abarcador mínimo (un bosque si el
+        grafo no es conexo).
 
-        pass
+        Cada arista no dirigida se ordena una sola vez (el sentido (s, t)
+        con s antes que t en adj) y los componentes se mantienen en un
+        UnionFind con compresión de caminos, en O(m log m).
+        """
+        ids = {v: i for i, v in enumerate(self.adj)}
+        if self.es_dirigido():
+            aristas = list(self.aristas)
+        else:
+            aristas = [(s, t) for s, t in self.aristas if ids[s] < ids[t]]
+        pesos = [self.aristas[e]["weight"] for e in aristas]
+        conjuntos = UnionFind(len(ids))
+        path = []
+        for i in sorted(range(len(aristas)), key=pesos.__getitem__):
+            s, t = aristas[i]
+            if conjuntos.unir(ids[s], ids[t]):
+                path.append((s, t))
+                if conjuntos.conjuntos == 1:
+                    break
+        return path
 
     def convertir_a_NetworkX(self) -> nx.Graph or nx.DiGraph:
         """Construye un grafo o digrafo de Networkx según corresponda
@@ -353,7 +1019,9 @@ class Grafo:
         """
         self.adj = {}
         self.aristas = {}
-        self.dirigido = isinstance(G, nx.DiGraph)
+        self._invalidar_derivados()
+        self._dirigido = isinstance(G, nx.DiGraph)
+        self._crear_inversa()
         for v in G:
             self.agregar_vertice(v)
         for s, t in G.edges:
@@ -398,8 +1066,10 @@ class Grafo:
         node_size=100,
         edge_width=1,
         arrows=False,
+        path=None,
     ):
-        path = self.camino_minimo(origen, destino)
+        if path is None:
+            path = self.camino_minimo(origen, destino)
         G = self.convertir_a_NetworkX()
         pos = nx.spring_layout(G) if pos is None else pos
         edges = [(path[i], path[i + 1]) for i in range(len(path) - 1)]
@@ -422,21 +1092,33 @@ class Grafo:
         )
         plt.show()
 
-    def save_graph(self, path="grafo.txt"):
-        grafo = {
-            "adj": self.adj,
-            "aristas": self.aristas,
-            "dirigido": self.es_dirigido(),
-        }
-        with open(path, "w", encoding="latin-1") as f:
-            f.write(str(grafo))
-
-    def load_graph(self, path="grafo.json"):
-        with open(path, "r", encoding="latin-1") as f:
-            js = eval(f.read())
+    def save_graph(self, path="grafo.grf"):
+        """Guarda el grafo en el formato binario versionado de persistencia.py.
+
+        Args: path ruta del fichero de salida
+        Returns: None
+        """
+        self.compactar().guardar(path)
+
+    def load_graph(self, path="grafo.grf"):
+        """Carga un grafo guardado con save_graph, sustituyendo el contenido
+        actual. Los ficheros de texto antiguos (str de un diccionario) se
+        leen con ast.literal_eval, sin ejecutar código.
+
+        Args: path ruta del fichero binario o de texto
+        Returns: None
+        """
+        if persistencia.es_binario(path):
+            g = GrafoCompacto.cargar(path, mmap=False).a_grafo()
+            js = {"adj": g.adj, "aristas": g.aristas, "dirigido": g.es_dirigido()}
+        else:
+            js = persistencia.leer_grafo_txt(path)
         self.adj = js["adj"]
         self.aristas = js["aristas"]
-        self.dirigido = js["dirigido"]
+        self._dirigido = js["dirigido"]
+        self._crear_inversa()
+        self._pesos_base = {}
+        self._invalidar_derivados()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,1332 @@
+import ast
+import heapq
+import itertools
+import math
+import random as r
+from datetime import datetime, timedelta
+from functools import cached_property
+from numbers import Number
+from typing import Callable, List, Dict
+
+import numpy as np
+
+import persistencia
+from instrumentacion import operaciones_heap
+from ordenacion import recorrido_optimo
+from union_find import UnionFind
+from perfiles import DURACION_FRANJA, FRANJAS, _llegada
+
+INFTY = float("inf")
+# Radio, relativo a la distancia entre origen y destino, del Dijkstra
+# inverso compartido por las búsquedas de k_caminos
+HOLGURA = 1.2
+
+
+class GrafoCompacto:
+    # Representación congelada (CSR) de un Grafo para las consultas
+
+    def __init__(
+        self,
+        vertices: List[object],
+        offsets: np.ndarray,
+        destinos: np.ndarray,
+        pesos: np.ndarray,
+        datos: List[object] = None,
+        dirigido: bool = False,
+    ):
+        """Crea un grafo compacto en formato CSR (compressed sparse row).
+
+        Los vértices se numeran de 0 a n-1. Las aristas que salen del
+        vértice i son las posiciones offsets[i]:offsets[i + 1] de los arrays
+        destinos, pesos y datos. Los grafos no dirigidos guardan ambos
+        sentidos de cada arista.
+
+        Args:
+            vertices: lista de vértices originales, indexada por id, o array
+            (n, 2) de coordenadas si los vértices son pares (x, y)
+            offsets: array de n+1 enteros con el inicio de cada fila
+            destinos: array con el id del vértice destino de cada arista
+            pesos: array con el peso de cada arista
+            datos: lista con los datos de cada arista (o None si no hay)
+            dirigido: flag que indica si el grafo es dirigido o no
+        Returns: GrafoCompacto inmutable con esos arrays.
+        """
+        if isinstance(vertices, np.ndarray):
+            self.__dict__["coords"] = vertices
+        else:
+            self.__dict__["vertices"] = vertices
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.destinos = np.asarray(destinos, dtype=np.int32)
+        self.pesos = np.asarray(pesos, dtype=np.float64)
+        self.datos = datos
+        self._dirigido = dirigido
+        # Landmarks (landmarks.Landmarks) para camino_minimo con "alt"
+        self.landmarks = None
+        # Perfiles de velocidad (perfiles.PerfilesVelocidad) para
+        # camino_minimo con salida
+        self.perfiles = None
+        # Pesos originales, guardados al actualizar pesos por primera vez
+        self.pesos_base = None
+        # Versiones de los pesos: _version cambia con cada actualización y
+        # _version_cotas solo cuando algún peso baja, que es cuando dejan
+        # de valer las cotas inferiores calculadas antes (landmarks,
+        # velocidad_maxima)
+        self._version = 0
+        self._version_cotas = 0
+
+    @classmethod
+    def desde_grafo(cls, grafo) -> "GrafoCompacto":
+        """Construye la forma compacta de un Grafo.
+
+        Args: grafo objeto Grafo (dirigido o no)
+        Returns: GrafoCompacto con los mismos vértices, aristas y pesos.
+        El orden de las aristas de cada vértice es el de grafo.adj.
+        """
+        vertices = list(grafo.adj)
+        ids = {v: i for i, v in enumerate(vertices)}
+        offsets = np.zeros(len(vertices) + 1, dtype=np.int64)
+        destinos, pesos, datos = [], [], []
+        for i, v in enumerate(vertices):
+            for w, arista in grafo.adj[v].items():
+                destinos.append(ids[w])
+                pesos.append(arista["weight"])
+                datos.append(arista["data"])
+            offsets[i + 1] = len(destinos)
+        if all(d is None for d in datos):
+            datos = None
+        gc = cls(vertices, offsets, destinos, pesos, datos, grafo.es_dirigido())
+        gc.__dict__["ids"] = ids
+        return gc
+
+    def a_grafo(self):
+        """Reconstruye un Grafo editable a partir de la forma compacta.
+
+        Args: None
+        Returns: Grafo con los mismos vértices, aristas, datos y pesos.
+        """
+        from grafo import Grafo
+
+        g = Grafo(self._dirigido)
+        for v in self.vertices:
+            g.agregar_vertice(v)
+        offsets, destinos, pesos = self._listas
+        for i, v in enumerate(self.vertices):
+            for k in range(offsets[i], offsets[i + 1]):
+                data = self.datos[k] if self.datos is not None else None
+                g.agregar_arista(v, self.vertices[destinos[k]], data, pesos[k])
+        return g
+
+    def guardar(self, path: str) -> None:
+        """Guarda el grafo en el formato binario de persistencia.py.
+        Si los vértices son coordenadas se guardan como array; si no, y
+        también los datos de las aristas, como repr() de cada objeto.
+
+        Args: path ruta del fichero de salida
+        Returns: None
+        """
+        arrays = {
+            "offsets": self.offsets,
+            "destinos": self.destinos,
+            "pesos": self.pesos,
+        }
+        if self.coords is not None:
+            arrays["coords"] = self.coords
+        else:
+            textos = [repr(v) for v in self.vertices]
+            arrays["vertices"], arrays["vertices_offsets"] = (
+                persistencia.empaquetar_textos(textos)
+            )
+        if self.datos is not None:
+            textos = [repr(d) for d in self.datos]
+            arrays["datos"], arrays["datos_offsets"] = persistencia.empaquetar_textos(
+                textos
+            )
+        meta = {"dirigido": self._dirigido}
+        persistencia.guardar_arrays(path, "grafo", arrays, meta)
+
+    @classmethod
+    def cargar(cls, path: str, mmap: bool = True) -> "GrafoCompacto":
+        """Carga un grafo guardado con guardar. Con mmap=True los arrays
+        se proyectan en memoria y no se leen hasta que se usan, y los datos
+        de las aristas se decodifican solo al acceder a ellos.
+
+        Args:
+            path: ruta del fichero binario
+            mmap: si se proyectan los arrays en memoria en lugar de leerlos
+        Returns: GrafoCompacto de solo lectura.
+        """
+        tipo, meta, arrays = persistencia.cargar_arrays(path, mmap)
+        if tipo != "grafo":
+            raise ValueError(f"{path} contiene un {tipo}, no un grafo")
+        if "coords" in arrays:
+            vertices = arrays["coords"]
+        else:
+            vertices = list(
+                persistencia.TextosEmpaquetados(
+                    arrays["vertices"], arrays["vertices_offsets"], ast.literal_eval
+                )
+            )
+        datos = None
+        if "datos" in arrays:
+            datos = persistencia.TextosEmpaquetados(
+                arrays["datos"], arrays["datos_offsets"], ast.literal_eval
+            )
+        return cls(
+            vertices,
+            arrays["offsets"],
+            arrays["destinos"],
+            arrays["pesos"],
+            datos,
+            meta["dirigido"],
+        )
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        return iter(self.vertices)
+
+    def __contains__(self, v: object) -> bool:
+        return v in self.ids
+
+    @cached_property
+    def vertices(self) -> List[object]:
+        """Lista de vértices indexada por id. Si el grafo se creó a partir
+        de un array de coordenadas, se construye al primer acceso.
+        """
+        return list(map(tuple, self.coords.tolist()))
+
+    @cached_property
+    def ids(self) -> Dict[object, int]:
+        """Diccionario vértice -> id entero."""
+        return {v: i for i, v in enumerate(self.vertices)}
+
+    @cached_property
+    def coords(self) -> np.ndarray or None:
+        """Array (n, 2) con las coordenadas de los vértices si estos
+        son pares (x, y) numéricos, como en el plano de Madrid. None si no.
+        """
+        if not all(
+            isinstance(v, tuple)
+            and len(v) == 2
+            and isinstance(v[0], Number)
+            and isinstance(v[1], Number)
+            for v in self.vertices
+        ):
+            return None
+        coords = np.array(self.vertices).reshape(-1, 2)
+        return coords if coords.dtype.kind in "iuf" else None
+
+    @cached_property
+    def _listas(self):
+        """Copias en listas de Python de offsets, destinos y pesos.
+        Indexar listas es mucho más rápido que indexar arrays de NumPy
+        elemento a elemento dentro de los bucles de búsqueda.
+        """
+        return self.offsets.tolist(), self.destinos.tolist(), self.pesos.tolist()
+
+    @cached_property
+    def _inversa(self):
+        """Arrays CSR del grafo traspuesto (aristas de entrada de cada
+        vértice) como listas de Python. Para grafos no dirigidos coincide
+        con _listas.
+        """
+        if not self._dirigido:
+            return self._listas
+        n = len(self)
+        orden = self._orden_inversa
+        origenes = np.repeat(np.arange(n, dtype=np.int32), np.diff(self.offsets))
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.destinos, minlength=n), out=offsets[1:])
+        return offsets.tolist(), origenes[orden].tolist(), self.pesos[orden].tolist()
+
+    @cached_property
+    def _orden_inversa(self) -> np.ndarray:
+        """Posiciones de las aristas ordenadas por destino: la arista k de
+        _inversa es la arista _orden_inversa[k] de destinos y pesos.
+        """
+        return np.argsort(self.destinos, kind="stable")
+
+    @cached_property
+    def _aristas_via(self) -> Dict[object, np.ndarray]:
+        """Posiciones de las aristas de cada vía, según el dato de la
+        arista (el id_via en los grafos de construccion.py).
+        """
+        if self.datos is None:
+            return {}
+        posiciones: Dict[object, List[int]] = {}
+        for k, dato in enumerate(self.datos):
+            posiciones.setdefault(dato, []).append(k)
+        return {via: np.array(p, dtype=np.int64) for via, p in posiciones.items()}
+
+    @cached_property
+    def _xy(self):
+        """Coordenadas x e y de los vértices como listas de Python."""
+        return self.coords[:, 0].tolist(), self.coords[:, 1].tolist()
+
+    @cached_property
+    def velocidad_maxima(self) -> float or None:
+        """Mayor razón distancia euclídea / peso entre las aristas (cm/s si
+        los pesos son segundos). distancia / velocidad_maxima es una cota
+        inferior del coste entre dos vértices. Infinito si hay aristas de
+        peso 0 entre vértices distintos; None si los vértices no son
+        coordenadas.
+        """
+        if self.coords is None:
+            return None
+        if self.num_aristas() == 0:
+            return 0.0
+        coords = np.asarray(self.coords, dtype=np.float64)
+        origenes = np.repeat(np.arange(len(self)), np.diff(self.offsets))
+        d = np.hypot(*(coords[origenes] - coords[self.destinos]).T)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            razon = np.where(d > 0, d / self.pesos, 0.0)
+        return float(razon.max())
+
+    def es_dirigido(self) -> bool:
+        """Indica si el grafo es dirigido o no
+
+        Args: None
+        Returns: True si el grafo es dirigido, False si no.
+        """
+        return self._dirigido
+
+    def num_aristas(self) -> int:
+        """Número de aristas almacenadas (ambos sentidos si no es dirigido).
+
+        Args: None
+        Returns: Número de posiciones de los arrays destinos y pesos.
+        """
+        return len(self.destinos)
+
+    def lista_adyacencia(self, u: object) -> List[object] or None:
+        """Si el objeto u es un vértice del grafo, devuelve su lista de adyacencia.
+        Si no, devuelve None.
+
+        Args: u vértice del grafo
+        Returns: Una lista [v1,v2,...,vn] de los vértices adyacentes a u
+        si u es un vértice del grafo y None en caso contrario
+        """
+        if u not in self.ids:
+            return None
+        i = self.ids[u]
+        a, b = self.offsets[i], self.offsets[i + 1]
+        return [self.vertices[j] for j in self.destinos[a:b].tolist()]
+
+    #### Actualización de pesos ####
+    def _posicion(self, u: int, v: int) -> int:
+        """Posición de la arista u -> v en destinos y pesos, o -1."""
+        offsets, destinos, _ = self._listas
+        for k in range(offsets[u], offsets[u + 1]):
+            if destinos[k] == v:
+                return k
+        return -1
+
+    def _aplicar_pesos(self, posiciones: np.ndarray, nuevos: np.ndarray) -> None:
+        """Cambia los pesos de las aristas indicadas en los arrays y en las
+        listas ya calculadas, sin reconstruir nada, y actualiza las
+        versiones de los pesos.
+
+        Args:
+            posiciones: posiciones de las aristas
+            nuevos: pesos nuevos
+        Returns: None
+        """
+        posiciones = np.asarray(posiciones, dtype=np.int64)
+        nuevos = np.asarray(nuevos, dtype=np.float64)
+        if self.pesos_base is None:
+            self.pesos_base = np.array(self.pesos)
+        if not self.pesos.flags.writeable:
+            # Los grafos cargados con mmap son de solo lectura
+            self.pesos = np.array(self.pesos)
+        baja = bool((nuevos < self.pesos[posiciones]).any())
+        self.pesos[posiciones] = nuevos
+        if "_listas" in self.__dict__:
+            pesos = self._listas[2]
+            for k, w in zip(posiciones.tolist(), nuevos.tolist()):
+                pesos[k] = w
+        if self._dirigido and "_inversa" in self.__dict__:
+            inversa = np.empty(len(self.destinos), dtype=np.int64)
+            inversa[self._orden_inversa] = np.arange(len(self.destinos))
+            pesos = self._inversa[2]
+            for k, w in zip(inversa[posiciones].tolist(), nuevos.tolist()):
+                pesos[k] = w
+        self._version += 1
+        if baja:
+            self._version_cotas += 1
+            self.__dict__.pop("velocidad_maxima", None)
+
+    def actualizar_pesos(self, aristas: List[tuple], pesos: List[float]) -> int:
+        """Cambia el peso de una lista de aristas (s, t). En los grafos no
+        dirigidos se cambian ambos sentidos. Las aristas que no existen se
+        ignoran.
+
+        Los landmarks siguen siendo válidos si ningún peso baja; si alguno
+        baja, quedan obsoletos (camino_minimo con "alt" lanza ValueError).
+        Una JerarquiaContraccion queda obsoleta con cualquier cambio.
+
+        Args:
+            aristas: lista de pares (s, t) de vértices
+            pesos: peso nuevo de cada arista
+        Returns: Número de aristas cambiadas (contando ambos sentidos).
+        """
+        ids = self.ids
+        posiciones, nuevos = [], []
+        for (s, t), w in zip(aristas, pesos):
+            if s not in ids or t not in ids:
+                continue
+            pares = [(ids[s], ids[t])]
+            if not self._dirigido and s != t:
+                pares.append((ids[t], ids[s]))
+            for u, v in pares:
+                k = self._posicion(u, v)
+                if k != -1:
+                    posiciones.append(k)
+                    nuevos.append(w)
+        if posiciones:
+            self._aplicar_pesos(posiciones, nuevos)
+        return len(posiciones)
+
+    def actualizar_pesos_via(self, factores: Dict[object, float]) -> int:
+        """Multiplica el peso original (el de antes de cualquier
+        actualización) de todas las aristas de cada vía por un factor. Un
+        factor infinito corta la vía y un factor 1 la restablece. Ver
+        actualizar_pesos sobre landmarks y jerarquías.
+
+        Args: factores diccionario id_via -> factor
+        Returns: Número de aristas cambiadas.
+        """
+        aristas_via = self._aristas_via
+        grupos = [(aristas_via[v], f) for v, f in factores.items() if v in aristas_via]
+        if not grupos:
+            return 0
+        posiciones = np.concatenate([p for p, _ in grupos])
+        factores_aristas = np.concatenate([np.full(len(p), f) for p, f in grupos])
+        base = self.pesos_base if self.pesos_base is not None else self.pesos
+        self._aplicar_pesos(posiciones, base[posiciones] * factores_aristas)
+        return len(posiciones)
+
+    def restablecer_pesos(self) -> None:
+        """Vuelve a los pesos originales.
+
+        Args: None
+        Returns: None
+        """
+        if self.pesos_base is not None:
+            cambiadas = np.flatnonzero(self.pesos != self.pesos_base)
+            if len(cambiadas):
+                self._aplicar_pesos(cambiadas, self.pesos_base[cambiadas])
+
+    #### Algoritmos sobre ids enteros ####
+    def _dijkstra_ids(
+        self,
+        origen: int,
+        destino: int = None,
+        inversa=False,
+        objetivos=None,
+        holgura: float = None,
+        estadisticas: dict = None,
+        traza: Callable = None,
+    ):
+        """Dijkstra con heap binario y borrado perezoso sobre ids enteros.
+        Si se indica destino, se detiene al asentarlo; si se indican
+        objetivos, al asentarlos todos.
+
+        Args:
+            origen: id del vértice de origen
+            destino: id del vértice de destino (opcional)
+            inversa: si se recorren las aristas al revés, calculando las
+            distancias desde cada vértice hasta origen
+            objetivos: conjunto de ids de vértices a asentar (opcional)
+            holgura: con destino, en lugar de detenerse al asentarlo sigue
+            hasta asentar los vértices a distancia holgura * d(destino)
+            estadisticas: diccionario de contadores (opcional, ver
+            instrumentacion.py)
+            traza: función traza(id, prioridad, frontera) (opcional)
+        Returns: Tupla (distancias, padres) indexadas por id. Los vértices
+        no alcanzados tienen distancia infinita y padre -1; los alcanzados
+        pero no asentados, una distancia provisional.
+        """
+        offsets, destinos, pesos = self._inversa if inversa else self._listas
+        n = len(offsets) - 1
+        dist = [INFTY] * n
+        padres = [-1] * n
+        visitados = [False] * n
+        dist[origen] = 0
+        empujar, sacar = operaciones_heap(estadisticas, traza)
+        pq = []
+        empujar(pq, (0, origen))
+        pendientes = len(objetivos) if objetivos is not None else -1
+        limite = INFTY
+        while pq and pendientes:
+            d, v = sacar(pq)
+            if visitados[v]:
+                continue
+            if d > limite:
+                break
+            visitados[v] = True
+            if v == destino:
+                if holgura is None:
+                    break
+                limite = holgura * d
+            if pendientes > 0 and v in objetivos:
+                pendientes -= 1
+            for k in range(offsets[v], offsets[v + 1]):
+                w = destinos[k]
+                if not visitados[w]:
+                    nd = d + pesos[k]
+                    if nd < dist[w]:
+                        dist[w] = nd
+                        padres[w] = v
+                        empujar(pq, (nd, w))
+        if estadisticas is not None:
+            asentados = [v for v in range(n) if visitados[v]]
+            estadisticas["asentados"] = len(asentados)
+            estadisticas["relajadas"] = sum(
+                offsets[v + 1] - offsets[v] for v in asentados if v != destino
+            )
+        return dist, padres
+
+    def _astar_ids(
+        self,
+        origen: int,
+        destino: int,
+        heuristica=None,
+        estadisticas: dict = None,
+        traza: Callable = None,
+    ):
+        """A* (o Dijkstra si no hay heurística) de origen a destino sobre
+        ids enteros. Las distancias y padres se guardan en diccionarios que
+        solo contienen los vértices alcanzados.
+
+        Args:
+            origen: id del vértice de origen
+            destino: id del vértice de destino
+            heuristica: función id -> cota inferior del coste hasta destino
+            estadisticas: diccionario de contadores (opcional)
+            traza: función de traza (opcional)
+        Returns: Tupla (distancias, padres, asentados) con los diccionarios
+        de los vértices alcanzados y el número de vértices asentados.
+        """
+        offsets, destinos, pesos = self._listas
+        dist = {origen: 0}
+        padres = {origen: -1}
+        visitados = set()
+        empujar, sacar = operaciones_heap(estadisticas, traza)
+        pq = []
+        empujar(pq, (heuristica(origen) if heuristica else 0, origen))
+        while pq:
+            _, v = sacar(pq)
+            if v in visitados:
+                continue
+            visitados.add(v)
+            if v == destino:
+                break
+            d = dist[v]
+            for k in range(offsets[v], offsets[v + 1]):
+                w = destinos[k]
+                if w not in visitados:
+                    nd = d + pesos[k]
+                    if nd < dist.get(w, INFTY):
+                        dist[w] = nd
+                        padres[w] = v
+                        if heuristica:
+                            empujar(pq, (nd + heuristica(w), w))
+                        else:
+                            empujar(pq, (nd, w))
+        if estadisticas is not None:
+            estadisticas["asentados"] = len(visitados)
+            estadisticas["relajadas"] = sum(
+                offsets[v + 1] - offsets[v] for v in visitados if v != destino
+            )
+        return dist, padres, len(visitados)
+
+    def _bidireccional_ids(
+        self,
+        origen: int,
+        destino: int,
+        estadisticas: dict = None,
+        traza: Callable = None,
+    ):
+        """Dijkstra bidireccional sobre ids enteros: un frente avanza desde
+        origen por las aristas de salida y otro desde destino por las de
+        entrada. Se expande el frente con menos vértices en cola y se para
+        cuando la suma de los mínimos de ambas colas no mejora el mejor
+        camino encontrado entre los dos frentes.
+
+        Args:
+            origen: id del vértice de origen
+            destino: id del vértice de destino
+            estadisticas: diccionario de contadores (opcional), común a los
+            dos frentes
+            traza: función de traza (opcional), común a los dos frentes
+        Returns: Tupla (coste, encuentro, padres, asentados). encuentro es
+        la arista (a, b) por la que se unen los frentes (None si destino no
+        es alcanzable) y padres la pareja de diccionarios de padres hacia
+        origen y hacia destino.
+        """
+        csr = (self._listas, self._inversa)
+        dist = ({origen: 0}, {destino: 0})
+        padres = ({origen: -1}, {destino: -1})
+        visitados = (set(), set())
+        operaciones = (
+            operaciones_heap(estadisticas, traza),
+            operaciones_heap(estadisticas, traza),
+        )
+        pqs = ([], [])
+        operaciones[0][0](pqs[0], (0, origen))
+        operaciones[1][0](pqs[1], (0, destino))
+        mejor, encuentro = INFTY, None
+        if origen == destino:
+            mejor, encuentro = 0, (origen, origen)
+        while pqs[0] and pqs[1]:
+            for lado in (0, 1):
+                while pqs[lado] and pqs[lado][0][1] in visitados[lado]:
+                    heapq.heappop(pqs[lado])
+            if not (pqs[0] and pqs[1]) or pqs[0][0][0] + pqs[1][0][0] >= mejor:
+                break
+            lado = 0 if len(pqs[0]) <= len(pqs[1]) else 1
+            empujar, sacar = operaciones[lado]
+            d, v = sacar(pqs[lado])
+            visitados[lado].add(v)
+            offsets, destinos, pesos = csr[lado]
+            dist_lado, dist_otro = dist[lado], dist[1 - lado]
+            for k in range(offsets[v], offsets[v + 1]):
+                w = destinos[k]
+                nd = d + pesos[k]
+                if w not in visitados[lado] and nd < dist_lado.get(w, INFTY):
+                    dist_lado[w] = nd
+                    padres[lado][w] = v
+                    empujar(pqs[lado], (nd, w))
+                if w in dist_otro and nd + dist_otro[w] < mejor:
+                    mejor = nd + dist_otro[w]
+                    encuentro = (v, w) if lado == 0 else (w, v)
+        if estadisticas is not None:
+            estadisticas["asentados"] = len(visitados[0]) + len(visitados[1])
+            estadisticas["relajadas"] = sum(
+                csr[lado][0][v + 1] - csr[lado][0][v]
+                for lado in (0, 1)
+                for v in visitados[lado]
+            )
+        return mejor, encuentro, padres, len(visitados[0]) + len(visitados[1])
+
+    def _dependiente_ids(self, origen: int, destino: int, salida: float, heuristica):
+        """A* (o Dijkstra si no hay heurística) dependiente del tiempo de
+        origen a destino: las etiquetas son instantes de llegada y cada
+        arista se recorre a la velocidad de su perfil en cada franja (ver
+        perfiles.py). Como la llegada por cada arista es creciente en la
+        salida (FIFO), la primera llegada a cada vértice es la óptima.
+
+        Args:
+            origen: id del vértice de origen
+            destino: id del vértice de destino
+            salida: instante de salida en segundos desde las 00:00
+            heuristica: función id -> cota inferior del tiempo hasta destino
+        Returns: Tupla (llegadas, padres, asentados) como en _astar_ids.
+        """
+        offsets, destinos, pesos = self._listas
+        filas, perfil = self.perfiles._filas, self.perfiles._perfil
+        llegadas = {origen: salida}
+        padres = {origen: -1}
+        visitados = set()
+        pq = [(salida + (heuristica(origen) if heuristica else 0), origen)]
+        while pq:
+            _, v = heapq.heappop(pq)
+            if v in visitados:
+                continue
+            visitados.add(v)
+            if v == destino:
+                break
+            d = llegadas[v]
+            franja = int(d // DURACION_FRANJA)
+            fin = (franja + 1) * DURACION_FRANJA
+            franja %= FRANJAS
+            for k in range(offsets[v], offsets[v + 1]):
+                w = destinos[k]
+                if w not in visitados:
+                    fila = filas[perfil[k]]
+                    nd = d + pesos[k] / fila[franja]
+                    if nd > fin:
+                        # La arista acaba en otra franja
+                        nd = _llegada(fila, pesos[k], d)
+                    if nd < llegadas.get(w, INFTY):
+                        llegadas[w] = nd
+                        padres[w] = v
+                        if heuristica:
+                            heapq.heappush(pq, (nd + heuristica(w), w))
+                        else:
+                            heapq.heappush(pq, (nd, w))
+        return llegadas, padres, len(visitados)
+
+    def _camino_dependiente_ids(
+        self, o: int, t: int, salida: float, algoritmo="dijkstra", velocidad_max=None
+    ):
+        """Camino más rápido de o a t saliendo en el instante salida (en
+        segundos desde las 00:00), con "dijkstra" o "astar". La heurística
+        euclídea se divide por el mayor factor de velocidad de los perfiles
+        para que siga siendo una cota inferior.
+
+        Args:
+            o: id de origen
+            t: id de destino
+            salida: instante de salida en segundos desde las 00:00
+            algoritmo: "dijkstra" o "astar"
+            velocidad_max: velocidad para la heurística de A* (opcional)
+        Returns: Tupla (camino, coste, asentados) como en _camino_ids, con
+        el tiempo de viaje como coste.
+        """
+        if self.perfiles is None:
+            raise ValueError("No hay perfiles: asigna self.perfiles antes")
+        heuristica = None
+        if algoritmo == "astar":
+            if self.coords is not None:
+                vmax = self.velocidad_maxima if velocidad_max is None else velocidad_max
+                if vmax:
+                    vmax *= self.perfiles.factor_maximo
+                heuristica = self._heuristica_euclidea(t, vmax)
+        elif algoritmo != "dijkstra":
+            raise ValueError(
+                f"Algoritmo sin versión dependiente del tiempo: {algoritmo}"
+            )
+        llegadas, padres, asentados = self._dependiente_ids(o, t, salida, heuristica)
+        if t not in llegadas:
+            return None, None, asentados
+        return self._reconstruir(padres, t), llegadas[t] - salida, asentados
+
+    def _desvio_ids(
+        self,
+        origen: int,
+        destino: int,
+        cotas: List[float],
+        siguientes: List[int] = None,
+        prohibidos=(),
+        prohibidas=(),
+        recargos: Dict[int, float] = None,
+    ):
+        """A* de origen a destino sin pasar por los vértices prohibidos ni
+        salir de origen hacia los vértices de prohibidas, con las
+        distancias hasta destino en el grafo completo como heurística:
+        quitar vértices y aristas o encarecerlas solo alarga los caminos,
+        así que sigue siendo una cota inferior, y casi exacta.
+
+        Si se dan los siguientes del árbol de esas distancias, la búsqueda
+        termina al asentar un vértice desde el que la rama del árbol hasta
+        destino está libre: con la heurística exacta en esa rama, ningún
+        camino pendiente puede ser mejor.
+
+        Args:
+            origen: id del vértice de origen
+            destino: id del vértice de destino
+            cotas: lista de distancias de cada id hasta destino
+            siguientes: siguiente vértice de cada id hacia destino en el
+            árbol de cotas (opcional, no se usa con recargos)
+            prohibidos: ids de vértices a evitar
+            prohibidas: ids a los que no se puede ir desde origen
+            recargos: factor por el que se multiplica el peso de algunas
+            aristas, por posición (opcional)
+        Returns: Tupla (camino, coste, asentados), con camino None si no hay.
+        """
+        offsets, destinos, pesos = self._listas
+        prohibidos = set(prohibidos)
+        dist = {origen: 0}
+        padres = {origen: -1}
+        visitados = set()
+        # Vértices cuya rama del árbol hasta destino está libre (o no)
+        libres = {destino: True}
+        # A igual cota total se expande antes el más cercano a destino
+        pq = [(cotas[origen], cotas[origen], origen)]
+        while pq:
+            _, _, v = heapq.heappop(pq)
+            if v in visitados:
+                continue
+            visitados.add(v)
+            if siguientes is not None and recargos is None:
+                rama = [v]
+                while rama[-1] not in libres:
+                    u = rama[-1]
+                    w = siguientes[u]
+                    if w == -1 or w == origen or w in prohibidos:
+                        libres[u] = False
+                    elif u == origen and w in prohibidas:
+                        libres[u] = False
+                    else:
+                        rama.append(w)
+                libre = libres[rama[-1]]
+                for u in rama:
+                    libres[u] = libre
+                if libre:
+                    camino = self._reconstruir(padres, v)
+                    while camino[-1] != destino:
+                        camino.append(siguientes[camino[-1]])
+                    return camino, dist[v] + cotas[v], len(visitados)
+            if v == destino:
+                return self._reconstruir(padres, v), dist[v], len(visitados)
+            d = dist[v]
+            for k in range(offsets[v], offsets[v + 1]):
+                w = destinos[k]
+                if w in visitados or w in prohibidos:
+                    continue
+                if v == origen and w in prohibidas:
+                    continue
+                nd = d + (
+                    pesos[k] if recargos is None else pesos[k] * recargos.get(k, 1)
+                )
+                if nd < dist.get(w, INFTY) and cotas[w] < INFTY:
+                    dist[w] = nd
+                    padres[w] = v
+                    heapq.heappush(pq, (nd + cotas[w], cotas[w], w))
+        return None, None, len(visitados)
+
+    def _alternativas_ids(
+        self,
+        o: int,
+        t: int,
+        k: int,
+        solapamiento_max: float,
+        max_caminos: int,
+        metodo: str = "yen",
+        penalizacion: float = 1.3,
+    ):
+        """Caminos alternativos de o a t, quedándose con los que no se
+        solapan demasiado con los ya aceptados.
+
+        Todas las búsquedas comparten un único Dijkstra hacia t sobre el
+        grafo inverso, que se detiene a HOLGURA veces la distancia de o: su
+        árbol da el primer camino y sus distancias son la heurística de las
+        demás búsquedas (ver _desvio_ids).
+
+            - "yen": algoritmo de Yen, que enumera los caminos sin ciclos
+              por coste creciente. Cada camino solo se desvía a partir del
+              punto en que se desvió de su padre (mejora de Lawler).
+            - "penalizacion": tras cada camino encontrado se multiplica el
+              peso de sus aristas por penalizacion y se repite la búsqueda.
+              No da los k más cortos, pero sí rutas distintas, y es la
+              opción adecuada con solapamiento_max pequeño.
+
+        Args:
+            o: id de origen
+            t: id de destino
+            k: número de caminos a aceptar
+            solapamiento_max: fracción máxima del coste de un camino que
+            puede compartir con cada uno de los aceptados
+            max_caminos: número máximo de caminos a enumerar o de búsquedas
+            metodo: "yen" o "penalizacion"
+            penalizacion: factor de penalización de las aristas usadas
+        Returns: Tupla (aceptados, asentados) con la lista de pares (camino
+        de ids, coste) y el número total de vértices asentados.
+        """
+        if metodo not in ("yen", "penalizacion"):
+            raise ValueError(f"Método desconocido: {metodo}")
+        cotas, siguientes = self._dijkstra_ids(t, o, True, holgura=HOLGURA)
+        if cotas[o] == INFTY:
+            return [], sum(d < INFTY for d in cotas)
+        # Los vértices no asentados están a más de limite de t: limite es
+        # una cota inferior (y la heurística sigue siendo consistente)
+        limite = HOLGURA * cotas[o]
+        asentados = 0
+        for v, d in enumerate(cotas):
+            if d <= limite:
+                asentados += 1
+            else:
+                cotas[v], siguientes[v] = limite, -1
+        camino = [o]
+        while camino[-1] != t:
+            camino.append(siguientes[camino[-1]])
+        aceptados = [(camino, cotas[o], self._tramos(camino))]
+
+        def aceptar(camino, coste):
+            tramos = self._tramos(camino)
+            for _, _, otros in aceptados:
+                compartido = sum(w for e, w in tramos.items() if e in otros)
+                if compartido > solapamiento_max * coste:
+                    return
+            aceptados.append((camino, coste, tramos))
+
+        vistos = {tuple(camino)}
+        if metodo == "penalizacion":
+            recargos: Dict[int, float] = {}
+            for _ in range(max_caminos - 1):
+                if len(aceptados) == k:
+                    break
+                for u, v in zip(camino, camino[1:]):
+                    for e in {self._posicion(u, v), self._posicion(v, u)} - {-1}:
+                        recargos[e] = recargos.get(e, 1) * penalizacion
+                camino, _, n = self._desvio_ids(o, t, cotas, recargos=recargos)
+                asentados += n
+                if tuple(camino) not in vistos:
+                    vistos.add(tuple(camino))
+                    aceptar(camino, sum(self._tramos(camino).values()))
+            return [(c, coste) for c, coste, _ in aceptados], asentados
+        pesos = self._listas[2]
+        # Caminos enumerados con el índice en el que se desviaron de su padre
+        enumerados = [(camino, 0)]
+        candidatos = []
+        while len(aceptados) < k and len(enumerados) < max_caminos:
+            ultimo, desviacion = enumerados[-1]
+            coste_raiz = 0
+            for i in range(len(ultimo) - 1):
+                if i >= desviacion:
+                    raiz = ultimo[: i + 1]
+                    prohibidas = {c[i + 1] for c, _ in enumerados if c[: i + 1] == raiz}
+                    desvio, coste, n = self._desvio_ids(
+                        ultimo[i], t, cotas, siguientes, raiz[:-1], prohibidas
+                    )
+                    asentados += n
+                    if desvio is not None:
+                        nuevo = raiz[:-1] + desvio
+                        if tuple(nuevo) not in vistos:
+                            vistos.add(tuple(nuevo))
+                            heapq.heappush(candidatos, (coste_raiz + coste, nuevo, i))
+                coste_raiz += pesos[self._posicion(ultimo[i], ultimo[i + 1])]
+            if not candidatos:
+                break
+            coste, camino, desviacion = heapq.heappop(candidatos)
+            enumerados.append((camino, desviacion))
+            aceptar(camino, coste)
+        return [(c, coste) for c, coste, _ in aceptados], asentados
+
+    def _tramos(self, camino: List[int]) -> Dict[tuple, float]:
+        """Aristas de un camino de ids con su peso, como pares ordenados si
+        el grafo no es dirigido (para comparar caminos en ambos sentidos).
+        """
+        pesos = self._listas[2]
+        tramos = {}
+        for u, v in zip(camino, camino[1:]):
+            e = (u, v) if self._dirigido or u < v else (v, u)
+            tramos[e] = pesos[self._posicion(u, v)]
+        return tramos
+
+    def _heuristica_euclidea(self, destino: int, velocidad_max: float = None):
+        """Heurística de A*: distancia euclídea hasta destino dividida por
+        la velocidad máxima. Es admisible y consistente porque ninguna
+        arista se recorre a más velocidad que velocidad_maxima.
+
+        Args:
+            destino: id del vértice de destino
+            velocidad_max: velocidad a usar (por defecto velocidad_maxima)
+        Returns: Función id -> cota inferior, o None si no es aplicable.
+        """
+        vmax = self.velocidad_maxima if velocidad_max is None else velocidad_max
+        if not vmax or vmax == INFTY:
+            return None
+        xs, ys = self._xy
+        dx, dy = xs[destino], ys[destino]
+        return lambda v: math.hypot(xs[v] - dx, ys[v] - dy) / vmax
+
+    def _reconstruir(self, padres, destino: int) -> List[int]:
+        """Reconstruye el camino hasta destino a partir de los padres.
+
+        Args:
+            padres: padres indexados por id (-1 si no tiene)
+            destino: id del vértice de destino
+        Returns: Lista de ids desde origen hasta destino.
+        """
+        path = []
+        v = destino
+        while v != -1:
+            path.append(v)
+            v = padres[v]
+        return path[::-1]
+
+    def _camino_ids(
+        self,
+        o: int,
+        t: int,
+        algoritmo: str = "dijkstra",
+        velocidad_max=None,
+        estadisticas: dict = None,
+        traza: Callable = None,
+    ):
+        """Camino mínimo de o a t sobre ids con el algoritmo indicado (ver
+        camino_minimo).
+
+        Args:
+            o: id de origen
+            t: id de destino
+            algoritmo: "dijkstra", "astar", "bidireccional" o "alt"
+            velocidad_max: velocidad para la heurística de A* (opcional)
+            estadisticas: diccionario de contadores (opcional)
+            traza: función traza(id, prioridad, frontera) (opcional)
+        Returns: Tupla (camino, coste, asentados) con la lista de ids del
+        camino, o None y coste None si t no es alcanzable.
+        """
+        if algoritmo == "bidireccional":
+            coste, encuentro, padres, asentados = self._bidireccional_ids(
+                o, t, estadisticas, traza
+            )
+            if encuentro is None:
+                return None, None, asentados
+            a, b = encuentro
+            camino = self._reconstruir(padres[0], a)
+            if a != b:
+                camino.extend(self._reconstruir(padres[1], b)[::-1])
+            return camino, coste, asentados
+        heuristica = None
+        if algoritmo == "astar":
+            if self.coords is not None:
+                heuristica = self._heuristica_euclidea(t, velocidad_max)
+        elif algoritmo == "alt":
+            if self.landmarks is None:
+                raise ValueError("No hay landmarks: asigna self.landmarks antes")
+            if self.landmarks.obsoletos:
+                raise ValueError("Los landmarks son de unos pesos anteriores")
+            heuristica = self.landmarks.heuristica(o, t)
+        elif algoritmo != "dijkstra":
+            raise ValueError(f"Algoritmo desconocido: {algoritmo}")
+        dist, padres, asentados = self._astar_ids(o, t, heuristica, estadisticas, traza)
+        if t not in dist:
+            return None, None, asentados
+        return self._reconstruir(padres, t), dist[t], asentados
+
+    #### Algoritmos ####
+    def dijkstra(
+        self, origen: object, estadisticas: dict = None, traza: Callable = None
+    ) -> Dict[object, object]:
+        """Calcula el árbol de caminos mínimos desde "origen" con el
+        algoritmo de Dijkstra sobre los arrays CSR.
+
+        Args:
+            origen: vértice del grafo de origen
+            estadisticas: diccionario opcional donde se guardan los
+            contadores de la búsqueda (ver instrumentacion.py)
+            traza: función traza(vertice, prioridad, frontera) opcional a la
+            que se llama al extraer cada vértice de la cola
+        Returns: Devuelve un diccionario que indica, para cada vértice alcanzable
+        desde "origen", qué vértice es su padre en el árbol. None si origen
+        no es un vértice del grafo.
+        """
+        if origen not in self.ids:
+            return None
+        o = self.ids[origen]
+        _, padres = self._dijkstra_ids(
+            o, estadisticas=estadisticas, traza=self._traza_vertices(traza)
+        )
+        vertices = self.vertices
+        arbol = {origen: None}
+        for w, p in enumerate(padres):
+            if p != -1 and w != o:
+                arbol[vertices[w]] = vertices[p]
+        return arbol
+
+    def camino_minimo(
+        self,
+        origen: object,
+        destino: object,
+        algoritmo: str = "dijkstra",
+        velocidad_max: float = None,
+        estadisticas: dict = None,
+        salida: datetime = None,
+        traza: Callable = None,
+    ) -> List[object]:
+        """Calcula el camino mínimo de origen a destino, deteniéndose al
+        asentar el destino. Con algoritmo="astar" usa A* con la heurística
+        euclídea (ver velocidad_maxima), que solo se aplica si los vértices
+        son coordenadas. Con algoritmo="bidireccional" usa Dijkstra
+        bidireccional. Con algoritmo="alt" usa A* con las cotas de la
+        desigualdad triangular de self.landmarks (ver landmarks.py).
+
+        Si se indica salida, calcula el camino más rápido saliendo a esa
+        hora con los perfiles de velocidad de self.perfiles (ver
+        perfiles.py), con "dijkstra" o "astar".
+
+        Args:
+            origen: vértice de origen
+            destino: vértice de destino
+            algoritmo: "dijkstra", "astar", "bidireccional" o "alt"
+            velocidad_max: velocidad para la heurística de A* (opcional)
+            estadisticas: diccionario opcional donde se guardan el número de
+            vértices asentados ("asentados") y el coste del camino ("coste");
+            sin salida, también los contadores de la búsqueda (ver
+            instrumentacion.py); con salida, la hora de llegada ("llegada")
+            salida: fecha y hora de salida (opcional)
+            traza: función traza(vertice, prioridad, frontera) opcional a la
+            que se llama al extraer cada vértice de la cola (sin salida)
+        Returns: Lista de vértices [origen, ..., destino] o None si alguno
+        no existe o destino no es alcanzable.
+        """
+        if origen not in self.ids or destino not in self.ids:
+            return None
+        o, t = self.ids[origen], self.ids[destino]
+        if salida is None:
+            camino, coste, asentados = self._camino_ids(
+                o,
+                t,
+                algoritmo,
+                velocidad_max,
+                estadisticas,
+                self._traza_vertices(traza),
+            )
+        else:
+            medianoche = salida.replace(hour=0, minute=0, second=0, microsecond=0)
+            segundos = (salida - medianoche).total_seconds()
+            camino, coste, asentados = self._camino_dependiente_ids(
+                o, t, segundos, algoritmo, velocidad_max
+            )
+        if estadisticas is not None:
+            estadisticas["asentados"] = asentados
+            estadisticas["coste"] = coste
+            if salida is not None:
+                llegada = None if coste is None else salida + timedelta(seconds=coste)
+                estadisticas["llegada"] = llegada
+        if camino is None:
+            return None
+        vertices = self.vertices
+        return [vertices[v] for v in camino]
+
+    def _traza_vertices(self, traza: Callable) -> Callable:
+        """Traza sobre ids que llama a traza con el vértice original."""
+        if traza is None:
+            return None
+        vertices = self.vertices
+        return lambda v, prioridad, frontera: traza(vertices[v], prioridad, frontera)
+
+    def _ids_de(self, vertices: List[object]) -> List[int]:
+        """Ids de una lista de vértices. Lanza ValueError si alguno no
+        pertenece al grafo.
+        """
+        ids = self.ids
+        desconocidos = [v for v in vertices if v not in ids]
+        if desconocidos:
+            raise ValueError(f"Vértices que no están en el grafo: {desconocidos[:5]}")
+        return [ids[v] for v in vertices]
+
+    def _filas_distancias(
+        self, origenes: List[int], destinos: List[int], costes, padres=None
+    ):
+        """Rellena las filas de la matriz de distancias de los origenes
+        dados (ids), con un Dijkstra por origen que se detiene al asentar
+        todos los destinos.
+
+        Args:
+            origenes: ids de origen, uno por fila
+            destinos: ids de destino, uno por columna
+            costes: array (len(origenes), len(destinos)) de salida
+            padres: array (len(origenes), n) de salida para los padres, o
+            None si no se piden
+        Returns: None
+        """
+        objetivos = set(destinos)
+        for i, o in enumerate(origenes):
+            dist, p = self._dijkstra_ids(o, objetivos=objetivos)
+            costes[i] = [dist[t] for t in destinos]
+            if padres is not None:
+                padres[i] = p
+
+    def matriz_distancias(
+        self,
+        origenes: List[object],
+        destinos: List[object],
+        predecesores: bool = False,
+        procesos: int = 1,
+    ):
+        """Calcula la matriz de costes mínimos de cada origen a cada destino.
+        Cada búsqueda se detiene cuando ha asentado todos los destinos.
+        Con procesos > 1 los orígenes se reparten entre procesos que
+        comparten el grafo en memoria compartida (ver paralelo.py).
+
+        Args:
+            origenes: lista de vértices de origen (filas)
+            destinos: lista de vértices de destino (columnas)
+            predecesores: si es True, devuelve también los padres
+            procesos: número de procesos
+        Returns: Array (len(origenes), len(destinos)) de costes, con inf si
+        el destino no es alcanzable. Si predecesores es True, una tupla
+        (costes, padres) donde padres[i] es el array de ids de los padres
+        en el árbol de caminos mínimos del origen i (-1 si no tiene o no se
+        llegó a asentar; los caminos a los destinos están siempre
+        completos).
+        """
+        o, t = self._ids_de(origenes), self._ids_de(destinos)
+        if procesos > 1 and len(o) > 1:
+            from paralelo import matriz_distancias_paralela
+
+            return matriz_distancias_paralela(self, o, t, predecesores, procesos)
+        costes = np.empty((len(o), len(t)))
+        padres = np.empty((len(o), len(self)), dtype=np.int32) if predecesores else None
+        self._filas_distancias(o, t, costes, padres)
+        return (costes, padres) if predecesores else costes
+
+    def rutas_batch(
+        self,
+        pares: List[tuple],
+        workers: int = None,
+        algoritmo: str = "dijkstra",
+        velocidad_max: float = None,
+    ):
+        """Calcula el camino mínimo de muchos pares (origen, destino) en un
+        pool de procesos que comparten el grafo (ver paralelo.rutas_batch).
+
+        Args:
+            pares: lista de pares (origen, destino)
+            workers: número de procesos
+            algoritmo: algoritmo de camino_minimo
+            velocidad_max: velocidad para la heurística de A* (opcional)
+        Returns: Generador de resultados según se completan, diccionarios
+        con "indice", "origen", "destino", "camino", "coste" y "asentados".
+        """
+        from paralelo import rutas_batch
+
+        return rutas_batch(self, pares, workers, algoritmo, velocidad_max)
+
+    def ruta_multiparada(
+        self,
+        paradas: List[object],
+        inicio: object,
+        fin: object = None,
+        procesos: int = 1,
+    ) -> tuple:
+        """Ruta que sale de inicio, visita todas las paradas en el orden de
+        menor tiempo total y acaba en fin (o en la última parada si no se
+        da). La matriz de tiempos entre paradas se calcula con un Dijkstra
+        por origen que para al asentar todas las paradas (ver
+        matriz_distancias), y el orden con ordenacion.recorrido_optimo:
+        exacto hasta ordenacion.MAX_HELD_KARP paradas y con 2-opt y Or-opt
+        si hay más. La matriz no se supone simétrica.
+
+        Args:
+            paradas: lista de vértices a visitar
+            inicio: vértice de salida
+            fin: vértice de llegada (opcional)
+            procesos: número de procesos para la matriz de tiempos
+        Returns: Tupla (camino, orden, coste) con la lista de vértices del
+        recorrido completo, las posiciones de paradas en el orden de
+        visita y el coste total. None si algún vértice no existe o alguna
+        parada no es alcanzable.
+        """
+        ids = self.ids
+        if any(v not in ids for v in [inicio, *paradas]) or (
+            fin is not None and fin not in ids
+        ):
+            return None
+        m = len(paradas)
+        destinos = list(paradas) + ([fin] if fin is not None else [])
+        costes, padres = self.matriz_distancias(
+            [inicio, *paradas], destinos, predecesores=True, procesos=procesos
+        )
+        if not np.isfinite(costes).all():
+            return None
+        d, d_inicio = costes[1:, :m], costes[0, :m]
+        d_fin = costes[1:, m] if fin is not None else np.zeros(m)
+        orden = recorrido_optimo(d, d_inicio, d_fin)
+        # Filas de la matriz (0 es inicio) y columnas de cada tramo
+        filas = [0] + [i + 1 for i in orden]
+        columnas = orden + ([m] if fin is not None else [])
+        columnas_ids = self._ids_de(destinos)
+        camino = [ids[inicio]]
+        for fila, columna in zip(filas, columnas):
+            tramo = self._reconstruir(padres[fila], columnas_ids[columna])
+            camino.extend(tramo[1:])
+        vertices = self.vertices
+        coste = float(sum(costes[f, c] for f, c in zip(filas, columnas)))
+        return [vertices[v] for v in camino], orden, coste
+
+    def k_caminos(
+        self,
+        origen: object,
+        destino: object,
+        k: int = 3,
+        solapamiento_max: float = 1.0,
+        metodo: str = "yen",
+        max_caminos: int = None,
+        estadisticas: dict = None,
+    ) -> List[tuple]:
+        """Hasta k caminos alternativos sin ciclos de origen a destino (ver
+        _alternativas_ids). Con metodo="yen" son los k caminos más cortos
+        por coste creciente; con metodo="penalizacion", rutas que evitan
+        las aristas de las anteriores. Con solapamiento_max < 1 se
+        descartan los caminos que comparten más de esa fracción de su coste
+        con alguno de los anteriores.
+
+        Args:
+            origen: vértice de origen
+            destino: vértice de destino
+            k: número de caminos
+            solapamiento_max: fracción máxima de coste compartido (1 para
+            no limitarlo)
+            metodo: "yen" o "penalizacion"
+            max_caminos: número máximo de caminos a enumerar o de búsquedas
+            (por defecto 10 * k)
+            estadisticas: diccionario opcional donde se guarda el número de
+            vértices asentados ("asentados")
+        Returns: Lista de tuplas (camino, coste), con el camino como lista de
+        vértices; vacía si destino no es alcanzable. None si alguno no
+        existe.
+        """
+        if origen not in self.ids or destino not in self.ids:
+            return None
+        o, t = self.ids[origen], self.ids[destino]
+        caminos, asentados = self._alternativas_ids(
+            o, t, k, solapamiento_max, max_caminos or 10 * k, metodo
+        )
+        if estadisticas is not None:
+            estadisticas["asentados"] = asentados
+        vertices = self.vertices
+        return [([vertices[v] for v in camino], coste) for camino, coste in caminos]
+
+    def prim(self) -> Dict[object, object]:
+        """Calcula un Árbol Abarcador Mínimo para el grafo
+        usando el algoritmo de Prim sobre los arrays CSR. Si el grafo no es
+        conexo, al agotar un componente sigue desde el primer vértice no
+        visitado, de modo que devuelve el bosque abarcador mínimo (como
+        kruskal).
+
+        Args: None
+        Returns: Devuelve un diccionario que indica, para cada vértice que no
+        es raíz de su componente, qué vértice es su padre en el árbol
+        abarcador mínimo.
+        """
+        offsets, destinos, pesos = self._listas
+        n = len(offsets) - 1
+        if n == 0:
+            return {}
+        coste = [INFTY] * n
+        padres = [-1] * n
+        visitados = [False] * n
+        for inicio in itertools.chain([r.randrange(n)], range(n)):
+            if visitados[inicio]:
+                continue
+            coste[inicio] = 0
+            pq = [(0, inicio)]
+            while pq:
+                _, v = heapq.heappop(pq)
+                if visitados[v]:
+                    continue
+                visitados[v] = True
+                for k in range(offsets[v], offsets[v + 1]):
+                    w = destinos[k]
+                    if not visitados[w] and pesos[k] < coste[w]:
+                        coste[w] = pesos[k]
+                        padres[w] = v
+                        heapq.heappush(pq, (pesos[k], w))
+        vertices = self.vertices
+        return {vertices[w]: vertices[p] for w, p in enumerate(padres) if p != -1}
+
+    def kruskal(self) -> List[tuple]:
+        """Calcula un Árbol Abarcador Mínimo (un bosque si el grafo no es
+        conexo) con el algoritmo de Kruskal sobre los arrays CSR. Las
+        aristas se ordenan con NumPy, cada arista no dirigida una sola vez,
+        y los componentes se mantienen en un UnionFind.
+
+        Args: None
+        Returns: Lista [(s1, t1), ..., (sk, tk)] de las aristas del árbol.
+        """
+        n = len(self)
+        origenes = np.repeat(np.arange(n, dtype=np.int32), np.diff(self.offsets))
+        destinos, pesos = self.destinos, self.pesos
+        if not self._dirigido:
+            una_vez = origenes < destinos
+            origenes, destinos, pesos = (
+                origenes[una_vez],
+                destinos[una_vez],
+                pesos[una_vez],
+            )
+        orden = np.argsort(pesos, kind="stable")
+        conjuntos = UnionFind(n)
+        arbol = []
+        for u, v in zip(origenes[orden].tolist(), destinos[orden].tolist()):
+            if conjuntos.unir(u, v):
+                arbol.append((u, v))
+                if conjuntos.conjuntos == 1:
+                    break
+        vertices = self.vertices
+        return [(vertices[u], vertices[v]) for u, v in arbol]
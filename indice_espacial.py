@@ -0,0 +1,266 @@
+"""
+indice_espacial.py
+
+Índice espacial de rejilla uniforme sobre las coordenadas (x, y) en cm de
+los vértices del grafo, para ajustar direcciones al vértice más cercano sin
+recorrer todos los cruces en cada consulta.
+
+Los puntos se ordenan por celda, de modo que los de cada celda ocupan un
+rango contiguo del array. Una consulta recorre anillos de celdas
+alrededor del punto hasta que ningún punto no visitado puede estar más
+cerca que los k encontrados.
+"""
+
+import math
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from union_find import UnionFind
+
+
+def agrupar_puntos(
+    coords: np.ndarray, distancia: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Agrupa los puntos unidos por cadenas de pares a distancia Manhattan
+    menor que la indicada.
+
+    Los puntos se reparten en celdas de lado distancia, de modo que cada
+    par cercano está en la misma celda o en dos adyacentes, y solo se
+    comparan los puntos de celdas vecinas. Los pares se generan a la vez
+    con NumPy para cada uno de los 5 desplazamientos (la propia celda y 4
+    vecinas, para no ver cada par dos veces) y se unen con union-find.
+
+    Args:
+        coords: array (n, 2) de coordenadas
+        distancia: distancia Manhattan por debajo de la cual dos puntos
+        están en el mismo grupo
+    Returns: Tupla (canonicas, grupos): para cada punto, las coordenadas
+    del primer punto (en orden de coords) de su grupo y el número de su
+    grupo, numerados por orden de aparición.
+    """
+    coords = np.asarray(coords).reshape(-1, 2)
+    n = len(coords)
+    celdas = np.floor((coords - coords.min(axis=0, initial=0)) / distancia)
+    celdas = celdas.astype(np.int64)
+    ancho = int(celdas[:, 1].max(initial=0)) + 3
+    claves = celdas[:, 0] * ancho + celdas[:, 1] + 1
+    orden = np.argsort(claves, kind="stable")
+    claves_ordenadas = claves[orden]
+    conjuntos = UnionFind(n)
+    for di, dj in ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+        vecinas = claves_ordenadas + di * ancho + dj
+        inicios = np.searchsorted(claves_ordenadas, vecinas, "left")
+        cuentas = np.searchsorted(claves_ordenadas, vecinas, "right") - inicios
+        # Pares (i, j) de posiciones en orden con j en la celda vecina de i
+        i = np.repeat(np.arange(n), cuentas)
+        grupos = np.cumsum(cuentas) - cuentas
+        j = np.repeat(inicios - grupos, cuentas) + np.arange(cuentas.sum())
+        if (di, dj) == (0, 0):
+            i, j = i[i < j], j[i < j]
+        a, b = orden[i], orden[j]
+        cerca = np.abs(coords[a] - coords[b]).sum(axis=1) < distancia
+        for x, y in zip(a[cerca].tolist(), b[cerca].tolist()):
+            conjuntos.unir(x, y)
+    grupos = conjuntos.etiquetas()
+    primeros = np.full(grupos.max(initial=-1) + 1, n, dtype=np.int64)
+    np.minimum.at(primeros, grupos, np.arange(n))
+    return coords[primeros[grupos]], grupos
+
+
+class IndiceEspacial:
+    # Rejilla uniforme sobre un array de puntos (n, 2)
+
+    def __init__(self, coords: np.ndarray, tam_celda: float = None):
+        """Construye el índice.
+
+        Args:
+            coords: array (n, 2) con las coordenadas de los puntos
+            tam_celda: lado de las celdas (por defecto, la mitad del que
+            deja un punto por celda si estuvieran repartidos uniformemente,
+            porque los cruces se concentran en el centro)
+        Returns: IndiceEspacial sobre coords. Los resultados de las
+        consultas son posiciones en coords.
+        """
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        self.grafo = None
+        self.vias: Dict[int, np.ndarray] = {}
+        n = len(self.coords)
+        self.minimo = self.coords.min(axis=0) if n else np.zeros(2)
+        extension = self.coords.max(axis=0) - self.minimo if n else np.ones(2)
+        if tam_celda is None:
+            area = max(extension[0], 1.0) * max(extension[1], 1.0)
+            tam_celda = max(np.sqrt(area / max(n, 1)) / 2, 1.0)
+        self.tam_celda = float(tam_celda)
+        self.dims = (extension // self.tam_celda).astype(np.int64) + 1
+        celdas = self._celdas(self.coords)
+        claves = celdas[:, 0] * self.dims[1] + celdas[:, 1]
+        self.orden = np.argsort(claves, kind="stable")
+        self.ordenados = self.coords[self.orden]
+        claves = claves[self.orden]
+        self.claves, self.inicios = np.unique(claves, return_index=True)
+        self.finales = np.append(self.inicios[1:], n)
+        self._xs = self.ordenados[:, 0].tolist()
+        self._ys = self.ordenados[:, 1].tolist()
+        self._rangos = dict(
+            zip(
+                self.claves.tolist(),
+                zip(self.inicios.tolist(), self.finales.tolist()),
+            )
+        )
+
+    @classmethod
+    def desde_grafo(cls, grafo, cruces: pd.DataFrame = None) -> "IndiceEspacial":
+        """Construye el índice sobre los vértices de un GrafoCompacto cuyos
+        vértices son coordenadas. Si se dan los cruces (con columnas x, y,
+        id_via e id_via_cruzada), cada cruce se ajusta a su vértice más
+        cercano y el vértice se asocia a ambas vías, para poder restringir
+        las consultas a una calle.
+
+        Args:
+            grafo: GrafoCompacto con vértices (x, y)
+            cruces: DataFrame de cruces (opcional)
+        Returns: IndiceEspacial cuyos resultados son ids del grafo.
+        """
+        if grafo.coords is None:
+            raise ValueError("Los vértices del grafo no son coordenadas (x, y)")
+        indice = cls(grafo.coords)
+        indice.grafo = grafo
+        if cruces is not None:
+            ids, _ = indice.mas_cercano_lote(
+                cruces["x"].to_numpy(), cruces["y"].to_numpy()
+            )
+            pares = pd.DataFrame(
+                {
+                    "id": np.concatenate([ids, ids]),
+                    "id_via": np.concatenate(
+                        [cruces["id_via"], cruces["id_via_cruzada"]]
+                    ),
+                }
+            ).drop_duplicates()
+            indice.vias = {
+                via: grupo.to_numpy() for via, grupo in pares.groupby("id_via")["id"]
+            }
+        return indice
+
+    def _celdas(self, puntos: np.ndarray) -> np.ndarray:
+        """Celda (i, j) de cada punto, sin limitar a la rejilla."""
+        return np.floor((puntos - self.minimo) / self.tam_celda).astype(np.int64)
+
+    def _puntos_celda(self, i: int, j: int) -> Tuple[int, int]:
+        """Rango de posiciones en self.orden de los puntos de la celda."""
+        if 0 <= i < self.dims[0] and 0 <= j < self.dims[1]:
+            return self._rangos.get(int(i * self.dims[1] + j), (0, 0))
+        return 0, 0
+
+    def mas_cercanos(
+        self, x: float, y: float, k: int = 1, id_via: int = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Busca los k puntos más cercanos a (x, y).
+
+        Args:
+            x: coordenada x
+            y: coordenada y
+            k: número de puntos
+            id_via: si se indica, solo se consideran los vértices asociados a
+            esa vía (ver desde_grafo)
+        Returns: Tupla (posiciones, distancias) ordenada de menor a mayor
+        distancia, con hasta k elementos.
+        """
+        if id_via is not None:
+            candidatos = self.vias.get(id_via, np.empty(0, dtype=np.int64))
+            d = np.hypot(*(self.coords[candidatos] - (x, y)).T)
+            mejores = np.argsort(d, kind="stable")[:k]
+            return candidatos[mejores], d[mejores]
+        k = min(k, len(self.coords))
+        xs, ys = self._xs, self._ys
+        ci, cj = self._celdas(np.array([[x, y]]))[0].tolist()
+        radio_max = max(ci, self.dims[0] - ci, cj, self.dims[1] - cj)
+        candidatos: List[Tuple[float, int]] = []
+        for r in range(radio_max + 1):
+            if r == 0:
+                celdas = [(ci, cj)]
+            else:
+                celdas = [(ci - r, j) for j in range(cj - r, cj + r + 1)]
+                celdas += [(ci + r, j) for j in range(cj - r, cj + r + 1)]
+                celdas += [(i, cj - r) for i in range(ci - r + 1, ci + r)]
+                celdas += [(i, cj + r) for i in range(ci - r + 1, ci + r)]
+            for i, j in celdas:
+                a, b = self._puntos_celda(i, j)
+                for p in range(a, b):
+                    candidatos.append((math.hypot(xs[p] - x, ys[p] - y), p))
+            # Todo punto fuera de los anillos recorridos está a más de
+            # r * tam_celda del punto buscado
+            if len(candidatos) >= k:
+                candidatos.sort()
+                if candidatos[k - 1][0] <= r * self.tam_celda:
+                    break
+        candidatos = sorted(candidatos)[:k]
+        posiciones = np.array([p for _, p in candidatos], dtype=np.int64)
+        distancias = np.array([d for d, _ in candidatos])
+        return self.orden[posiciones], distancias
+
+    def mas_cercano_lote(
+        self, xs: np.ndarray, ys: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Busca el punto más cercano a cada uno de los puntos (xs, ys).
+        Se examinan a la vez las 3x3 celdas alrededor de todos los puntos;
+        los que no tienen un vecino a menos de una celda se resuelven con
+        mas_cercanos.
+
+        Args:
+            xs: array de coordenadas x
+            ys: array de coordenadas y
+        Returns: Tupla (posiciones, distancias) con un elemento por punto.
+        """
+        puntos = np.column_stack([xs, ys]).astype(np.float64)
+        m = len(puntos)
+        celdas = self._celdas(puntos)
+        mejor_d = np.full(m, np.inf)
+        mejor_p = np.full(m, -1, dtype=np.int64)
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                i, j = celdas[:, 0] + di, celdas[:, 1] + dj
+                dentro = (i >= 0) & (i < self.dims[0]) & (j >= 0) & (j < self.dims[1])
+                claves = i * self.dims[1] + j
+                pos = np.searchsorted(self.claves, claves)
+                pos = np.minimum(pos, len(self.claves) - 1)
+                dentro &= self.claves[pos] == claves
+                consultas = np.flatnonzero(dentro)
+                if not len(consultas):
+                    continue
+                inicios = self.inicios[pos[consultas]]
+                cuentas = self.finales[pos[consultas]] - inicios
+                # Pares (consulta, punto) agrupados por consulta
+                grupos = np.cumsum(cuentas) - cuentas
+                p = np.repeat(inicios - grupos, cuentas) + np.arange(cuentas.sum())
+                q = np.repeat(consultas, cuentas)
+                d = np.hypot(*(self.ordenados[p] - puntos[q]).T)
+                minimos = np.minimum.reduceat(d, grupos)
+                es_minimo = np.flatnonzero(d == np.repeat(minimos, cuentas))
+                elegidos = np.empty(len(consultas), dtype=np.int64)
+                elegidos[np.searchsorted(grupos, es_minimo, "right") - 1] = p[es_minimo]
+                mejora = minimos < mejor_d[consultas]
+                mejor_d[consultas[mejora]] = minimos[mejora]
+                mejor_p[consultas[mejora]] = self.orden[elegidos[mejora]]
+        for c in np.flatnonzero(mejor_d > self.tam_celda).tolist():
+            posiciones, distancias = self.mas_cercanos(*puntos[c])
+            mejor_p[c], mejor_d[c] = posiciones[0], distancias[0]
+        return mejor_p, mejor_d
+
+    def vertice_mas_cercano(self, x: float, y: float, id_via: int = None) -> object:
+        """Vértice del grafo más cercano a (x, y). Si se indica una vía con
+        vértices asociados, se busca solo entre ellos; si no tiene ninguno,
+        en todo el grafo.
+
+        Args:
+            x: coordenada x en cm
+            y: coordenada y en cm
+            id_via: vía a la que restringir la búsqueda (opcional)
+        Returns: El vértice (x, y) del grafo más cercano.
+        """
+        if id_via not in self.vias:
+            id_via = None
+        posiciones, _ = self.mas_cercanos(x, y, 1, id_via)
+        return self.grafo.vertices[posiciones[0]]
@@ -0,0 +1,233 @@
+"""
+instrumentacion.py
+
+Contadores y trazas opcionales de las búsquedas de Grafo (dijkstra,
+camino_minimo y prim) y GrafoCompacto (dijkstra y camino_minimo) y
+cronómetro por fases para gps.py.
+
+Las búsquedas usan una heapdict normal si no se piden estadísticas ni
+traza, así que desactivada la instrumentación no cuesta nada. Si se
+piden, usan ColaInstrumentada, una heapdict que cuenta sus operaciones y
+avisa a la traza de cada vértice que extrae. Las búsquedas de
+GrafoCompacto, con heapq y borrado perezoso, obtienen de operaciones_heap
+las funciones heappush y heappop normales o sus versiones instrumentadas
+de HeapInstrumentado, con los mismos contadores:
+    - "extraidos": vértices sacados de la cola
+    - "insertados": vértices que entran por primera vez en la cola
+    - "decrementos": mejoras de la prioridad de un vértice ya en la cola
+    - "frontera_max": tamaño máximo de la cola (con borrado perezoso,
+      contando las entradas obsoletas)
+La búsqueda añade "asentados" y "relajadas" (aristas examinadas).
+
+Una traza es cualquier función traza(vertice, prioridad, frontera) a la
+que se llama al extraer cada vértice; TrazaFrontera las guarda en orden
+para volcarlas a un CSV o dibujar el espacio de búsqueda.
+"""
+
+import csv
+import heapq
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+from heapdict import heapdict
+
+CONTADORES = ("extraidos", "insertados", "decrementos", "frontera_max")
+
+
+class ColaInstrumentada(heapdict):
+    # heapdict que cuenta sus operaciones y llama a una traza al extraer
+
+    def __init__(self, estadisticas: dict = None, traza: Callable = None):
+        """Crea una cola vacía.
+
+        Args:
+            estadisticas: diccionario donde acumular los contadores (se
+            suman a los que ya tenga, para compartirlo entre varias colas)
+            traza: función traza(vertice, prioridad, frontera) opcional
+        Returns: Cola vacía.
+        """
+        super().__init__()
+        self.estadisticas = {} if estadisticas is None else estadisticas
+        for contador in CONTADORES:
+            self.estadisticas.setdefault(contador, 0)
+        self.traza = traza
+        # heapdict reinserta las claves con pop, que pasa por popitem
+        self._reinsertando = False
+
+    def __setitem__(self, clave, prioridad) -> None:
+        e = self.estadisticas
+        if clave in self.d:
+            e["decrementos"] += 1
+            self._reinsertando = True
+            super().__setitem__(clave, prioridad)
+            self._reinsertando = False
+        else:
+            e["insertados"] += 1
+            super().__setitem__(clave, prioridad)
+            e["frontera_max"] = max(e["frontera_max"], len(self.heap))
+
+    def popitem(self) -> Tuple[object, object]:
+        clave, prioridad = super().popitem()
+        if not self._reinsertando:
+            self.estadisticas["extraidos"] += 1
+            if self.traza is not None:
+                self.traza(clave, prioridad, len(self.heap))
+        return clave, prioridad
+
+
+def cola(estadisticas: dict = None, traza: Callable = None) -> heapdict:
+    """Cola de prioridad para una búsqueda: una heapdict normal si no se
+    piden estadísticas ni traza, y una ColaInstrumentada si se piden.
+
+    Args:
+        estadisticas: diccionario de contadores (opcional)
+        traza: función de traza (opcional)
+    Returns: heapdict vacía.
+    """
+    if estadisticas is None and traza is None:
+        return heapdict()
+    return ColaInstrumentada(estadisticas, traza)
+
+
+class HeapInstrumentado:
+    # heappush y heappop sobre una lista con borrado perezoso, con contadores
+
+    def __init__(self, estadisticas: dict = None, traza: Callable = None):
+        """Crea los contadores de un heap de heapq cuyos elementos son
+        tuplas (prioridad, ..., vertice).
+
+        Args:
+            estadisticas: diccionario donde acumular los contadores (como en
+            ColaInstrumentada)
+            traza: función traza(vertice, prioridad, frontera) opcional
+        Returns: HeapInstrumentado sin operaciones.
+        """
+        self.estadisticas = {} if estadisticas is None else estadisticas
+        for contador in CONTADORES:
+            self.estadisticas.setdefault(contador, 0)
+        self.traza = traza
+        self._encolados = set()
+        self._extraidos = set()
+
+    def empujar(self, heap: list, elemento: tuple) -> None:
+        """heapq.heappush que cuenta como decremento volver a encolar un
+        vértice que ya estaba en la cola."""
+        e = self.estadisticas
+        if elemento[-1] in self._encolados:
+            e["decrementos"] += 1
+        else:
+            self._encolados.add(elemento[-1])
+            e["insertados"] += 1
+        heapq.heappush(heap, elemento)
+        e["frontera_max"] = max(e["frontera_max"], len(heap))
+
+    def sacar(self, heap: list) -> tuple:
+        """heapq.heappop que solo cuenta (y traza) la primera extracción de
+        cada vértice; las siguientes son entradas obsoletas."""
+        elemento = heapq.heappop(heap)
+        if elemento[-1] not in self._extraidos:
+            self._extraidos.add(elemento[-1])
+            self.estadisticas["extraidos"] += 1
+            if self.traza is not None:
+                self.traza(elemento[-1], elemento[0], len(heap))
+        return elemento
+
+
+def operaciones_heap(estadisticas: dict = None, traza: Callable = None):
+    """Funciones (heappush, heappop) para una búsqueda con heapq: las de
+    heapq si no se piden estadísticas ni traza, y las de un
+    HeapInstrumentado si se piden.
+
+    Args:
+        estadisticas: diccionario de contadores (opcional)
+        traza: función de traza (opcional)
+    Returns: Tupla (heappush, heappop).
+    """
+    if estadisticas is None and traza is None:
+        return heapq.heappush, heapq.heappop
+    heap = HeapInstrumentado(estadisticas, traza)
+    return heap.empujar, heap.sacar
+
+
+class TrazaFrontera:
+    # Traza que guarda, en orden, cada vértice extraído de la cola
+
+    def __init__(self):
+        """Crea una traza vacía; se pasa como traza a las búsquedas.
+
+        Args: None
+        Returns: TrazaFrontera vacía.
+        """
+        self.eventos: List[Tuple[object, float, int]] = []
+
+    def __call__(self, vertice: object, prioridad: float, frontera: int) -> None:
+        self.eventos.append((vertice, prioridad, frontera))
+
+    def __len__(self):
+        return len(self.eventos)
+
+    def guardar(self, path: str) -> None:
+        """Vuelca la traza a un CSV con una fila por vértice extraído:
+        orden, vértice (x e y si es una coordenada), prioridad y tamaño de
+        la frontera tras extraerlo.
+
+        Args: path ruta del CSV
+        Returns: None
+        """
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            escritor = csv.writer(f)
+            escritor.writerow(["orden", "x", "y", "prioridad", "frontera"])
+            for i, (v, prioridad, frontera) in enumerate(self.eventos):
+                x, y = v if isinstance(v, tuple) and len(v) == 2 else (v, "")
+                escritor.writerow([i, x, y, prioridad, frontera])
+
+    def dibujar(self, ax=None, s: float = 0.5):
+        """Dibuja los vértices extraídos (que han de ser coordenadas)
+        coloreados por orden de extracción, para ver el espacio de búsqueda.
+
+        Args:
+            ax: ejes de matplotlib (por defecto, unos nuevos)
+            s: tamaño de los puntos
+        Returns: Los ejes.
+        """
+        import matplotlib.pyplot as plt
+
+        if ax is None:
+            ax = plt.figure().gca()
+        xs = [v[0] for v, _, _ in self.eventos]
+        ys = [v[1] for v, _, _ in self.eventos]
+        ax.scatter(xs, ys, c=range(len(xs)), s=s, cmap="viridis")
+        ax.set_aspect("equal")
+        return ax
+
+
+class Cronometro:
+    # Tiempos acumulados por fase de un programa
+
+    def __init__(self):
+        """Crea un cronómetro sin fases.
+
+        Args: None
+        Returns: Cronometro vacío.
+        """
+        self.tiempos: Dict[str, float] = {}
+
+    @contextmanager
+    def fase(self, nombre: str):
+        """Mide el bloque with como la fase nombre (se acumula si se repite).
+
+        Args: nombre nombre de la fase
+        Returns: Gestor de contexto.
+        """
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            duracion = time.perf_counter() - inicio
+            self.tiempos[nombre] = self.tiempos.get(nombre, 0) + duracion
+
+    def __str__(self):
+        return "\n".join(
+            f"{nombre:12s} {1000 * t:10.1f} ms" for nombre, t in self.tiempos.items()
+        )
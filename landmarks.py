@@ -0,0 +1,208 @@
+"""
+landmarks.py
+
+Preprocesado ALT (A*, Landmarks, desigualdad Triangular) sobre un
+GrafoCompacto.
+
+Se eligen k vértices de referencia (landmarks) en la periferia del grafo y
+se guardan las distancias desde y hasta cada uno. Por la desigualdad
+triangular, para cualquier landmark L:
+    d(v, t) >= d(L, t) - d(L, v)    y    d(v, t) >= d(v, L) - d(t, L)
+y el máximo de estas cotas es la heurística de A* en
+GrafoCompacto.camino_minimo(..., algoritmo="alt").
+
+Uso:
+    python landmarks.py grafos/plano_de_madrid_tsp2.grf [k]
+construye los landmarks, los guarda junto al grafo (.grf.alt) e imprime
+sus estadísticas.
+"""
+
+import random as r
+import sys
+import time
+from typing import List
+
+import numpy as np
+
+import persistencia
+
+# Valor finito con el que se guardan las distancias a vértices no
+# alcanzables, para que las restas de la heurística no den nan.
+INALCANZABLE = np.float32(1e30)
+
+
+class Landmarks:
+    # Distancias desde y hasta k landmarks, en float32
+
+    def __init__(self, grafo, landmarks: np.ndarray, desde: np.ndarray, hasta):
+        """Crea el conjunto de landmarks a partir de sus arrays. Normalmente
+        se obtiene con construir o cargar.
+
+        Args:
+            grafo: GrafoCompacto sobre el que se calcularon
+            landmarks: ids de los k landmarks
+            desde: array (k, n) con d(L, v) para cada landmark L
+            hasta: array (k, n) con d(v, L) para cada landmark L
+        Returns: Landmarks listos para usar como heurística.
+        """
+        self.grafo = grafo
+        # Las cotas siguen siendo válidas si los pesos solo suben, pero no
+        # si alguno baja (ver GrafoCompacto.actualizar_pesos)
+        self.version_cotas = grafo._version_cotas
+        self.landmarks = np.asarray(landmarks, dtype=np.int32)
+        self.desde = np.ascontiguousarray(desde, dtype=np.float32)
+        self.hasta = np.ascontiguousarray(hasta, dtype=np.float32)
+        finitas = self.desde[self.desde < INALCANZABLE]
+        # Margen para que el redondeo a float32 no haga la cota inadmisible
+        maximo = float(finitas.max()) if finitas.size else 0.0
+        self.tolerancia = 4 * maximo * float(np.finfo(np.float32).eps)
+        self.tiempo_construccion = None
+        self._filas = (
+            [memoryview(f) for f in self.desde],
+            [memoryview(f) for f in self.hasta],
+        )
+
+    @classmethod
+    def construir(cls, grafo, k: int = 16, semilla: int = 0) -> "Landmarks":
+        """Elige k landmarks por selección del punto más lejano y calcula
+        sus distancias con un Dijkstra completo hacia delante y otro sobre
+        el grafo inverso por cada landmark.
+
+        El primer landmark es el vértice más lejano a uno aleatorio y cada
+        uno de los siguientes es el que maximiza la distancia al landmark
+        más cercano, lo que los reparte por la periferia del grafo.
+
+        Args:
+            grafo: GrafoCompacto
+            k: número de landmarks
+            semilla: semilla para elegir el vértice inicial
+        Returns: Landmarks del grafo.
+        """
+        inicio = time.perf_counter()
+        n = len(grafo)
+        k = min(k, n)
+        desde = np.full((k, n), INALCANZABLE, dtype=np.float32)
+        hasta = np.full((k, n), INALCANZABLE, dtype=np.float32)
+        landmarks = []
+        dist, _ = grafo._dijkstra_ids(r.Random(semilla).randrange(n))
+        siguiente = _mas_lejano(np.array(dist))
+        cercania = np.full(n, np.inf)
+        for i in range(k):
+            landmarks.append(siguiente)
+            ida = np.array(grafo._dijkstra_ids(siguiente)[0])
+            vuelta = ida
+            if grafo.es_dirigido():
+                vuelta = np.array(grafo._dijkstra_ids(siguiente, inversa=True)[0])
+            desde[i] = np.where(np.isinf(ida), INALCANZABLE, ida)
+            hasta[i] = np.where(np.isinf(vuelta), INALCANZABLE, vuelta)
+            cercania = np.minimum(cercania, ida)
+            siguiente = _mas_lejano(cercania)
+        lm = cls(grafo, landmarks, desde, hasta)
+        lm.tiempo_construccion = time.perf_counter() - inicio
+        return lm
+
+    def guardar(self, path: str) -> None:
+        """Guarda los landmarks en el formato binario de persistencia.py.
+        Por convenio se guardan junto al grafo, como <grafo>.grf.alt.
+
+        Args: path ruta del fichero de salida
+        Returns: None
+        """
+        arrays = {"landmarks": self.landmarks, "desde": self.desde, "hasta": self.hasta}
+        meta = {"vertices": len(self.grafo), "aristas": self.grafo.num_aristas()}
+        persistencia.guardar_arrays(path, "landmarks", arrays, meta)
+
+    @classmethod
+    def cargar(cls, path: str, grafo) -> "Landmarks":
+        """Carga landmarks guardados con guardar.
+
+        Args:
+            path: ruta del fichero
+            grafo: GrafoCompacto sobre el que se calcularon
+        Returns: Landmarks listos para usar.
+        """
+        tipo, meta, arrays = persistencia.cargar_arrays(path, mmap=False)
+        if tipo != "landmarks":
+            raise ValueError(f"{path} contiene un {tipo}, no landmarks")
+        if (meta["vertices"], meta["aristas"]) != (len(grafo), grafo.num_aristas()):
+            raise ValueError(f"{path} no corresponde a este grafo")
+        return cls(grafo, arrays["landmarks"], arrays["desde"], arrays["hasta"])
+
+    @property
+    def obsoletos(self) -> bool:
+        """Indica si algún peso del grafo ha bajado desde que se calcularon,
+        en cuyo caso la heurística puede no ser admisible.
+        """
+        return self.grafo._version_cotas != self.version_cotas
+
+    def estadisticas(self) -> dict:
+        """Resumen del preprocesado.
+
+        Args: None
+        Returns: Diccionario con el número de landmarks, de vértices, la
+        memoria de las tablas en bytes y el tiempo de construcción en
+        segundos (None si se cargaron de disco).
+        """
+        return {
+            "landmarks": len(self.landmarks),
+            "vertices": self.desde.shape[1],
+            "bytes": self.desde.nbytes + self.hasta.nbytes,
+            "tiempo_construccion": self.tiempo_construccion,
+        }
+
+    def heuristica(self, origen: int, destino: int, activos: int = 4):
+        """Heurística de A* hacia destino. Solo usa los landmarks que dan
+        mejor cota en el origen, que suelen ser los que quedan "detrás" del
+        origen o "delante" del destino.
+
+        Args:
+            origen: id del vértice de origen
+            destino: id del vértice de destino
+            activos: número de landmarks a usar
+        Returns: Función id -> cota inferior de la distancia a destino.
+        """
+        cotas = np.maximum(
+            self.desde[:, destino] - self.desde[:, origen],
+            self.hasta[:, origen] - self.hasta[:, destino],
+        )
+        elegidos = np.argsort(-cotas)[:activos].tolist()
+        terminos: List[tuple] = [
+            (
+                self._filas[0][i],
+                float(self.desde[i, destino]),
+                self._filas[1][i],
+                float(self.hasta[i, destino]),
+            )
+            for i in elegidos
+        ]
+        tolerancia = self.tolerancia
+
+        def h(v: int) -> float:
+            mejor = 0.0
+            for desde, desde_t, hasta, hasta_t in terminos:
+                c = desde_t - desde[v]
+                if c > mejor:
+                    mejor = c
+                c = hasta[v] - hasta_t
+                if c > mejor:
+                    mejor = c
+            return mejor - tolerancia if mejor > tolerancia else 0.0
+
+        return h
+
+
+def _mas_lejano(dist: np.ndarray) -> int:
+    """Vértice alcanzado con mayor distancia, ignorando los no alcanzados."""
+    return int(np.argmax(np.where(np.isfinite(dist), dist, -1)))
+
+
+if __name__ == "__main__":
+    from grafo_compacto import GrafoCompacto
+
+    if len(sys.argv) not in (2, 3):
+        print(__doc__)
+        sys.exit(1)
+    madrid = GrafoCompacto.cargar(sys.argv[1])
+    alt = Landmarks.construir(madrid, *map(int, sys.argv[2:]))
+    alt.guardar(sys.argv[1] + ".alt")
+    print(alt.estadisticas())
@@ -0,0 +1,334 @@
+"""
+ordenacion.py
+
+Ordenación de los cruces de una vía: dado un grupo de puntos y,
+opcionalmente, el punto desde el que se llega (inicio) y al que se sale
+(fin), busca el recorrido que pasa por todos minimizando la suma de
+distancias al cuadrado entre consecutivos, como sort_tsp en
+create_graph.ipynb.
+
+    - Grupos de hasta MAX_HELD_KARP puntos: óptimo exacto con la
+      programación dinámica de Held-Karp, O(2^n n^2), vectorizada por
+      capas de subconjuntos del mismo tamaño y por lotes de grupos con el
+      mismo número de puntos.
+    - Grupos mayores: vecino más cercano desde inicio mejorado con 2-opt,
+      que invierte tramos del recorrido mientras se acorte.
+
+ordenar_grupos reparte los grupos entre un pool de procesos.
+
+Las mismas piezas ordenan las paradas de GrafoCompacto.ruta_multiparada
+sobre una matriz de tiempos de viaje, que no tiene por qué ser simétrica
+(calles de un solo sentido): recorrido_optimo usa Held-Karp o vecino más
+cercano seguido de 2-opt y Or-opt (mover tramos cortos a otra posición)
+hasta que ninguno mejora.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# Tamaño máximo de grupo que se resuelve de forma exacta
+MAX_HELD_KARP = 10
+# Longitud máxima de los tramos que mueve Or-opt
+MAX_TRAMO_OR_OPT = 3
+# Por debajo de este número de puntos no compensa arrancar procesos
+MIN_PARALELO = 20000
+
+Grupo = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def distancias(xy: np.ndarray, inicio=None, fin=None) -> Tuple[np.ndarray, ...]:
+    """Distancias al cuadrado entre los puntos de un grupo y desde inicio y
+    hasta fin.
+
+    Args:
+        xy: array (n, 2) de coordenadas
+        inicio: punto de entrada al grupo (opcional)
+        fin: punto de salida del grupo (opcional)
+    Returns: Tupla (d, d_inicio, d_fin) con la matriz (n, n) y los vectores
+    de distancias a los extremos (ceros si no se dan, para que cualquier
+    punto pueda ser el primero o el último).
+    """
+    xy = np.asarray(xy, dtype=np.float64)
+    d = ((xy[:, None, :] - xy[None, :, :]) ** 2).sum(axis=2)
+    ceros = np.zeros(len(xy))
+    d_inicio = ((xy - inicio) ** 2).sum(axis=1) if inicio is not None else ceros
+    d_fin = ((xy - fin) ** 2).sum(axis=1) if fin is not None else ceros
+    return d, d_inicio, d_fin
+
+
+def coste(recorrido: Sequence[int], d, d_inicio, d_fin) -> float:
+    """Coste de un recorrido, incluyendo los extremos."""
+    recorrido = np.asarray(recorrido)
+    interior = d[recorrido[:-1], recorrido[1:]].sum()
+    return float(d_inicio[recorrido[0]] + interior + d_fin[recorrido[-1]])
+
+
+def held_karp(d: np.ndarray, d_inicio: np.ndarray, d_fin: np.ndarray) -> np.ndarray:
+    """Recorrido óptimo por programación dinámica de Held-Karp, para un
+    grupo o para un lote de grupos del mismo tamaño a la vez.
+
+    costes[S, j] es el menor coste de un camino que empieza en inicio,
+    visita exactamente los puntos del subconjunto S (como máscara de bits) y
+    acaba en j. Cada capa de subconjuntos de tamaño s se extiende a la vez
+    a los de tamaño s + 1; cada estado (S, k) se alcanza solo desde el
+    subconjunto S - {k}, así que basta con asignar.
+
+    Args:
+        d: matriz (n, n) de distancias, o array (B, n, n) para un lote
+        d_inicio: distancias desde inicio, (n,) o (B, n)
+        d_fin: distancias hasta fin, (n,) o (B, n)
+    Returns: Array con el orden óptimo de los n puntos, (n,) o (B, n).
+    """
+    if d.ndim == 2:
+        return held_karp(d[None], d_inicio[None], d_fin[None])[0]
+    lote, n = d.shape[0], d.shape[1]
+    if n <= 1:
+        return np.zeros((lote, n), dtype=np.int64)
+    grupos = np.arange(lote)
+    mascaras = np.arange(1 << n)
+    contiene = (mascaras[:, None] >> np.arange(n)) & 1 == 1
+    tamanos = contiene.sum(axis=1)
+    costes = np.full((lote, 1 << n, n), np.inf)
+    costes[:, 1 << np.arange(n), np.arange(n)] = d_inicio
+    for s in range(1, n):
+        capa = mascaras[tamanos == s]
+        # Extender cada camino de la capa con cada punto k que no contiene
+        extendidos = (costes[:, capa, :, None] + d[:, None, :, :]).min(axis=2)
+        filas, k = np.nonzero(~contiene[capa])
+        costes[:, capa[filas] | (1 << k), k] = extendidos[:, filas, k]
+    # Reconstrucción hacia atrás desde el mejor último punto
+    recorridos = np.empty((lote, n), dtype=np.int64)
+    mascara = np.full(lote, (1 << n) - 1)
+    ultimo = np.argmin(costes[:, -1] + d_fin, axis=1)
+    recorridos[:, -1] = ultimo
+    for i in range(n - 2, -1, -1):
+        mascara = mascara & ~(1 << ultimo)
+        candidatos = costes[grupos, mascara] + d[grupos, :, ultimo]
+        ultimo = np.argmin(candidatos, axis=1)
+        recorridos[:, i] = ultimo
+    return recorridos
+
+
+def vecino_mas_cercano(d: np.ndarray, d_inicio: np.ndarray) -> List[int]:
+    """Recorrido que empieza en el punto más cercano a inicio y sigue
+    siempre por el punto pendiente más cercano.
+    """
+    n = len(d)
+    recorrido = [int(np.argmin(d_inicio))]
+    pendientes = np.ones(n, dtype=bool)
+    pendientes[recorrido[0]] = False
+    for _ in range(n - 1):
+        siguiente = int(np.argmin(np.where(pendientes, d[recorrido[-1]], np.inf)))
+        recorrido.append(siguiente)
+        pendientes[siguiente] = False
+    return recorrido
+
+
+def dos_opt(
+    recorrido: Sequence[int], d: np.ndarray, d_inicio: np.ndarray, d_fin: np.ndarray
+) -> List[int]:
+    """Mejora un recorrido con 2-opt: invierte el tramo i..j si reduce el
+    coste, hasta que ninguna inversión lo reduce. Los extremos inicio y
+    fin se tratan como dos puntos fijos añadidos a la matriz, de modo que
+    también se pueden invertir los tramos que empiezan o acaban el
+    recorrido.
+
+    Si d no es simétrica, el coste de recorrer el tramo al revés también
+    entra en la mejora.
+
+    Args:
+        recorrido: orden inicial de los n puntos
+        d: matriz (n, n) de distancias
+        d_inicio: distancias desde inicio
+        d_fin: distancias hasta fin
+    Returns: Lista con el orden mejorado.
+    """
+    n = len(d)
+    ampliada = _ampliada(d, d_inicio, d_fin)
+    simetrica = np.array_equal(d, d.T)
+    camino = np.array([n, *recorrido, n + 1])
+    mejora = True
+    while mejora:
+        mejora = False
+        for i in range(1, n):
+            # Invertir camino[i..j] cambia las aristas (i-1, i) y (j, j+1)
+            # por (i-1, j) y (i, j+1)
+            j = np.arange(i + 1, n + 1)
+            antes, a = camino[i - 1], camino[i]
+            delta = (
+                ampliada[antes, camino[j]]
+                + ampliada[a, camino[j + 1]]
+                - ampliada[antes, a]
+                - ampliada[camino[j], camino[j + 1]]
+            )
+            if not simetrica:
+                # Coste acumulado del tramo i..j al revés menos al derecho
+                tramo = camino[i : n + 1]
+                ida = np.cumsum(ampliada[tramo[:-1], tramo[1:]])
+                vuelta = np.cumsum(ampliada[tramo[1:], tramo[:-1]])
+                delta += vuelta - ida
+            mejor = int(np.argmin(delta))
+            if delta[mejor] < -1e-9 * max(ampliada[antes, a], 1.0):
+                fin = j[mejor]
+                camino[i : fin + 1] = camino[i : fin + 1][::-1]
+                mejora = True
+    return camino[1:-1].tolist()
+
+
+def _ampliada(d: np.ndarray, d_inicio: np.ndarray, d_fin: np.ndarray) -> np.ndarray:
+    """Matriz de distancias ampliada con inicio (n) y fin (n + 1)."""
+    n = len(d)
+    ampliada = np.zeros((n + 2, n + 2))
+    ampliada[:n, :n] = d
+    ampliada[n, :n] = ampliada[:n, n] = d_inicio
+    ampliada[n + 1, :n] = ampliada[:n, n + 1] = d_fin
+    return ampliada
+
+
+def or_opt(
+    recorrido: Sequence[int],
+    d: np.ndarray,
+    d_inicio: np.ndarray,
+    d_fin: np.ndarray,
+    max_tramo: int = MAX_TRAMO_OR_OPT,
+) -> List[int]:
+    """Mejora un recorrido con Or-opt: saca un tramo de hasta max_tramo
+    puntos consecutivos y lo inserta, sin invertirlo, en la posición donde
+    más reduce el coste, hasta que ningún movimiento lo reduce. Como no
+    invierte tramos, sirve igual para matrices no simétricas.
+
+    Args:
+        recorrido: orden inicial de los n puntos
+        d: matriz (n, n) de distancias
+        d_inicio: distancias desde inicio
+        d_fin: distancias hasta fin
+        max_tramo: longitud máxima de los tramos que se mueven
+    Returns: Lista con el orden mejorado.
+    """
+    n = len(d)
+    ampliada = _ampliada(d, d_inicio, d_fin)
+    camino = [n, *recorrido, n + 1]
+    mejora = True
+    while mejora:
+        mejora = False
+        for longitud in range(1, min(max_tramo, n - 1) + 1):
+            for i in range(1, n - longitud + 2):
+                a, b = camino[i], camino[i + longitud - 1]
+                antes, despues = camino[i - 1], camino[i + longitud]
+                ahorro = (
+                    ampliada[antes, a] + ampliada[b, despues] - ampliada[antes, despues]
+                )
+                # Insertar el tramo entre resto[p] y resto[p + 1]
+                resto = np.array(camino[:i] + camino[i + longitud :])
+                coste_insertar = (
+                    ampliada[resto[:-1], a]
+                    + ampliada[b, resto[1:]]
+                    - ampliada[resto[:-1], resto[1:]]
+                )
+                p = int(np.argmin(coste_insertar))
+                if coste_insertar[p] - ahorro < -1e-9 * max(ahorro, 1.0):
+                    tramo = camino[i : i + longitud]
+                    resto = resto.tolist()
+                    camino = resto[: p + 1] + tramo + resto[p + 1 :]
+                    mejora = True
+    return camino[1:-1]
+
+
+def recorrido_optimo(
+    d: np.ndarray, d_inicio: np.ndarray, d_fin: np.ndarray
+) -> List[int]:
+    """Orden de visita de n puntos dada su matriz de distancias, que puede
+    no ser simétrica: óptimo con Held-Karp hasta MAX_HELD_KARP puntos y, si
+    hay más, vecino más cercano mejorado alternando 2-opt y Or-opt hasta
+    que ninguno de los dos mejora.
+
+    Args:
+        d: matriz (n, n) de distancias
+        d_inicio: distancias desde inicio (ceros si no hay)
+        d_fin: distancias hasta fin (ceros si no hay)
+    Returns: Lista con el orden de los puntos.
+    """
+    n = len(d)
+    if n <= 1:
+        return list(range(n))
+    if n <= MAX_HELD_KARP:
+        return held_karp(d, d_inicio, d_fin).tolist()
+    recorrido = vecino_mas_cercano(d, d_inicio)
+    while True:
+        mejorado = or_opt(dos_opt(recorrido, d, d_inicio, d_fin), d, d_inicio, d_fin)
+        if coste(mejorado, d, d_inicio, d_fin) >= coste(recorrido, d, d_inicio, d_fin):
+            return recorrido
+        recorrido = mejorado
+
+
+def ordenar_grupo(xy: np.ndarray, inicio=None, fin=None) -> List[int]:
+    """Orden en el que recorrer un grupo de puntos entrando desde inicio y
+    saliendo hacia fin.
+
+    Args:
+        xy: array (n, 2) con las coordenadas del grupo
+        inicio: punto desde el que se llega al grupo (opcional)
+        fin: punto al que se sale del grupo (opcional)
+    Returns: Lista con las posiciones de xy en el orden del recorrido.
+    """
+    n = len(xy)
+    if n <= 1:
+        return list(range(n))
+    d, d_inicio, d_fin = distancias(xy, inicio, fin)
+    if n <= MAX_HELD_KARP:
+        return held_karp(d, d_inicio, d_fin).tolist()
+    return dos_opt(vecino_mas_cercano(d, d_inicio), d, d_inicio, d_fin)
+
+
+def _ordenar_lote(grupos: List[Grupo]) -> List[List[int]]:
+    """Ordena una lista de grupos (xy, inicio, fin) en un proceso. Los
+    grupos pequeños del mismo tamaño se resuelven juntos con held_karp.
+    """
+    resultado: List[List[int]] = [None] * len(grupos)
+    por_tamano: Dict[int, List[int]] = {}
+    for g, (xy, inicio, fin) in enumerate(grupos):
+        if 1 < len(xy) <= MAX_HELD_KARP:
+            por_tamano.setdefault(len(xy), []).append(g)
+        else:
+            resultado[g] = ordenar_grupo(xy, inicio, fin)
+    for n, indices in por_tamano.items():
+        # Limitar la memoria de la tabla (B, 2^n, n) de cada llamada
+        paso = max(1, (1 << 20) // ((1 << n) * n))
+        for a in range(0, len(indices), paso):
+            tablas = [distancias(*grupos[g]) for g in indices[a : a + paso]]
+            recorridos = held_karp(*(np.stack(t) for t in zip(*tablas)))
+            for g, recorrido in zip(indices[a : a + paso], recorridos.tolist()):
+                resultado[g] = recorrido
+    return resultado
+
+
+def ordenar_grupos(grupos: List[Grupo], procesos: int = None) -> List[List[int]]:
+    """Ordena muchos grupos independientes, repartiéndolos entre procesos
+    si el trabajo es suficientemente grande. Los grupos se asignan a los
+    lotes en orden decreciente de tamaño para equilibrar la carga.
+
+    Args:
+        grupos: lista de tuplas (xy, inicio, fin) como en ordenar_grupo
+        procesos: número de procesos (por defecto, os.cpu_count(); 1 para
+        no usar procesos)
+    Returns: Lista con el orden de cada grupo.
+    """
+    procesos = procesos or os.cpu_count() or 1
+    puntos = sum(len(xy) for xy, _, _ in grupos)
+    if procesos == 1 or puntos < MIN_PARALELO:
+        return _ordenar_lote(grupos)
+    por_tamano = sorted(range(len(grupos)), key=lambda g: -len(grupos[g][0]))
+    n_lotes = 4 * procesos
+    lotes = [por_tamano[i::n_lotes] for i in range(n_lotes)]
+    resultado: List[List[int]] = [None] * len(grupos)
+    with ProcessPoolExecutor(procesos) as pool:
+        ordenados = pool.map(
+            _ordenar_lote, [[grupos[g] for g in lote] for lote in lotes]
+        )
+        for lote, ordenes in zip(lotes, ordenados):
+            for g, orden in zip(lote, ordenes):
+                resultado[g] = orden
+    return resultado
@@ -0,0 +1,268 @@
+"""
+paralelo.py
+
+Consultas en paralelo sobre un GrafoCompacto con un pool de procesos que
+comparten el grafo sin copiarlo: matrices de distancias
+(GrafoCompacto.matriz_distancias) y rutas en lote (rutas_batch).
+
+Los arrays CSR (offsets, destinos, pesos) se copian una sola vez a bloques
+de multiprocessing.shared_memory. Cada proceso del pool los proyecta al
+arrancar y construye sobre ellos un GrafoCompacto de solo ids, de modo que
+ninguna tarea lleva el grafo serializado: las tareas solo llevan ids. Las
+filas de la matriz de distancias se escriben directamente en matrices de
+salida también compartidas; las rutas vuelven como listas de ids.
+servicio.py mantiene abierto un pool así y le envía las mismas tareas.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from grafo_compacto import GrafoCompacto
+
+# Número de tareas por proceso, para repartir bien la carga
+TAREAS_POR_PROCESO = 4
+# Pares (origen, destino) por tarea en rutas_batch
+PARES_POR_TAREA = 32
+
+# Estado de cada proceso del pool (ver _iniciar)
+_grafo: GrafoCompacto = None
+_arrays: Dict[str, np.ndarray] = {}
+_bloques: List[shared_memory.SharedMemory] = []
+
+
+class MemoriaCompartida:
+    # Conjunto de arrays copiados a memoria compartida
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        """Copia los arrays a bloques de memoria compartida nuevos.
+        Se usa como gestor de contexto para liberar los bloques al final.
+
+        Args: arrays diccionario nombre -> array
+        Returns: MemoriaCompartida con los bloques creados.
+        """
+        self.bloques: List[shared_memory.SharedMemory] = []
+        self.descripcion: Dict[str, Tuple[str, str, tuple]] = {}
+        self.arrays: Dict[str, np.ndarray] = {}
+        for nombre, a in arrays.items():
+            a = np.ascontiguousarray(a)
+            bloque = shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1))
+            self.bloques.append(bloque)
+            copia = np.ndarray(a.shape, a.dtype, buffer=bloque.buf)
+            copia[...] = a
+            self.arrays[nombre] = copia
+            self.descripcion[nombre] = (bloque.name, a.dtype.str, a.shape)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cerrar()
+
+    def cerrar(self) -> None:
+        """Libera los bloques de memoria compartida."""
+        self.arrays.clear()
+        for bloque in self.bloques:
+            bloque.close()
+            bloque.unlink()
+        self.bloques.clear()
+
+
+def proyectar(descripcion: Dict[str, Tuple[str, str, tuple]]):
+    """Proyecta en este proceso los arrays de una MemoriaCompartida.
+
+    Args: descripcion atributo descripcion de la MemoriaCompartida
+    Returns: Tupla (arrays, bloques); los bloques deben seguir abiertos
+    mientras se usan los arrays.
+    """
+    arrays, bloques = {}, []
+    for nombre, (nombre_bloque, dtype, shape) in descripcion.items():
+        bloque = shared_memory.SharedMemory(name=nombre_bloque)
+        bloques.append(bloque)
+        arrays[nombre] = np.ndarray(shape, np.dtype(dtype), buffer=bloque.buf)
+    return arrays, bloques
+
+
+def _arrays_grafo(grafo: GrafoCompacto) -> Dict[str, np.ndarray]:
+    """Arrays que necesita un proceso para reconstruir el grafo: el CSR y,
+    si los hay, las coordenadas y las tablas de landmarks (si no están
+    obsoletas).
+    """
+    arrays = {
+        "offsets": grafo.offsets,
+        "destinos": grafo.destinos,
+        "pesos": grafo.pesos,
+    }
+    if grafo.coords is not None:
+        arrays["coords"] = np.asarray(grafo.coords, dtype=np.float64)
+    if grafo.landmarks is not None and not grafo.landmarks.obsoletos:
+        arrays["landmarks"] = grafo.landmarks.landmarks
+        arrays["landmarks_desde"] = grafo.landmarks.desde
+        arrays["landmarks_hasta"] = grafo.landmarks.hasta
+    return arrays
+
+
+def _iniciar(descripcion: dict, dirigido: bool) -> None:
+    """Inicializador de cada proceso del pool: proyecta el grafo (con sus
+    coordenadas y landmarks, si los hay) y las matrices de salida.
+    """
+    global _grafo, _arrays, _bloques
+    _arrays, _bloques = proyectar(descripcion)
+    n = len(_arrays["offsets"]) - 1
+    _grafo = GrafoCompacto(
+        _arrays.get("coords", range(n)),
+        _arrays["offsets"],
+        _arrays["destinos"],
+        _arrays["pesos"],
+        dirigido=dirigido,
+    )
+    if "landmarks" in _arrays:
+        from landmarks import Landmarks
+
+        _grafo.landmarks = Landmarks(
+            _grafo,
+            _arrays["landmarks"],
+            _arrays["landmarks_desde"],
+            _arrays["landmarks_hasta"],
+        )
+
+
+def _calcular_filas(inicio: int, fin: int) -> None:
+    """Tarea del pool: calcula las filas inicio:fin de la matriz."""
+    padres = _arrays.get("padres")
+    _grafo._filas_distancias(
+        _arrays["origenes"][inicio:fin].tolist(),
+        _arrays["columnas"].tolist(),
+        _arrays["costes"][inicio:fin],
+        padres[inicio:fin] if padres is not None else None,
+    )
+
+
+def _rutas(grafo: GrafoCompacto, pares: List[Tuple[int, int, int]], *args):
+    """Calcula las rutas de una lista de pares (indice, o, t) sobre ids.
+    args son el algoritmo y la velocidad máxima de _camino_ids.
+    """
+    return [(i, *grafo._camino_ids(o, t, *args)) for i, o, t in pares]
+
+
+def _calcular_rutas(pares: List[Tuple[int, int, int]], *args):
+    """Tarea del pool: rutas de una lista de pares en el grafo compartido."""
+    return _rutas(_grafo, pares, *args)
+
+
+def _calcular_matriz(origenes: List[int], destinos: List[int]) -> np.ndarray:
+    """Tarea del pool: matriz de costes de unos orígenes a unos destinos
+    (ids), devuelta al proceso principal en vez de en memoria compartida.
+    """
+    costes = np.empty((len(origenes), len(destinos)))
+    _grafo._filas_distancias(origenes, destinos, costes)
+    return costes
+
+
+def matriz_distancias_paralela(
+    grafo: GrafoCompacto,
+    origenes: List[int],
+    destinos: List[int],
+    predecesores: bool = False,
+    procesos: int = 2,
+):
+    """Versión en paralelo de GrafoCompacto.matriz_distancias sobre ids.
+
+    Args:
+        grafo: GrafoCompacto
+        origenes: ids de origen (filas)
+        destinos: ids de destino (columnas)
+        predecesores: si es True, devuelve también los padres
+        procesos: número de procesos del pool
+    Returns: Lo mismo que GrafoCompacto.matriz_distancias.
+    """
+    arrays = {
+        **_arrays_grafo(grafo),
+        "origenes": np.asarray(origenes, dtype=np.int64),
+        "columnas": np.asarray(destinos, dtype=np.int64),
+        "costes": np.empty((len(origenes), len(destinos))),
+    }
+    if predecesores:
+        arrays["padres"] = np.empty((len(origenes), len(grafo)), dtype=np.int32)
+    n_tareas = min(len(origenes), procesos * TAREAS_POR_PROCESO)
+    cortes = np.linspace(0, len(origenes), n_tareas + 1).astype(int).tolist()
+    with MemoriaCompartida(arrays) as memoria:
+        with ProcessPoolExecutor(
+            procesos,
+            initializer=_iniciar,
+            initargs=(memoria.descripcion, grafo.es_dirigido()),
+        ) as pool:
+            list(pool.map(_calcular_filas, cortes[:-1], cortes[1:]))
+        costes = memoria.arrays["costes"].copy()
+        padres = memoria.arrays["padres"].copy() if predecesores else None
+    return (costes, padres) if predecesores else costes
+
+
+def rutas_batch(
+    grafo: GrafoCompacto,
+    pares: List[Tuple[object, object]],
+    workers: int = None,
+    algoritmo: str = "dijkstra",
+    velocidad_max: float = None,
+) -> Iterator[dict]:
+    """Calcula el camino mínimo de muchos pares (origen, destino)
+    repartiéndolos entre un pool de procesos que comparten el grafo.
+    Los resultados se devuelven según se completan, no en el orden de
+    pares; cada uno lleva la posición del par en la lista.
+
+    Args:
+        grafo: GrafoCompacto
+        pares: lista de pares (origen, destino) de vértices del grafo
+        workers: número de procesos (por defecto, os.cpu_count(); con 1 se
+        calculan en este proceso)
+        algoritmo: algoritmo de camino_minimo
+        velocidad_max: velocidad para la heurística de A* (opcional)
+    Returns: Generador de diccionarios con las claves "indice", "origen",
+    "destino", "camino" (lista de vértices o None), "coste" (None si no hay
+    camino) y "asentados".
+    """
+    pares = list(pares)
+    origenes = grafo._ids_de([s for s, _ in pares])
+    destinos = grafo._ids_de([t for _, t in pares])
+    ternas = list(zip(range(len(pares)), origenes, destinos))
+    tareas = [
+        ternas[a : a + PARES_POR_TAREA] for a in range(0, len(ternas), PARES_POR_TAREA)
+    ]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for tarea in tareas:
+            for resultado in _rutas(grafo, tarea, algoritmo, velocidad_max):
+                yield _resultado_ruta(grafo, pares, *resultado)
+        return
+    with MemoriaCompartida(_arrays_grafo(grafo)) as memoria:
+        pool = ProcessPoolExecutor(
+            workers,
+            initializer=_iniciar,
+            initargs=(memoria.descripcion, grafo.es_dirigido()),
+        )
+        try:
+            futuros = [
+                pool.submit(_calcular_rutas, tarea, algoritmo, velocidad_max)
+                for tarea in tareas
+            ]
+            for futuro in as_completed(futuros):
+                for resultado in futuro.result():
+                    yield _resultado_ruta(grafo, pares, *resultado)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _resultado_ruta(grafo, pares, indice, camino, coste, asentados) -> dict:
+    """Diccionario de resultado de rutas_batch a partir del de la tarea."""
+    vertices = grafo.vertices
+    return {
+        "indice": indice,
+        "origen": pares[indice][0],
+        "destino": pares[indice][1],
+        "camino": [vertices[v] for v in camino] if camino is not None else None,
+        "coste": coste,
+        "asentados": asentados,
+    }
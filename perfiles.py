@@ -0,0 +1,188 @@
+"""
+perfiles.py
+
+Perfiles de velocidad por franja horaria para las consultas dependientes
+del tiempo de GrafoCompacto.camino_minimo(..., salida=datetime).
+
+El día se divide en FRANJAS franjas de un cuarto de hora. Un perfil es un
+vector de FRANJAS factores de velocidad respecto a la de los pesos del
+grafo: con factor 0.5 la arista se recorre a la mitad de velocidad. Los
+perfiles distintos se guardan una sola vez en un array (P, FRANJAS) de
+float32 y cada arista guarda solo el índice de su perfil, de modo que la
+memoria es la de un entero por arista más la de los perfiles distintos.
+
+El tiempo de recorrido sigue el modelo de Ichoua, Gendreau y Potvin: la
+velocidad cambia al cambiar de franja aunque se esté a mitad de la
+arista. Así la llegada es una función creciente de la salida (propiedad
+FIFO: salir más tarde nunca hace llegar antes) y Dijkstra sobre los
+instantes de llegada da el camino más rápido.
+
+Uso:
+    python perfiles.py grafos/plano_de_madrid.grf perfiles.csv
+lee los perfiles por vía del CSV (id_via y FRANJAS columnas de factores)
+y los guarda junto al grafo (.grf.perfiles).
+"""
+
+import sys
+from typing import Dict
+
+import numpy as np
+
+import persistencia
+
+# Franjas de un cuarto de hora
+FRANJAS = 96
+DURACION_FRANJA = 24 * 3600 / FRANJAS
+
+
+class PerfilesVelocidad:
+    # Perfiles de velocidad compartidos y el perfil de cada arista
+
+    def __init__(self, grafo, factores: np.ndarray, perfil: np.ndarray):
+        """Crea los perfiles de un grafo a partir de sus arrays. Normalmente
+        se obtienen con desde_vias, leer_csv o cargar.
+
+        Args:
+            grafo: GrafoCompacto al que se aplican
+            factores: array (P, FRANJAS) de factores de velocidad (> 0)
+            perfil: índice del perfil de cada arista, en el orden de
+            grafo.destinos
+        Returns: PerfilesVelocidad listos para las consultas.
+        """
+        factores = np.ascontiguousarray(factores, dtype=np.float32)
+        perfil = np.ascontiguousarray(perfil, dtype=np.int32)
+        if factores.ndim != 2 or factores.shape[1] != FRANJAS:
+            raise ValueError(f"Los perfiles deben tener {FRANJAS} franjas")
+        if not (factores > 0).all():
+            raise ValueError("Los factores de velocidad deben ser positivos")
+        if len(perfil) != len(grafo.destinos):
+            raise ValueError("Tiene que haber un perfil por arista")
+        self.grafo = grafo
+        self.factores = factores
+        self.perfil = perfil
+        self.factor_maximo = float(factores.max())
+        # Listas de Python para los bucles de búsqueda
+        self._filas = factores.tolist()
+        self._perfil = perfil.tolist()
+
+    @classmethod
+    def desde_vias(cls, grafo, perfiles: Dict[object, np.ndarray]):
+        """Asigna a cada arista el perfil de su vía (su dato, el id_via en
+        los grafos de construccion.py). Las aristas de vías sin perfil
+        usan el perfil constante 1 (la velocidad de los pesos). Los
+        perfiles repetidos se guardan una sola vez.
+
+        Args:
+            grafo: GrafoCompacto con datos de aristas
+            perfiles: diccionario id_via -> vector de FRANJAS factores
+        Returns: PerfilesVelocidad del grafo.
+        """
+        vias = list(perfiles)
+        tabla = np.ones((len(vias) + 1, FRANJAS), dtype=np.float32)
+        if vias:
+            tabla[1:] = np.array([perfiles[v] for v in vias], dtype=np.float32)
+        factores, indices = np.unique(tabla, axis=0, return_inverse=True)
+        indices = indices.ravel()
+        perfil = np.full(len(grafo.destinos), indices[0], dtype=np.int32)
+        aristas_via = grafo._aristas_via
+        for i, via in enumerate(vias, 1):
+            if via in aristas_via:
+                perfil[aristas_via[via]] = indices[i]
+        return cls(grafo, factores, perfil)
+
+    @classmethod
+    def leer_csv(cls, grafo, path: str) -> "PerfilesVelocidad":
+        """Lee perfiles por vía de un CSV con una columna id_via y FRANJAS
+        columnas de factores, de la franja 00:00 a la 23:45.
+
+        Args:
+            grafo: GrafoCompacto con datos de aristas
+            path: ruta del CSV
+        Returns: PerfilesVelocidad del grafo (ver desde_vias).
+        """
+        tabla = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+        if tabla.shape[1] != FRANJAS + 1:
+            raise ValueError(f"{path} debe tener id_via y {FRANJAS} franjas")
+        vias = tabla[:, 0].astype(np.int64).tolist()
+        return cls.desde_vias(grafo, dict(zip(vias, tabla[:, 1:])))
+
+    def guardar(self, path: str) -> None:
+        """Guarda los perfiles en el formato binario de persistencia.py.
+        Por convenio se guardan junto al grafo, como <grafo>.grf.perfiles.
+
+        Args: path ruta del fichero de salida
+        Returns: None
+        """
+        arrays = {"factores": self.factores, "perfil": self.perfil}
+        meta = {"vertices": len(self.grafo), "aristas": self.grafo.num_aristas()}
+        persistencia.guardar_arrays(path, "perfiles", arrays, meta)
+
+    @classmethod
+    def cargar(cls, path: str, grafo) -> "PerfilesVelocidad":
+        """Carga perfiles guardados con guardar.
+
+        Args:
+            path: ruta del fichero
+            grafo: GrafoCompacto al que se aplican
+        Returns: PerfilesVelocidad listos para usar.
+        """
+        tipo, meta, arrays = persistencia.cargar_arrays(path, mmap=False)
+        if tipo != "perfiles":
+            raise ValueError(f"{path} contiene un {tipo}, no perfiles")
+        if (meta["vertices"], meta["aristas"]) != (len(grafo), grafo.num_aristas()):
+            raise ValueError(f"{path} no corresponde a este grafo")
+        return cls(grafo, arrays["factores"], arrays["perfil"])
+
+    def estadisticas(self) -> dict:
+        """Resumen de los perfiles.
+
+        Args: None
+        Returns: Diccionario con el número de perfiles distintos, de
+        aristas y la memoria de los arrays en bytes.
+        """
+        return {
+            "perfiles": len(self.factores),
+            "aristas": len(self.perfil),
+            "bytes": self.factores.nbytes + self.perfil.nbytes,
+        }
+
+    def llegada(self, k: int, peso: float, t: float) -> float:
+        """Instante de llegada al recorrer la arista k saliendo en t.
+
+        Args:
+            k: posición de la arista
+            peso: peso de la arista (tiempo a la velocidad de los pesos)
+            t: instante de salida en segundos desde las 00:00 del día de
+            salida (puede pasar de un día)
+        Returns: Instante de llegada en las mismas unidades.
+        """
+        return _llegada(self._filas[self._perfil[k]], peso, t)
+
+
+def _llegada(fila, peso: float, t: float) -> float:
+    """Llegada por una arista de peso dado con los factores fila, saliendo
+    en t: se recorre cada franja a su velocidad hasta completar el peso.
+    """
+    if peso == np.inf:
+        return peso
+    franja = int(t // DURACION_FRANJA)
+    fin = (franja + 1) * DURACION_FRANJA
+    while True:
+        factor = fila[franja % FRANJAS]
+        llegada = t + peso / factor
+        if llegada <= fin:
+            return llegada
+        peso -= factor * (fin - t)
+        t, fin, franja = fin, fin + DURACION_FRANJA, franja + 1
+
+
+if __name__ == "__main__":
+    from grafo_compacto import GrafoCompacto
+
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+    madrid = GrafoCompacto.cargar(sys.argv[1])
+    perfiles = PerfilesVelocidad.leer_csv(madrid, sys.argv[2])
+    perfiles.guardar(sys.argv[1] + ".perfiles")
+    print(perfiles.estadisticas())
@@ -0,0 +1,191 @@
+"""
+persistencia.py
+
+Formato binario versionado para guardar grafos (y otras estructuras
+derivadas) como arrays de NumPy. Sustituye a la escritura con str() y
+lectura con eval() de los ficheros .txt originales.
+
+Estructura del fichero:
+    - 8 bytes mágicos b"GRAFOBIN"
+    - versión del formato (uint32, little endian)
+    - longitud de la cabecera (uint32, little endian)
+    - cabecera JSON con el tipo, metadatos y la descripción de cada array
+    - los arrays, alineados a 64 bytes, en orden C
+
+Al estar los arrays sin comprimir y alineados, se pueden abrir con
+np.memmap sin leer el fichero entero.
+
+Uso como conversor de los ficheros de texto antiguos:
+    python persistencia.py grafos/plano_de_madrid_tsp2.txt [salida.grf]
+"""
+
+import ast
+import json
+import struct
+import sys
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+MAGIC = b"GRAFOBIN"
+VERSION = 1
+ALINEACION = 64
+
+
+def es_binario(path: str) -> bool:
+    """Indica si el fichero está en el formato binario de este módulo.
+
+    Args: path ruta del fichero
+    Returns: True si empieza por los bytes mágicos, False si no.
+    """
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def guardar_arrays(
+    path: str, tipo: str, arrays: Dict[str, np.ndarray], meta: dict = None
+) -> None:
+    """Guarda un conjunto de arrays con sus metadatos en formato binario.
+
+    Args:
+        path: ruta del fichero de salida
+        tipo: nombre del tipo de estructura guardada (p.ej. "grafo")
+        arrays: diccionario nombre -> array de NumPy (sin dtype object)
+        meta: metadatos serializables en JSON
+    Returns: None
+    """
+    arrays = {k: np.ascontiguousarray(a) for k, a in arrays.items()}
+    descripcion = {}
+    offset = 0
+    for nombre, a in arrays.items():
+        if a.dtype.hasobject:
+            raise TypeError(f"El array {nombre} no puede ser de tipo object")
+        offset = -(-offset // ALINEACION) * ALINEACION
+        descripcion[nombre] = {
+            "dtype": a.dtype.str,
+            "shape": list(a.shape),
+            "offset": offset,
+        }
+        offset += a.nbytes
+    cabecera = json.dumps(
+        {"tipo": tipo, "meta": meta or {}, "arrays": descripcion}
+    ).encode("utf-8")
+    inicio = len(MAGIC) + 8 + len(cabecera)
+    inicio = -(-inicio // ALINEACION) * ALINEACION
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<II", VERSION, len(cabecera)))
+        f.write(cabecera)
+        for nombre, a in arrays.items():
+            f.seek(inicio + descripcion[nombre]["offset"])
+            f.write(a.tobytes())
+
+
+def cargar_arrays(
+    path: str, mmap: bool = True
+) -> Tuple[str, dict, Dict[str, np.ndarray]]:
+    """Carga un fichero guardado con guardar_arrays.
+
+    Args:
+        path: ruta del fichero
+        mmap: si es True, los arrays se proyectan en memoria en modo lectura
+        en lugar de leerse completos
+    Returns: Tupla (tipo, meta, arrays).
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} no es un fichero binario de grafo")
+        version, n = struct.unpack("<II", f.read(8))
+        if version > VERSION:
+            raise ValueError(f"Versión de formato {version} no soportada")
+        cabecera = json.loads(f.read(n).decode("utf-8"))
+        inicio = -(-(len(MAGIC) + 8 + n) // ALINEACION) * ALINEACION
+        arrays = {}
+        for nombre, d in cabecera["arrays"].items():
+            dtype, shape = np.dtype(d["dtype"]), tuple(d["shape"])
+            if mmap and int(np.prod(shape)) > 0:
+                arrays[nombre] = np.memmap(
+                    path, dtype, "r", inicio + d["offset"], shape
+                )
+            else:
+                f.seek(inicio + d["offset"])
+                cuenta = int(np.prod(shape))
+                arrays[nombre] = np.fromfile(f, dtype, cuenta).reshape(shape)
+    return cabecera["tipo"], cabecera["meta"], arrays
+
+
+def empaquetar_textos(textos: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Empaqueta una lista de strings en un buffer UTF-8 y sus offsets.
+
+    Args: textos lista de strings
+    Returns: Tupla (buffer uint8, offsets int64 de longitud len(textos)+1).
+    """
+    codificados = [t.encode("utf-8") for t in textos]
+    offsets = np.zeros(len(codificados) + 1, dtype=np.int64)
+    np.cumsum([len(c) for c in codificados], out=offsets[1:])
+    return np.frombuffer(b"".join(codificados), dtype=np.uint8), offsets
+
+
+class TextosEmpaquetados:
+    # Secuencia de solo lectura sobre un buffer de empaquetar_textos
+
+    def __init__(self, buffer: np.ndarray, offsets: np.ndarray, decodificar=None):
+        """Crea una vista indexable sobre textos empaquetados. Cada elemento
+        se decodifica solo cuando se accede a él.
+
+        Args:
+            buffer: buffer uint8 con los textos concatenados
+            offsets: offsets de inicio de cada texto
+            decodificar: función aplicada a cada string al leerlo
+        Returns: Secuencia de longitud len(offsets) - 1.
+        """
+        self.buffer = buffer
+        self.offsets = offsets
+        self.decodificar = decodificar
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int):
+        a, b = self.offsets[i], self.offsets[i + 1]
+        texto = self.buffer[a:b].tobytes().decode("utf-8")
+        return self.decodificar(texto) if self.decodificar else texto
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+def leer_grafo_txt(path: str) -> dict:
+    """Lee un grafo guardado en el formato de texto antiguo (str de un dict)
+    con ast.literal_eval, que solo admite literales y no ejecuta código.
+
+    Args: path ruta del fichero .txt
+    Returns: Diccionario con las claves "adj", "aristas" y "dirigido".
+    """
+    with open(path, "r", encoding="latin-1") as f:
+        return ast.literal_eval(f.read())
+
+
+def convertir_txt(path_txt: str, path_bin: str = None) -> str:
+    """Convierte un grafo del formato de texto antiguo al formato binario.
+
+    Args:
+        path_txt: ruta del fichero .txt
+        path_bin: ruta de salida (por defecto, la misma con extensión .grf)
+    Returns: Ruta del fichero binario escrito.
+    """
+    from grafo import Grafo
+
+    if path_bin is None:
+        path_bin = path_txt.rsplit(".", 1)[0] + ".grf"
+    g = Grafo()
+    g.load_graph(path_txt)
+    g.save_graph(path_bin)
+    return path_bin
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print(__doc__)
+        sys.exit(1)
+    print(convertir_txt(*sys.argv[1:]))
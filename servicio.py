@@ -0,0 +1,410 @@
+"""
+servicio.py
+
+Servicio HTTP/JSON local de rutas sobre el plano de Madrid. Carga una
+sola vez el grafo, el índice espacial y el geocodificador y atiende
+peticiones concurrentes con asyncio, sin dependencias fuera de la
+biblioteca estándar:
+    - GET /route?origen=...&destino=...&algoritmo=dijkstra
+      origen y destino son una dirección (se geocodifica) o "x,y" en cm,
+      y se ajustan al vértice más cercano; algoritmo=alt necesita los
+      landmarks del grafo (<grafo>.grf.alt). Devuelve el camino como lista
+      de coordenadas [[x, y], ...], el coste en segundos y los vértices
+      asentados. Con &formato=png devuelve una imagen con solo las aristas
+      del camino.
+    - GET /geocode?q=...&k=5
+      las k direcciones más parecidas, con su id_via y coordenadas
+    - POST /matrix con {"origenes": [...], "destinos": [...]}
+      matriz de costes (null si no hay camino); los puntos son como en
+      /route
+Las consultas GET también se pueden enviar por POST con los parámetros
+en un objeto JSON.
+
+Las búsquedas (rutas y matrices) se hacen en un pool de procesos que
+comparten el grafo en memoria compartida (ver paralelo.py); el
+geocodificador y el ajuste de puntos, en hilos. Así el bucle de asyncio
+nunca se bloquea con una búsqueda larga.
+
+Uso:
+    python servicio.py grafos/plano_de_madrid.grf [puerto] [procesos]
+"""
+
+import asyncio
+import io
+import json
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from typing import List, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+import pandas as pd
+
+import paralelo
+from geocodificador import Geocodificador
+from grafo_compacto import GrafoCompacto
+from indice_espacial import IndiceEspacial
+from landmarks import Landmarks
+
+PUERTO = 8080
+# Tamaño máximo del cuerpo de una petición (bytes)
+MAX_CUERPO = 2**20
+# Puntos máximos por lado de una matriz
+MAX_MATRIZ = 500
+ALGORITMOS = ("dijkstra", "astar", "bidireccional", "alt")
+
+
+class ErrorPeticion(ValueError):
+    # Petición incorrecta: se responde con su estado HTTP y el mensaje
+
+    def __init__(self, mensaje: str, estado: HTTPStatus = HTTPStatus.BAD_REQUEST):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+class Servicio:
+    # Grafo, índices y pool de procesos compartidos por todas las peticiones
+
+    def __init__(
+        self,
+        grafo: GrafoCompacto,
+        indice: IndiceEspacial,
+        geocodificador: Geocodificador = None,
+        procesos: int = None,
+    ):
+        """Crea el servicio y arranca el pool de procesos, que proyectan el
+        grafo de memoria compartida. Normalmente se obtiene con cargar.
+
+        Args:
+            grafo: GrafoCompacto con vértices (x, y)
+            indice: IndiceEspacial del grafo
+            geocodificador: Geocodificador (opcional; sin él solo se
+            aceptan coordenadas)
+            procesos: procesos del pool (por defecto, os.cpu_count(); con 1
+            las búsquedas se hacen en hilos de este proceso)
+        Returns: Servicio listo para atender peticiones.
+        """
+        self.grafo = grafo
+        self.indice = indice
+        self.geocodificador = geocodificador
+        self.procesos = procesos or os.cpu_count() or 1
+        self.memoria = None
+        self.pool = None
+        if self.procesos > 1:
+            self.memoria = paralelo.MemoriaCompartida(paralelo._arrays_grafo(grafo))
+            self.pool = ProcessPoolExecutor(
+                self.procesos,
+                initializer=paralelo._iniciar,
+                initargs=(self.memoria.descripcion, grafo.es_dirigido()),
+            )
+
+    @classmethod
+    def cargar(
+        cls,
+        path: str,
+        cruces_csv: str = "data/cruces_clean.csv",
+        direcciones: str = "data/direcciones.geo",
+        procesos: int = None,
+    ) -> "Servicio":
+        """Carga el grafo y sus landmarks (<grafo>.grf.alt, ver landmarks.py)
+        si existen, construye el índice espacial con los cruces y carga el
+        geocodificador si existe el fichero.
+
+        Args:
+            path: ruta del grafo (.grf)
+            cruces_csv: CSV de cruces para asociar vértices a vías
+            direcciones: geocodificador guardado con Geocodificador.guardar
+            procesos: procesos del pool
+        Returns: Servicio listo para atender peticiones.
+        """
+        grafo = GrafoCompacto.cargar(path)
+        if os.path.exists(path + ".alt"):
+            # Antes de crear el pool, para que los procesos los reciban
+            grafo.landmarks = Landmarks.cargar(path + ".alt", grafo)
+        indice = IndiceEspacial.desde_grafo(grafo, pd.read_csv(cruces_csv))
+        geocodificador = None
+        if os.path.exists(direcciones):
+            geocodificador = Geocodificador.cargar(direcciones)
+        return cls(grafo, indice, geocodificador, procesos)
+
+    def cerrar(self) -> None:
+        """Detiene el pool y libera la memoria compartida."""
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.memoria.cerrar()
+            self.pool = self.memoria = None
+
+    #### Consultas ####
+    def _buscar(self, funcion, *args):
+        """Ejecuta una búsqueda en el pool (o en un hilo si no hay pool)."""
+        loop = asyncio.get_running_loop()
+        if self.pool is None:
+            funcion = {
+                paralelo._calcular_rutas: lambda *a: paralelo._rutas(self.grafo, *a),
+                paralelo._calcular_matriz: self._matriz_local,
+            }[funcion]
+        return loop.run_in_executor(self.pool, funcion, *args)
+
+    def _matriz_local(self, origenes: List[int], destinos: List[int]) -> np.ndarray:
+        """_calcular_matriz sobre el grafo de este proceso."""
+        costes = np.empty((len(origenes), len(destinos)))
+        self.grafo._filas_distancias(origenes, destinos, costes)
+        return costes
+
+    def geocode(self, texto: str, k: int = 5) -> List[dict]:
+        """Direcciones más parecidas a un texto.
+
+        Args:
+            texto: dirección escrita por el usuario
+            k: número de resultados
+        Returns: Lista de diccionarios con direccion, id_via, x e y.
+        """
+        if self.geocodificador is None:
+            raise ErrorPeticion("No hay geocodificador", HTTPStatus.NOT_IMPLEMENTED)
+        resultados = self.geocodificador.geocode(texto, k)
+        return [
+            {
+                "direccion": fila["Direccion completa"],
+                "id_via": int(fila["id_via"]),
+                "x": float(fila["x"]),
+                "y": float(fila["y"]),
+            }
+            for _, fila in resultados.iterrows()
+        ]
+
+    def ajustar(self, punto) -> int:
+        """Id del vértice más cercano a un punto: una dirección (se
+        geocodifica y se busca en su vía), "x,y" o [x, y].
+
+        Args: punto dirección o coordenadas en cm
+        Returns: Id del vértice en el grafo.
+        """
+        if isinstance(punto, (list, tuple)) and len(punto) == 2:
+            x, y, via = float(punto[0]), float(punto[1]), None
+        elif isinstance(punto, str) and _es_par(punto):
+            x, y = map(float, punto.split(","))
+            via = None
+        elif isinstance(punto, str) and punto.strip():
+            direccion = self.geocode(punto, 1)
+            if not direccion:
+                raise ErrorPeticion(f"Dirección no encontrada: {punto}")
+            x, y, via = direccion[0]["x"], direccion[0]["y"], direccion[0]["id_via"]
+        else:
+            raise ErrorPeticion(f"Punto no válido: {punto!r}")
+        return self.grafo.ids[self.indice.vertice_mas_cercano(x, y, via)]
+
+    async def ruta(self, parametros: dict):
+        """Camino mínimo entre dos puntos (ver la cabecera del módulo).
+
+        Args: parametros diccionario con origen, destino y, opcionalmente,
+        algoritmo y formato
+        Returns: Diccionario de resultado, o bytes PNG si formato es png.
+        """
+        algoritmo = parametros.get("algoritmo", "dijkstra")
+        if algoritmo not in ALGORITMOS:
+            raise ErrorPeticion(f"Algoritmo desconocido: {algoritmo}")
+        if algoritmo == "alt" and self.grafo.landmarks is None:
+            raise ErrorPeticion("No hay landmarks", HTTPStatus.NOT_IMPLEMENTED)
+        extremos = [_requerido(parametros, c) for c in ("origen", "destino")]
+        origen, destino = await asyncio.gather(
+            *(asyncio.to_thread(self.ajustar, p) for p in extremos)
+        )
+        [(_, camino, coste, asentados)] = await self._buscar(
+            paralelo._calcular_rutas, [(0, origen, destino)], algoritmo, None
+        )
+        coords = self.grafo.coords
+        puntos = coords[camino].tolist() if camino is not None else None
+        if parametros.get("formato") == "png":
+            if puntos is None:
+                raise ErrorPeticion("No hay camino", HTTPStatus.NOT_FOUND)
+            return await asyncio.to_thread(dibujar_camino, puntos)
+        return {
+            "origen": coords[origen].tolist(),
+            "destino": coords[destino].tolist(),
+            "camino": puntos,
+            "coste": coste,
+            "asentados": asentados,
+        }
+
+    async def matriz(self, parametros: dict) -> dict:
+        """Matriz de costes entre listas de puntos (ver ajustar).
+
+        Args: parametros diccionario con las listas origenes y destinos
+        Returns: Diccionario con la matriz "costes" (null si no hay camino).
+        """
+        listas = [_requerido(parametros, c) for c in ("origenes", "destinos")]
+        if not all(isinstance(l, list) and 0 < len(l) <= MAX_MATRIZ for l in listas):
+            raise ErrorPeticion(f"origenes y destinos: listas de 1 a {MAX_MATRIZ}")
+        origenes, destinos = await asyncio.gather(
+            *(
+                asyncio.to_thread(lambda l=l: [self.ajustar(p) for p in l])
+                for l in listas
+            )
+        )
+        # Un trozo de filas por proceso
+        trozos = np.array_split(np.array(origenes), min(self.procesos, len(origenes)))
+        filas = await asyncio.gather(
+            *(
+                self._buscar(paralelo._calcular_matriz, t.tolist(), destinos)
+                for t in trozos
+            )
+        )
+        costes = np.vstack(filas).tolist()
+        return {
+            "costes": [[c if math.isfinite(c) else None for c in f] for f in costes]
+        }
+
+    #### HTTP ####
+    async def atender(
+        self, lector: asyncio.StreamReader, escritor: asyncio.StreamWriter
+    ) -> None:
+        """Atiende una conexión: lee una petición, la responde y la cierra."""
+        try:
+            try:
+                metodo, ruta, parametros = await _leer_peticion(lector)
+                respuesta = await self._responder(metodo, ruta, parametros)
+                estado = HTTPStatus.OK
+            except ErrorPeticion as e:
+                estado, respuesta = e.estado, {"error": str(e)}
+            except ValueError as e:
+                estado, respuesta = HTTPStatus.BAD_REQUEST, {"error": str(e)}
+            except Exception as e:  # El servicio sigue con otras peticiones
+                estado, respuesta = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": repr(e)}
+            if isinstance(respuesta, bytes):
+                tipo, cuerpo = "image/png", respuesta
+            else:
+                tipo, cuerpo = "application/json", json.dumps(respuesta).encode()
+            escritor.write(
+                (
+                    f"HTTP/1.1 {estado.value} {estado.phrase}\r\n"
+                    f"Content-Type: {tipo}\r\n"
+                    f"Content-Length: {len(cuerpo)}\r\n"
+                    "Connection: close\r\n\r\n"
+                ).encode()
+                + cuerpo
+            )
+            await escritor.drain()
+        except ConnectionError:
+            pass
+        finally:
+            escritor.close()
+
+    async def _responder(self, metodo: str, ruta: str, parametros: dict):
+        """Despacha una petición a su consulta."""
+        if ruta == "/route":
+            return await self.ruta(parametros)
+        if ruta == "/geocode":
+            k = int(parametros.get("k", 5))
+            if k < 1:
+                raise ErrorPeticion(f"k ha de ser al menos 1: {k}")
+            texto = _requerido(parametros, "q")
+            return await asyncio.to_thread(self.geocode, texto, k)
+        if ruta == "/matrix":
+            if metodo != "POST":
+                raise ErrorPeticion("/matrix es POST", HTTPStatus.METHOD_NOT_ALLOWED)
+            return await self.matriz(parametros)
+        raise ErrorPeticion(f"Ruta desconocida: {ruta}", HTTPStatus.NOT_FOUND)
+
+    async def servir(self, host: str = "127.0.0.1", puerto: int = PUERTO) -> None:
+        """Atiende peticiones hasta que se cancela la tarea.
+
+        Args:
+            host: dirección en la que escuchar
+            puerto: puerto TCP
+        Returns: None
+        """
+        servidor = await asyncio.start_server(self.atender, host, puerto)
+        async with servidor:
+            await servidor.serve_forever()
+
+
+async def _leer_peticion(lector: asyncio.StreamReader) -> Tuple[str, str, dict]:
+    """Lee una petición HTTP/1.1 y devuelve (método, ruta, parámetros), con
+    los parámetros de la URL y, en un POST, los del cuerpo JSON.
+    """
+    linea = (await lector.readline()).decode("latin-1").split()
+    if len(linea) != 3:
+        raise ErrorPeticion("Petición HTTP mal formada")
+    metodo, url, _ = linea
+    cabeceras = {}
+    while True:
+        cabecera = (await lector.readline()).decode("latin-1")
+        if cabecera in ("\r\n", "\n", ""):
+            break
+        nombre, _, valor = cabecera.partition(":")
+        cabeceras[nombre.strip().lower()] = valor.strip()
+    partes = urlsplit(url)
+    parametros = dict(parse_qsl(partes.query))
+    longitud = int(cabeceras.get("content-length", 0))
+    if longitud > MAX_CUERPO:
+        raise ErrorPeticion(
+            "Cuerpo demasiado grande", HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+        )
+    if metodo == "POST" and longitud:
+        try:
+            cuerpo = json.loads(await lector.readexactly(longitud))
+        except json.JSONDecodeError as e:
+            raise ErrorPeticion(f"JSON no válido: {e}")
+        if not isinstance(cuerpo, dict):
+            raise ErrorPeticion("El cuerpo debe ser un objeto JSON")
+        parametros.update(cuerpo)
+    elif metodo not in ("GET", "POST"):
+        raise ErrorPeticion(metodo, HTTPStatus.METHOD_NOT_ALLOWED)
+    return metodo, partes.path, parametros
+
+
+def _requerido(parametros: dict, nombre: str):
+    """Valor de un parámetro obligatorio."""
+    if nombre not in parametros:
+        raise ErrorPeticion(f"Falta el parámetro {nombre}")
+    return parametros[nombre]
+
+
+def _es_par(texto: str) -> bool:
+    """Indica si un texto es un par de números "x,y"."""
+    partes = texto.split(",")
+    try:
+        return len(partes) == 2 and all(math.isfinite(float(p)) for p in partes)
+    except ValueError:
+        return False
+
+
+def dibujar_camino(puntos: List[List[float]], ancho: float = 2) -> bytes:
+    """Dibuja solo las aristas de un camino, sin el resto del grafo.
+
+    Args:
+        puntos: lista de coordenadas [x, y] del camino
+        ancho: grosor de la línea
+    Returns: Imagen PNG.
+    """
+    from matplotlib.figure import Figure
+
+    figura = Figure(figsize=(6, 6))
+    ax = figura.subplots()
+    xs, ys = zip(*puntos)
+    ax.plot(xs, ys, color="r", linewidth=ancho)
+    ax.scatter([xs[0], xs[-1]], [ys[0], ys[-1]], color="purple", zorder=3)
+    ax.set_aspect("equal")
+    ax.set_axis_off()
+    imagen = io.BytesIO()
+    figura.savefig(imagen, format="png", bbox_inches="tight")
+    return imagen.getvalue()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3, 4):
+        print(__doc__)
+        sys.exit(1)
+    puerto = int(sys.argv[2]) if len(sys.argv) > 2 else PUERTO
+    procesos = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    servicio = Servicio.cargar(sys.argv[1], procesos=procesos)
+    print(f"Escuchando en http://127.0.0.1:{puerto}")
+    try:
+        asyncio.run(servicio.servir(puerto=puerto))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servicio.cerrar()
@@ -17,6 +17,7 @@ Después realiza vairas operaciones básicas sobre el grafo y ejecuta sobre él:
     - Prim
     - Kruskal
 """
+
 import grafo
 import random
 
@@ -69,3 +70,617 @@ if not dirigido:
 
     aam2 = G.prim()
     print(aam2)
+
+# Forma compacta (CSR): mismos costes que el grafo original
+C = G.compactar()
+print(C.dijkstra(1))
+
+
+def coste(camino):
+    return sum(G.obtener_arista(s, t)[1] for s, t in zip(camino, camino[1:]))
+
+
+for v in G:
+    assert coste(C.camino_minimo(1, v)) == coste(G.camino_minimo(1, v))
+assert C.a_grafo().aristas == G.aristas
+
+# Guardado y carga en formato binario
+import os
+import tempfile
+
+with tempfile.TemporaryDirectory() as tmp:
+    G.save_graph(os.path.join(tmp, "grafo.grf"))
+    H = grafo.Grafo()
+    H.load_graph(os.path.join(tmp, "grafo.grf"))
+    assert H.aristas == G.aristas and H.es_dirigido() == G.es_dirigido()
+
+# A* con heurística euclídea sobre un grafo de coordenadas
+P = grafo.Grafo()
+puntos = [(x, y) for x in range(0, 500, 100) for y in range(0, 500, 100)]
+for p in puntos:
+    P.agregar_vertice(p)
+for s, t in zip(puntos, puntos[1:] + puntos[:1]):
+    P.agregar_arista(s, t, None, random.randint(10, 20))
+for p in puntos[::3]:
+    P.agregar_arista(p, puntos[-1], None, random.randint(10, 100))
+for p in puntos:
+    e1, e2 = {}, {}
+    P.camino_minimo(puntos[0], p, estadisticas=e1)
+    P.camino_minimo(puntos[0], p, algoritmo="astar", estadisticas=e2)
+    assert e1["coste"] == e2["coste"] and e2["asentados"] <= e1["asentados"]
+    assert P.compactar().camino_minimo(puntos[0], p, algoritmo="astar") is not None
+
+# Dijkstra bidireccional: mismo coste que Dijkstra
+for H in (G, P, C, P.compactar()):
+    for s in list(H)[:3]:
+        for t in H:
+            e1, e2 = {}, {}
+            H.camino_minimo(s, t, estadisticas=e1)
+            camino = H.camino_minimo(s, t, "bidireccional", estadisticas=e2)
+            assert e1["coste"] == e2["coste"]
+            assert camino is None or (camino[0], camino[-1]) == (s, t)
+
+# Jerarquía de contracción: mismos costes que Dijkstra
+from contraccion import JerarquiaContraccion
+
+for H in (C, P.compactar()):
+    J = JerarquiaContraccion.construir(H)
+    for s in H:
+        for t in H:
+            e1, e2 = {}, {}
+            H.camino_minimo(s, t, estadisticas=e1)
+            camino = J.camino_minimo(s, t, estadisticas=e2)
+            assert e1["coste"] == e2["coste"]
+            assert camino is None or (camino[0], camino[-1]) == (s, t)
+
+# ALT: A* con landmarks, mismos costes que Dijkstra
+from landmarks import Landmarks
+
+for H in (C, P.compactar()):
+    H.landmarks = Landmarks.construir(H, k=3)
+    for s in H:
+        for t in H:
+            e1, e2 = {}, {}
+            H.camino_minimo(s, t, estadisticas=e1)
+            H.camino_minimo(s, t, "alt", estadisticas=e2)
+            assert e1["coste"] == e2["coste"]
+
+# Índice espacial: mismo resultado que la búsqueda exhaustiva
+from indice_espacial import IndiceEspacial
+
+indice = IndiceEspacial.desde_grafo(P.compactar())
+consultas = [(random.uniform(-200, 700), random.uniform(-200, 700)) for _ in range(50)]
+lote, _ = indice.mas_cercano_lote(*zip(*consultas))
+for (x, y), i in zip(consultas, lote):
+    cercano = min(puntos, key=lambda p: (p[0] - x) ** 2 + (p[1] - y) ** 2)
+    d = ((cercano[0] - x) ** 2 + (cercano[1] - y) ** 2) ** 0.5
+    posiciones, distancias = indice.mas_cercanos(x, y, k=2)
+    assert abs(distancias[0] - d) < 1e-9 and distancias[0] <= distancias[1]
+    assert abs(((puntos[i][0] - x) ** 2 + (puntos[i][1] - y) ** 2) ** 0.5 - d) < 1e-9
+
+# Geocodificador: mismas puntuaciones que recorrer todas las direcciones
+import pandas as pd
+
+from geocodificador import Geocodificador, clean_direccion, str_dist
+
+calles = ["Calle de Alcalá", "Gran Vía", "Calle Mayor", "Paseo del Prado"]
+direcciones = pd.DataFrame(
+    {
+        "Direccion completa": [f"{c} {n}" for c in calles for n in range(1, 60)],
+        "id_via": [i for i in range(len(calles)) for _ in range(1, 60)],
+        "x": range(len(calles) * 59),
+        "y": range(len(calles) * 59),
+    }
+)
+geo = Geocodificador.construir(direcciones)
+for texto in ["calle alcala 12", "gran via 5", "mayor", "prado 58", "xyz", ""]:
+    todas = sorted(str_dist(clean_direccion(d), texto) for d in geo.textos)
+    assert list(geo.geocode(texto, 5)["lev"]) == todas[:5]
+assert len(geo.geocode("mayor", 0)) == len(geo.geocode("mayor", -1)) == 0
+
+# Construcción vectorizada: una calle con sus cruces desordenados
+import numpy as np
+
+from construccion import construir_grafo
+
+B = grafo.Grafo()
+B.agregar_aristas_desde_arrays(
+    np.array([[0, 0], [0, 0], [1, 1]]), np.array([[1, 1], [0, 0], [2, 2]]), [3, 1, 4]
+)
+assert B.aristas == {
+    ((0, 0), (1, 1)): {"data": None, "weight": 3},
+    ((1, 1), (0, 0)): {"data": None, "weight": 3},
+    ((1, 1), (2, 2)): {"data": None, "weight": 4},
+    ((2, 2), (1, 1)): {"data": None, "weight": 4},
+}
+
+xs = [300000, 0, 100000, 100030, 200000]
+cruces = pd.DataFrame(
+    {
+        "id_via": [1] * 5 + [2, 2],
+        "nombre_via": ["CALLE A"] * 5 + ["AVENIDA B"] * 2,
+        "id_via_cruzada": [9] * 7,
+        "nombre_via_cruzada": ["X"] * 7,
+        "tipo_via": ["CALLE   "] * 5 + ["AVENIDA "] * 2,
+        "x": xs + [100000, 100000],
+        "y": [0] * 5 + [0, 360000],
+    }
+)
+direcciones = pd.DataFrame(
+    {
+        "Direccion completa": [f"CALLE A {n}" for n in (2, 10, 20, 30)],
+        "id_via": [1] * 4,
+        "x": [0, 100000, 200000, 300000],
+        "y": [0] * 4,
+    }
+)
+velocidades = pd.DataFrame({"Calle": ["CALLE A"], "0": [10.0]})
+B = construir_grafo(cruces, direcciones, velocidades)
+assert len(B.adj) == 5
+assert B.obtener_arista((0, 0), (100000, 0)) == (1, 100)
+assert B.obtener_arista((100000, 0), (200000, 0)) == (1, 100)
+assert B.obtener_arista((200000, 0), (300000, 0)) == (1, 100)
+assert B.obtener_arista((100000, 0), (100000, 360000)) == (2, 144)
+assert len(B.aristas) == 8
+
+# Agrupación de puntos cercanos: mismos grupos que comparar todos los pares
+from indice_espacial import agrupar_puntos
+from union_find import UnionFind
+
+puntos_cercanos = np.array(
+    [(random.randrange(2000), random.randrange(2000)) for _ in range(500)]
+)
+canonicas, grupos = agrupar_puntos(puntos_cercanos, 100)
+conjuntos = UnionFind(len(puntos_cercanos))
+for i, p in enumerate(puntos_cercanos):
+    for j in np.flatnonzero(np.abs(puntos_cercanos - p).sum(axis=1) < 100):
+        conjuntos.unir(i, int(j))
+assert (conjuntos.etiquetas() == grupos).all()
+for i in range(len(puntos_cercanos)):
+    primero = np.flatnonzero(grupos == grupos[i])[0]
+    assert (canonicas[i] == puntos_cercanos[primero]).all()
+
+# Ordenación de cruces: Held-Karp da el óptimo de todas las permutaciones
+import itertools
+
+from ordenacion import distancias, coste, held_karp, ordenar_grupos
+from ordenacion import dos_opt, vecino_mas_cercano
+
+grupos_cruces = []
+for n in range(1, 8):
+    xy = np.array([(random.randrange(1000), random.randrange(1000)) for _ in range(n)])
+    grupos_cruces.append((xy, None, None))
+    grupos_cruces.append((xy, np.array([-100, 0]), np.array([1100, 1000])))
+for (xy, inicio, fin), recorrido in zip(grupos_cruces, ordenar_grupos(grupos_cruces)):
+    d, d_inicio, d_fin = distancias(xy, inicio, fin)
+    optimo = min(
+        coste(p, d, d_inicio, d_fin) for p in itertools.permutations(range(len(xy)))
+    )
+    assert coste(recorrido, d, d_inicio, d_fin) == optimo
+    assert coste(held_karp(d, d_inicio, d_fin), d, d_inicio, d_fin) == optimo
+    if len(xy) > 2:
+        inicial = vecino_mas_cercano(d, d_inicio)
+        mejorado = dos_opt(inicial, d, d_inicio, d_fin)
+        assert sorted(mejorado) == list(range(len(xy)))
+        assert coste(mejorado, d, d_inicio, d_fin) <= coste(inicial, d, d_inicio, d_fin)
+
+# Matriz de distancias: mismos costes que camino_minimo, también en paralelo
+H = P.compactar()
+origenes, destinos = random.sample(puntos, 6), random.sample(puntos, 5)
+matriz = H.matriz_distancias(origenes, destinos)
+matriz_paralela, padres = H.matriz_distancias(origenes, destinos, True, procesos=2)
+assert (matriz == matriz_paralela).all()
+for i, s in enumerate(origenes):
+    for j, t in enumerate(destinos):
+        e = {}
+        H.camino_minimo(s, t, estadisticas=e)
+        assert matriz[i, j] == e["coste"]
+        v = H.ids[t]
+        while padres[i, v] != -1:
+            v = padres[i, v]
+        assert H.vertices[v] == s
+
+# Rutas en lote: mismos costes que camino_minimo, en este proceso y en un pool
+pares = [(random.choice(puntos), random.choice(puntos)) for _ in range(40)]
+for workers in (1, 2):
+    resultados = list(H.rutas_batch(pares, workers, "bidireccional"))
+    assert sorted(r["indice"] for r in resultados) == list(range(len(pares)))
+    for r in resultados:
+        e = {}
+        camino = H.camino_minimo(r["origen"], r["destino"], estadisticas=e)
+        assert r["coste"] == e["coste"]
+        assert r["asentados"] > 0 or r["origen"] == r["destino"]
+        assert (r["camino"][0], r["camino"][-1]) == (camino[0], camino[-1])
+
+# Caché de rutas: mismos resultados y se invalida al editar el grafo
+Q = grafo.Grafo()
+for s, t in P.aristas:
+    Q.agregar_vertice(s)
+    Q.agregar_vertice(t)
+    Q.agregar_arista(s, t, None, P.aristas[(s, t)]["weight"])
+Q.activar_cache()
+s, t = puntos[0], puntos[-1]
+e1, e2, e3 = {}, {}, {}
+camino = Q.camino_minimo(s, t, estadisticas=e1)
+assert Q.camino_minimo(s, t, estadisticas=e2) == camino and e2["asentados"] == 0
+assert e1["coste"] == e2["coste"]
+Q.dijkstra(s)
+for v in puntos:
+    Q.camino_minimo(s, v, estadisticas=e3)
+    assert e3["asentados"] == 0
+    assert e3["coste"] == P.compactar().matriz_distancias([s], [v])[0, 0]
+Q.eliminar_arista(camino[0], camino[1])
+assert camino[1] != Q.camino_minimo(s, t)[1]
+assert Q.cache.estadisticas()["aciertos"] > 0
+# Una ruta de A* con una heurística no admisible no responde a Dijkstra
+Q.activar_cache()
+rapida = Q.camino_minimo(s, t, "astar", velocidad_max=1e-3, estadisticas=e1)
+assert Q.camino_minimo(s, t, estadisticas=e2) == Q._camino_minimo(s, t)[0]
+assert e2["coste"] == Q._camino_minimo(s, t)[1] and e2["asentados"] > 0
+assert Q.camino_minimo(s, t, "astar", velocidad_max=1e-3) == rapida
+Q.activar_cache(max_bytes=1000)
+for v in puntos:
+    Q.camino_minimo(s, v)
+assert Q.cache.bytes <= 1000
+
+# Actualización de pesos: mismos costes que un grafo reconstruido
+import trafico
+
+R = grafo.Grafo()
+for (s, t), arista in P.aristas.items():
+    R.agregar_vertice(s)
+    R.agregar_vertice(t)
+    R.agregar_arista(s, t, s[0] // 200, arista["weight"])
+H = R.compactar()
+H.landmarks = Landmarks.construir(H, k=3)
+J = JerarquiaContraccion.construir(H)
+R.activar_cache()
+R.camino_minimo(puntos[0], puntos[-1])
+assert R.actualizar_pesos_via({0: 2.0}) == H.actualizar_pesos_via({0: 2.0}) > 0
+assert not H.landmarks.obsoletos
+filas = [{"origen_x": "0", "origen_y": "0", "destino_x": "0", "destino_y": "100"}]
+filas[0]["peso"] = "1"
+assert trafico.aplicar_actualizaciones(R, filas) == 2
+assert trafico.aplicar_actualizaciones(H, filas) == 2
+assert H.landmarks.obsoletos
+for v in puntos:
+    e1, e2, e3 = {}, {}, {}
+    R.camino_minimo(puntos[0], v, estadisticas=e1)
+    H.camino_minimo(puntos[0], v, "bidireccional", estadisticas=e2)
+    R.compactar().camino_minimo(puntos[0], v, estadisticas=e3)
+    assert e1["coste"] == e2["coste"] == e3["coste"]
+try:
+    J.camino_minimo(puntos[0], puntos[-1])
+    assert False
+except ValueError:
+    pass
+R.restablecer_pesos()
+H.restablecer_pesos()
+assert list(H.pesos) == list(R.compactar().pesos) == list(P.compactar().pesos)
+# En un grafo dirigido, agregar (t, s) no descarta el peso original de (s, t)
+for agregar in ("arista", "arrays"):
+    R = grafo.Grafo(dirigido=True)
+    R.agregar_vertice("a")
+    R.agregar_vertice("b")
+    R.agregar_arista("a", "b", None, 5)
+    R.actualizar_pesos([("a", "b")], [50])
+    if agregar == "arista":
+        R.agregar_arista("b", "a", None, 7)
+    else:
+        R.agregar_aristas_desde_arrays(["b"], ["a"], [7])
+    R.restablecer_pesos()
+    assert R.obtener_arista("a", "b") == (None, 5)
+    assert R.obtener_arista("b", "a") == (None, 7)
+
+# Perfiles de velocidad: la velocidad cambia al cambiar de franja (FIFO)
+from datetime import datetime, timedelta
+from perfiles import FRANJAS, PerfilesVelocidad
+
+H = P.compactar()
+factores = np.ones((2, FRANJAS))
+factores[1, 32:40] = 0.5  # de 08:00 a 10:00 a mitad de velocidad
+H.perfiles = PerfilesVelocidad(H, factores, np.ones(H.num_aristas(), dtype=int))
+assert H.perfiles.llegada(0, 100, 8 * 3600 - 50) == 8 * 3600 + 100
+for v in puntos:
+    e1, e2, e3 = {}, {}, {}
+    H.camino_minimo(puntos[0], v, estadisticas=e1)
+    H.camino_minimo(puntos[0], v, estadisticas=e2, salida=datetime(2024, 1, 1, 3))
+    H.camino_minimo(
+        puntos[0], v, "astar", estadisticas=e3, salida=datetime(2024, 1, 1, 9)
+    )
+    assert e1["coste"] == e2["coste"] and e3["coste"] == 2 * e1["coste"]
+    assert e3["llegada"] == datetime(2024, 1, 1, 9) + timedelta(seconds=e3["coste"])
+for t in range(0, 24 * 3600, 60):
+    assert H.perfiles.llegada(0, 500, t + 1) >= H.perfiles.llegada(0, 500, t)
+
+# Isócronas: los vértices a coste <= presupuesto, con una sola búsqueda
+from envolvente import envolvente_concava, envolvente_convexa
+
+_, distancias_origen, _ = P._busqueda(puntos[0])
+isocronas = P.isocronas(puntos[0], [40, 0, 1000], poligono=True)
+for presupuesto, (costes, poligono) in zip([40, 0, 1000], isocronas):
+    esperado = {v: d for v, d in distancias_origen.items() if d <= presupuesto}
+    assert costes == esperado == P.isocrona(puntos[0], presupuesto)
+    assert {tuple(p) for p in poligono.tolist()} <= set(costes)
+cuadrado = np.array(
+    [(0, 0), (1000, 0), (1000, 1000), (0, 1000), (500, 900), (500, 500)]
+)
+assert envolvente_convexa(cuadrado) == [0, 1, 2, 3]
+assert len(envolvente_concava(cuadrado, longitud=2000)) == 4
+assert [500, 900] in envolvente_concava(cuadrado, longitud=500).tolist()
+
+# Caminos alternativos: los k más cortos sin ciclos, como networkx
+import networkx as nx
+
+for H in (C, P.compactar()):
+    N = H.a_grafo().convertir_a_NetworkX()
+    for s in list(H)[:3]:
+        for t in H:
+            caminos = H.k_caminos(s, t, 4)
+            if not nx.has_path(N, s, t):
+                assert caminos == []
+                continue
+            simples = nx.shortest_simple_paths(N, s, t, weight="weight")
+            esperados = [
+                nx.path_weight(N, c, "weight") for c in itertools.islice(simples, 4)
+            ]
+            assert [coste for _, coste in caminos] == esperados
+            for camino, _ in caminos:
+                assert len(set(camino)) == len(camino) and camino[0] == s
+H = P.compactar()
+caminos = H.k_caminos(puntos[0], puntos[12], 3, 0.5, "penalizacion")
+for (a, _), (b, _) in itertools.combinations(caminos, 2):
+    assert a != b
+
+# Árbol abarcador mínimo: Kruskal con union-find y Prim sobre CSR, como
+# networkx también en grafos no conexos (bosque)
+D = grafo.Grafo()
+for v in range(8):
+    D.agregar_vertice(v)
+for s, t, w in [(0, 1, 3), (1, 2, 1), (0, 2, 2), (4, 5, 7), (5, 6, 1), (4, 6, 1)]:
+    D.agregar_arista(s, t, None, w)
+for H in (D, P):
+    esperado = nx.minimum_spanning_tree(H.convertir_a_NetworkX()).size(weight="weight")
+    K = H.compactar()
+    for arbol in (H.kruskal(), K.kruskal(), list(K.prim().items())):
+        assert len(arbol) == len(H.adj) - nx.number_connected_components(
+            H.convertir_a_NetworkX()
+        )
+        assert sum(H.obtener_arista(s, t)[1] for s, t in arbol) == esperado
+
+# Adyacencia inversa mantenida: coincide con la reconstruida tras
+# cualquier secuencia de ediciones, también con lazos y en bloque
+for dirigido in (True, False):
+    E = grafo.Grafo(dirigido=dirigido)
+    for paso in range(600):
+        operacion = random.random()
+        s, t = random.randrange(30), random.randrange(30)
+        if operacion < 0.1:
+            E.agregar_vertice(s)
+        elif operacion < 0.6:
+            E.agregar_vertice(s)
+            E.agregar_vertice(t)
+            E.agregar_arista(s, t, None, random.randint(1, 9))
+        elif operacion < 0.7:
+            E.agregar_aristas_desde_arrays([s, t], [t, t], [1, 2])
+        elif operacion < 0.85:
+            E.eliminar_arista(s, t)
+        else:
+            E.eliminar_vertice(s)
+    inversa = {v: {} for v in E.adj}
+    for s in E.adj:
+        for t in E.adj[s]:
+            inversa[t][s] = E.adj[s][t]
+    assert E.adj_inv == inversa
+    assert set(E.aristas) == {(s, t) for s in E.adj for t in E.adj[s]}
+    for v in E:
+        assert E.grado_entrante(v) == sum(1 for u in E.adj if v in E.adj[u])
+        assert sorted(E.lista_predecesores(v)) == sorted(inversa[v])
+    E.actualizar_pesos([next(iter(E.aristas))], [100])
+    if dirigido:
+        assert all(E.adj_inv[t][s] is E.adj[s][t] for s in E.adj for t in E.adj[s])
+    else:
+        assert E.adj_inv is E.adj
+
+# Componentes conexas y fuertemente conexas, como networkx
+for H in (G, D, P, E):
+    N = H.convertir_a_NetworkX()
+    conexas = (
+        nx.weakly_connected_components if H.es_dirigido() else nx.connected_components
+    )
+    esperadas = sorted(map(sorted, conexas(N)))
+    assert sorted(map(sorted, H.componentes_conexas())) == esperadas
+    assert H.es_conexo() == (len(esperadas) == 1)
+    if H.es_dirigido():
+        fuertes = sorted(map(sorted, nx.strongly_connected_components(N)))
+        assert sorted(map(sorted, H.componentes_fuertemente_conexas())) == fuertes
+A = grafo.Grafo(dirigido=True)
+for v in range(5000):
+    A.agregar_vertice(v)
+for v in range(5000):
+    A.agregar_arista(v, (v + 1) % 5000, None, 1)
+assert len(A.componentes_fuertemente_conexas()) == 1
+A.eliminar_arista(4999, 0)
+assert len(A.componentes_fuertemente_conexas()) == 5000 and A.es_conexo()
+
+from construccion import informe_conectividad
+
+informe = informe_conectividad(D)
+assert informe["componentes"] == 4 and informe["vertices_principal"] == 3
+assert [f["vertices"] for f in informe["fragmentos"]] == [3, 1, 1]
+
+# Resumen de latencias y detección de regresiones del banco de pruebas
+from benchmark import regresiones, resumen
+
+res = resumen([0.001 * i for i in range(1, 101)])
+assert res["n"] == 100 and abs(res["p50_ms"] - 50.5) < 1e-9
+assert res["p50_ms"] <= res["p95_ms"] <= res["p99_ms"] <= 100
+base = {"a": res, "b": res}
+lento = dict(res, p95_ms=res["p95_ms"] * 1.5)
+assert regresiones({"a": res, "c": lento}, base, 0.2) == []
+assert len(regresiones({"a": lento}, base, 0.2)) == 1
+assert regresiones({"a": lento}, base, 0.6) == []
+
+# Contadores y traza de las búsquedas
+from heapdict import heapdict
+
+from instrumentacion import ColaInstrumentada, TrazaFrontera, cola
+
+assert type(cola()) is heapdict and isinstance(cola({}), ColaInstrumentada)
+for H in (G, D, P):
+    origen = next(iter(H.adj))
+    e, traza = {}, TrazaFrontera()
+    assert H.dijkstra(origen, e, traza) == H.dijkstra(origen)
+    assert e["extraidos"] == e["asentados"] == len(traza) == len(H.dijkstra(origen))
+    assert e["insertados"] == len(H.dijkstra(origen))
+    assert e["relajadas"] == sum(len(H.adj[v]) for v in H.dijkstra(origen))
+    assert e["frontera_max"] >= max(f for _, _, f in traza.eventos)
+    # La traza sale en orden de distancia
+    prioridades = [p for _, p, _ in traza.eventos]
+    assert prioridades == sorted(prioridades)
+    for destino in H.adj:
+        for algoritmo in ("dijkstra", "astar", "bidireccional"):
+            e, traza = {}, TrazaFrontera()
+            camino = H.camino_minimo(origen, destino, algoritmo, estadisticas=e)
+            assert camino == H.camino_minimo(origen, destino, algoritmo, traza=traza)
+            assert e["extraidos"] == len(traza) >= e["asentados"]
+            assert e["insertados"] >= e["frontera_max"] >= 1
+    e = {}
+    H.prim(e)
+    assert e["asentados"] == e["extraidos"]
+    # Con la caché, una ruta sin estadísticas no instrumenta la cola
+    H.activar_cache()
+    colas = []
+    grafo.cola = lambda *args: colas.append(cola(*args)) or colas[-1]
+    H.camino_minimo(origen, destino)
+    grafo.cola = cola
+    assert colas and all(type(q) is heapdict for q in colas)
+    H.desactivar_cache()
+    # Mismos contadores sobre la forma compacta, sin cambiar los resultados
+    M = H.compactar()
+    e, traza = {}, TrazaFrontera()
+    assert M.dijkstra(origen, e, traza) == M.dijkstra(origen)
+    assert e["extraidos"] == e["asentados"] == len(traza) == len(M.dijkstra(origen))
+    assert e["relajadas"] == sum(len(H.adj[v]) for v in M.dijkstra(origen))
+    assert [v for v, _, _ in traza.eventos][0] == origen
+    for destino in H.adj:
+        for algoritmo in ("dijkstra", "astar", "bidireccional"):
+            e, traza = {}, TrazaFrontera()
+            camino = M.camino_minimo(origen, destino, algoritmo, estadisticas=e)
+            assert camino == M.camino_minimo(origen, destino, algoritmo)
+            assert camino == M.camino_minimo(origen, destino, algoritmo, traza=traza)
+            assert e["extraidos"] == len(traza) >= e["asentados"]
+            assert e["insertados"] + e["decrementos"] >= e["frontera_max"] >= 1
+
+# Servicio de rutas: consultas sin HTTP sobre P y lectura de peticiones
+import asyncio
+
+from servicio import ErrorPeticion, Servicio, _leer_peticion
+
+PC = P.compactar()
+servicio = Servicio(PC, IndiceEspacial.desde_grafo(PC), procesos=1)
+ruta = asyncio.run(servicio.ruta({"origen": "1,2", "destino": [399, 401]}))
+assert ruta["origen"] == [0, 0] and ruta["destino"] == [400, 400]
+assert ruta["camino"] == [list(v) for v in P.camino_minimo((0, 0), (400, 400))]
+matriz = asyncio.run(
+    servicio.matriz({"origenes": ["0,0", "100,0"], "destinos": ["400,400"]})
+)
+assert matriz["costes"][0][0] == ruta["coste"]
+try:
+    asyncio.run(servicio.ruta({"origen": "calle mayor", "destino": "0,0"}))
+    assert False
+except ErrorPeticion as e:
+    assert e.estado == 501
+for k in ("0", "-3"):
+    try:
+        asyncio.run(servicio._responder("GET", "/geocode", {"q": "mayor", "k": k}))
+        assert False
+    except ErrorPeticion as e:
+        assert e.estado == 400
+servicio.cerrar()
+
+# Cargado de fichero, con los landmarks guardados junto al grafo
+from landmarks import Landmarks
+
+with tempfile.TemporaryDirectory() as tmp:
+    path = os.path.join(tmp, "p.grf")
+    PC.guardar(path)
+    cruces = pd.DataFrame({"x": [], "y": [], "id_via": [], "id_via_cruzada": []})
+    ficheros = (os.path.join(tmp, "cruces.csv"), os.path.join(tmp, "no.geo"))
+    cruces.to_csv(ficheros[0], index=False)
+    servicio = Servicio.cargar(path, *ficheros, procesos=1)
+    try:
+        asyncio.run(
+            servicio.ruta({"origen": "0,0", "destino": "400,400", "algoritmo": "alt"})
+        )
+        assert False
+    except ErrorPeticion as e:
+        assert e.estado == 501
+    servicio.cerrar()
+    Landmarks.construir(PC, 4).guardar(path + ".alt")
+    servicio = Servicio.cargar(path, *ficheros, procesos=1)
+    alt = asyncio.run(
+        servicio.ruta({"origen": "0,0", "destino": "400,400", "algoritmo": "alt"})
+    )
+    assert alt["coste"] == ruta["coste"]
+    servicio.cerrar()
+
+
+async def peticion(texto: bytes):
+    lector = asyncio.StreamReader()
+    lector.feed_data(texto)
+    lector.feed_eof()
+    return await _leer_peticion(lector)
+
+
+cuerpo = b'{"destinos": ["1,1"]}'
+assert asyncio.run(
+    peticion(
+        b"POST /matrix?origenes=x HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s"
+        % (len(cuerpo), cuerpo)
+    )
+) == ("POST", "/matrix", {"origenes": "x", "destinos": ["1,1"]})
+
+# Orden de paradas con matrices no simétricas y ruta multiparada
+from ordenacion import or_opt, recorrido_optimo
+
+for n in (6, 9):
+    d = np.random.rand(n, n) * 100
+    d_inicio, d_fin = np.random.rand(n) * 100, np.random.rand(n) * 100
+    optimo = coste(held_karp(d, d_inicio, d_fin), d, d_inicio, d_fin)
+    fuerza_bruta = min(
+        coste(p, d, d_inicio, d_fin) for p in itertools.permutations(range(n))
+    )
+    assert abs(optimo - fuerza_bruta) < 1e-6
+    inicial = vecino_mas_cercano(d, d_inicio)
+    for mejora in (dos_opt, or_opt):
+        mejorado = mejora(inicial, d, d_inicio, d_fin)
+        assert sorted(mejorado) == list(range(n))
+        assert optimo - 1e-6 <= coste(mejorado, d, d_inicio, d_fin)
+        assert coste(mejorado, d, d_inicio, d_fin) <= coste(inicial, d, d_inicio, d_fin)
+d = np.random.rand(40, 40) * 100
+recorrido = recorrido_optimo(d, d[0], np.zeros(40))
+assert sorted(recorrido) == list(range(40))
+assert coste(recorrido, d, d[0], np.zeros(40)) <= coste(
+    vecino_mas_cercano(d, d[0]), d, d[0], np.zeros(40)
+)
+
+M = grafo.Grafo(dirigido=True)
+for v in range(30):
+    M.agregar_vertice(v)
+for v in range(30):
+    M.agregar_arista(v, (v + 1) % 30, None, random.randint(1, 10))
+for _ in range(60):
+    M.agregar_arista(random.randrange(30), random.randrange(30), None, 10)
+MC = M.compactar()
+paradas = random.sample(range(1, 30), 5)
+T = MC.matriz_distancias(list(range(30)), list(range(30)))
+for fin in (None, 0):
+    camino, orden, total = MC.ruta_multiparada(paradas, 0, fin)
+    extremo = [fin] if fin is not None else []
+    recorridos = ([0, *p, *extremo] for p in itertools.permutations(paradas))
+    mejor = min(sum(T[a, b] for a, b in zip(r, r[1:])) for r in recorridos)
+    assert total == mejor
+    assert camino[0] == 0 and camino[-1] == ([paradas[orden[-1]]] + extremo)[-1]
+    assert sum(M.adj[a][b]["weight"] for a, b in zip(camino, camino[1:])) == total
+assert MC.ruta_multiparada([99], 0) is None
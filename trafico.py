@@ -0,0 +1,125 @@
+"""
+trafico.py
+
+Actualización en vivo de los pesos del grafo (Grafo o GrafoCompacto) a
+partir de un CSV de actualizaciones o de cualquier flujo de filas, sin
+reconstruirlo. Cada fila es una de:
+    - id_via, factor: multiplica el peso original de las aristas de la vía
+    - nombre_via, factor: lo mismo, con el nombre de la vía (se traduce a
+      sus id_via con ids_vias)
+    - origen_x, origen_y, destino_x, destino_y, peso: peso nuevo de una
+      arista concreta
+Un factor inf corta la vía y un factor 1 la restablece.
+
+Uso:
+    python trafico.py grafos/plano_de_madrid.grf actualizaciones.csv salida.grf
+aplica las actualizaciones a los pesos originales del grafo y guarda el
+resultado en salida.grf. El grafo de entrada no se modifica, de modo que
+aplicar dos veces el mismo CSV da el mismo resultado y un factor 1
+restablece la vía.
+"""
+
+import csv
+import os
+import sys
+from typing import Dict, Iterable, Iterator, List
+
+import pandas as pd
+
+# Filas que se aplican juntas en aplicar_actualizaciones
+LOTE = 1000
+
+
+def leer_actualizaciones(path: str) -> Iterator[dict]:
+    """Lee un CSV de actualizaciones fila a fila, sin cargarlo entero.
+
+    Args: path ruta del CSV
+    Returns: Generador de diccionarios columna -> valor.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+
+def ids_vias(cruces: pd.DataFrame) -> Dict[str, List[int]]:
+    """Ids de vía de cada nombre de vía.
+
+    Args: cruces DataFrame con columnas id_via y nombre_via
+    Returns: Diccionario nombre_via -> lista de id_via.
+    """
+    pares = cruces[["nombre_via", "id_via"]].drop_duplicates()
+    return pares.groupby("nombre_via")["id_via"].apply(list).to_dict()
+
+
+def aplicar_actualizaciones(
+    grafo, filas: Iterable[dict], lote: int = LOTE, nombres: dict = None
+) -> int:
+    """Aplica un flujo de actualizaciones al grafo por lotes: cada lote se
+    aplica con una sola llamada a actualizar_pesos_via y otra a
+    actualizar_pesos, de modo que las estructuras derivadas se parchean
+    una vez por lote.
+
+    Args:
+        grafo: Grafo o GrafoCompacto
+        filas: iterable de diccionarios (ver la cabecera del módulo)
+        lote: número de filas por lote
+        nombres: diccionario nombre_via -> lista de id_via (ver ids_vias),
+        necesario si hay filas con nombre_via
+    Returns: Número de aristas cambiadas.
+    """
+    cambiadas = 0
+    factores: Dict[object, float] = {}
+    aristas, pesos = [], []
+    for i, fila in enumerate(filas, 1):
+        if fila.get("id_via") not in (None, ""):
+            factores[int(fila["id_via"])] = float(fila["factor"])
+        elif fila.get("nombre_via") not in (None, ""):
+            if nombres is None:
+                raise ValueError("Hay filas con nombre_via: hace falta nombres")
+            for via in nombres.get(fila["nombre_via"], []):
+                factores[via] = float(fila["factor"])
+        else:
+            origen = (_numero(fila["origen_x"]), _numero(fila["origen_y"]))
+            destino = (_numero(fila["destino_x"]), _numero(fila["destino_y"]))
+            aristas.append((origen, destino))
+            pesos.append(float(fila["peso"]))
+        if i % lote == 0:
+            cambiadas += _aplicar_lote(grafo, factores, aristas, pesos)
+            factores, aristas, pesos = {}, [], []
+    return cambiadas + _aplicar_lote(grafo, factores, aristas, pesos)
+
+
+def _aplicar_lote(grafo, factores: dict, aristas: list, pesos: list) -> int:
+    """Aplica un lote: primero las vías y después las aristas sueltas."""
+    cambiadas = 0
+    if factores:
+        cambiadas += grafo.actualizar_pesos_via(factores)
+    if aristas:
+        cambiadas += grafo.actualizar_pesos(aristas, pesos)
+    return cambiadas
+
+
+def _numero(valor):
+    """Coordenada de un CSV: int si es entera (como en los cruces), float si
+    no, para que coincida con los vértices del grafo.
+    """
+    valor = float(valor)
+    return int(valor) if valor.is_integer() else valor
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        print(__doc__)
+        sys.exit(1)
+    if os.path.abspath(sys.argv[3]) == os.path.abspath(sys.argv[1]):
+        print("La salida no puede ser el grafo de entrada")
+        sys.exit(1)
+    from grafo import Grafo
+
+    grafo = Grafo()
+    grafo.load_graph(sys.argv[1])
+    nombres = ids_vias(pd.read_csv("data/cruces_clean.csv"))
+    n = aplicar_actualizaciones(
+        grafo, leer_actualizaciones(sys.argv[2]), nombres=nombres
+    )
+    print(f"{n} aristas actualizadas")
+    grafo.save_graph(sys.argv[3])
@@ -0,0 +1,79 @@
+"""
+union_find.py
+
+Estructura de conjuntos disjuntos (union-find) sobre los enteros
+0..n-1, con compresión de caminos y unión por tamaño, de modo que una
+secuencia de m operaciones cuesta O(m α(n)).
+"""
+
+from typing import List
+
+import numpy as np
+
+
+class UnionFind:
+    # Conjuntos disjuntos de los enteros 0..n-1
+
+    def __init__(self, n: int):
+        """Crea n conjuntos unitarios {0}, {1}, ..., {n-1}.
+
+        Args: n número de elementos
+        Returns: UnionFind con n conjuntos.
+        """
+        self.padres: List[int] = list(range(n))
+        self.tamanos: List[int] = [1] * n
+        self.conjuntos = n
+
+    def __len__(self):
+        return len(self.padres)
+
+    def encontrar(self, x: int) -> int:
+        """Representante del conjunto de x.
+
+        Args: x elemento
+        Returns: El representante (raíz) de su conjunto.
+        """
+        padres = self.padres
+        raiz = x
+        while padres[raiz] != raiz:
+            raiz = padres[raiz]
+        while padres[x] != raiz:
+            padres[x], x = raiz, padres[x]
+        return raiz
+
+    def unir(self, x: int, y: int) -> bool:
+        """Une los conjuntos de x e y.
+
+        Args:
+            x: elemento
+            y: elemento
+        Returns: True si estaban en conjuntos distintos, False si no.
+        """
+        x, y = self.encontrar(x), self.encontrar(y)
+        if x == y:
+            return False
+        if self.tamanos[x] < self.tamanos[y]:
+            x, y = y, x
+        self.padres[y] = x
+        self.tamanos[x] += self.tamanos[y]
+        self.conjuntos -= 1
+        return True
+
+    def mismo_conjunto(self, x: int, y: int) -> bool:
+        """Indica si x e y están en el mismo conjunto."""
+        return self.encontrar(x) == self.encontrar(y)
+
+    def etiquetas(self) -> np.ndarray:
+        """Etiqueta de conjunto de cada elemento, numerando los conjuntos
+        0, 1, ... por orden de su menor elemento.
+
+        Args: None
+        Returns: Array de n enteros.
+        """
+        raices = np.array([self.encontrar(x) for x in range(len(self))], dtype=np.int64)
+        _, primera, etiquetas = np.unique(
+            raices, return_index=True, return_inverse=True
+        )
+        renumeracion = np.empty(len(primera), dtype=np.int64)
+        renumeracion[np.argsort(primera, kind="stable")] = np.arange(len(primera))
+        return renumeracion[etiquetas.ravel()]